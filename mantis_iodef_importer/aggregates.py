@@ -0,0 +1,175 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import collections
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from django.utils import timezone
+
+from dingos.models import InfoObject, InfoObject2Fact
+
+from mantis_iodef_importer.models import IncidentAggregate
+
+from mantis_iodef_importer.routers import current_shard
+
+from mantis_iodef_importer.timeline import as_list
+
+from mantis_iodef_importer.transactions import atomic
+
+
+# Pair of impact type and severity for Incidents without Assessment/Impact
+
+NO_IMPACT = ('', '')
+
+
+def impact_key(impact_type, severity):
+    # The values are cut to the length of the aggregate columns.
+    return ((impact_type or '')[:64], (severity or '')[:16])
+
+
+def incident_impacts(elt_dict):
+    """
+    Return the set of (impact type, severity) pairs of the Assessment/Impact
+    elements in the DingoObjDict of an Incident.
+    """
+    result = set()
+    for assessment in as_list(elt_dict.get('Assessment')):
+        if not isinstance(assessment, dict):
+            continue
+        for impact in as_list(assessment.get('Impact')):
+            # As in 'rebuild_aggregates', an impact is only taken into account
+            # if it has a type or severity.
+            if isinstance(impact, dict) and (impact.get('@type') or impact.get('@severity')):
+                result.add(impact_key(impact.get('@type'), impact.get('@severity')))
+    return result or set([NO_IMPACT])
+
+
+def incident_day(timestamp):
+    """
+    Return the (UTC) day of a timestamp.
+    """
+    if timezone.is_aware(timestamp):
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+
+def aggregate_keys(timestamp, csirt, impacts):
+    day = incident_day(timestamp)
+    return [(day, (csirt or '')[:255], impact_type, severity) for (impact_type, severity) in sorted(impacts)]
+
+
+class AggregateCounter(object):
+    """
+    Counts the Incidents written in a batch; 'flush' adds the counts to
+    the aggregate table (see models.IncidentAggregate) with one statement
+    per distinct key, within the transaction of the batch.
+    """
+
+    def __init__(self):
+        self.deltas = collections.defaultdict(int)
+
+    def add(self, timestamp, csirt, elt_dict):
+        for key in aggregate_keys(timestamp, csirt, incident_impacts(elt_dict)):
+            self.deltas[key] += 1
+
+    def flush(self):
+        IncidentAggregate.objects.add_counts(self.deltas)
+        self.deltas.clear()
+
+
+def lock_aggregates(database):
+    """
+    Keep imports from changing the aggregate table until the end of the
+    current transaction. On PostgreSQL, the table is locked in EXCLUSIVE mode,
+    which still admits readers; on other databases, the rows are deleted
+    right away, which takes the write locks that the database has (on
+    SQLite, the lock of the whole database).
+    """
+    connection = connections[database]
+    if connection.vendor == 'postgresql':
+        connection.cursor().execute('LOCK TABLE %s IN EXCLUSIVE MODE' % connection.ops.quote_name(
+            IncidentAggregate._meta.db_table))
+    IncidentAggregate.objects.all().delete()
+
+
+def rebuild_aggregates(chunk_size=1000, progress=None):
+    """
+    Recompute the aggregate table from the Incidents in the database
+    (e.g., after an import without aggregates or for a backfill) and return
+    the number of Incidents counted.
+
+    The Incidents are read in chunks of 'chunk_size' objects; their impacts
+    are taken from the type and severity facts of Assessment/Impact, which
+    belong to the same element if their node ids differ only in the last
+    (attribute) position. The function 'progress' is called with the number
+    of Incidents counted so far after each chunk.
+
+    The table is locked (see 'lock_aggregates') and replaced within one
+    transaction, so that the counts of batches written meanwhile are
+    neither lost nor counted twice: such batches wait for the rebuild
+    before they update the aggregates. Imports should therefore not run
+    during a rebuild; Incidents committed meanwhile by imports without
+    aggregates are counted only if the rebuild reads them.
+    """
+    incidents = InfoObject.objects.filter(iobject_type__name='Incident', iobject_family__name='iodef')
+
+    deltas = collections.defaultdict(int)
+    counted = 0
+    last_pk = 0
+    with atomic(using=current_shard()):
+        lock_aggregates(current_shard() or DEFAULT_DB_ALIAS)
+
+        while True:
+            chunk = list(incidents.filter(pk__gt=last_pk).order_by('pk').values_list('pk',
+                                                                                       'timestamp',
+                                                                                       'identifier__uid')[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+
+            attributes_by_element = collections.defaultdict(dict)
+            facts = (InfoObject2Fact.objects
+                     .filter(iobject__in=[pk for (pk, timestamp, csirt) in chunk],
+                             fact__fact_term__term='Assessment/Impact',
+                             fact__fact_term__attribute__in=['type', 'severity'])
+                     .values_list('iobject', 'node_id__name', 'fact__fact_term__attribute',
+                                  'fact__fact_values__value'))
+            for (pk, node_id, attribute, value) in facts:
+                attributes_by_element[(pk, node_id.rsplit(':', 1)[0])][attribute] = value
+
+            impacts = collections.defaultdict(set)
+            for ((pk, element), attributes) in attributes_by_element.items():
+                impacts[pk].add(impact_key(attributes.get('type'), attributes.get('severity')))
+
+            for (pk, timestamp, csirt) in chunk:
+                for key in aggregate_keys(timestamp, csirt, impacts.get(pk) or set([NO_IMPACT])):
+                    deltas[key] += 1
+
+            counted += len(chunk)
+            if progress:
+                progress(counted)
+
+        IncidentAggregate.objects.bulk_create([IncidentAggregate(day=day,
+                                                                 csirt=csirt,
+                                                                 impact_type=impact_type,
+                                                                 severity=severity,
+                                                                 count=count)
+                                               for ((day, csirt, impact_type, severity), count)
+                                               in sorted(deltas.items())])
+    return counted
@@ -0,0 +1,103 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import threading
+
+from django.conf import settings
+
+
+class BatchController(object):
+    """
+    Adaptive number of Incidents per transaction.
+
+    After each batch, the controller is told how many Incidents the batch had,
+    how long its transaction took (from the first write to the commit) and
+    how many facts were written. From this, it keeps a moving average of the
+    time and the facts per Incident and sets the next batch size such that
+    a transaction is expected to take 'target_seconds' and to write no more
+    than 'max_facts' facts:
+
+    - feeds with light Incidents get large batches (few commits),
+    - feeds with heavy Incidents get small batches (short locks and
+      small rollbacks).
+
+    The size at most doubles from one batch to the next and always stays
+    between 'minimum' and 'maximum'; a batch that exceeds the targets
+    halves the size right away.
+    """
+
+    # Weight of the latest batch in the moving averages
+
+    SMOOTHING = 0.3
+
+    def __init__(self, initial=100, minimum=1, maximum=1000, target_seconds=1.0, max_facts=20000):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.target_seconds = target_seconds
+        self.max_facts = max_facts
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.seconds_per_incident = None
+        self.facts_per_incident = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, initial=None):
+        return cls(initial=initial or getattr(settings, 'MANTIS_IODEF_BATCH_SIZE', 100),
+                   minimum=getattr(settings, 'MANTIS_IODEF_BATCH_SIZE_MIN', 1),
+                   maximum=getattr(settings, 'MANTIS_IODEF_BATCH_SIZE_MAX', 1000),
+                   target_seconds=getattr(settings, 'MANTIS_IODEF_BATCH_TARGET_SECONDS', 1.0),
+                   max_facts=getattr(settings, 'MANTIS_IODEF_BATCH_MAX_FACTS', 20000))
+
+    def copy(self):
+        return BatchController(initial=self.size,
+                               minimum=self.minimum,
+                               maximum=self.maximum,
+                               target_seconds=self.target_seconds,
+                               max_facts=self.max_facts)
+
+    def record(self, incidents, seconds, facts):
+        """
+        Record the outcome of a batch and adapt the batch size.
+        """
+        if not incidents:
+            return
+
+        with self.lock:
+            if seconds > self.target_seconds or facts > self.max_facts:
+                size = self.size // 2
+            else:
+                self.seconds_per_incident = self.average(self.seconds_per_incident, float(seconds) / incidents)
+                self.facts_per_incident = self.average(self.facts_per_incident, float(facts) / incidents)
+
+                size = self.size * 2
+                if self.seconds_per_incident > 0:
+                    size = min(size, int(self.target_seconds / self.seconds_per_incident))
+                if self.facts_per_incident > 0:
+                    size = min(size, int(self.max_facts / self.facts_per_incident))
+
+                # A short batch (e.g., the remainder of a document) tells
+                # us nothing about larger batches.
+                if incidents < self.size:
+                    size = min(size, max(self.size, incidents * 2))
+
+            self.size = min(max(size, self.minimum), self.maximum)
+
+    def average(self, current, value):
+        if current is None:
+            return value
+        return (1 - self.SMOOTHING) * current + self.SMOOTHING * value
@@ -0,0 +1,73 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+from mantis_iodef_importer.models import ImportCheckpoint
+
+from mantis_iodef_importer.routers import fan_out
+
+
+def input_digest(filepath=None, xml_content=None):
+    """
+    Return the SHA-256 digest of an input file (read in chunks) or of
+    XML content passed directly.
+    """
+    digest = hashlib.sha256()
+    if filepath:
+        with open(filepath, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(1 << 20), b''):
+                digest.update(chunk)
+    else:
+        if not isinstance(xml_content, bytes):
+            xml_content = xml_content.encode('utf-8')
+        digest.update(xml_content)
+    return digest.hexdigest()
+
+
+class Checkpointer(object):
+    """
+    Records the Incidents of an input that have been committed and, when
+    resuming, tells which Incidents can be skipped.
+    """
+
+    def __init__(self, file_digest, resume=False):
+        self.file_digest = file_digest
+        if resume:
+            # The checkpoint entries are written to the shards of their
+            # Incidents (see routers.py).
+            self.committed = set(fan_out(ImportCheckpoint.objects.filter(file_digest=file_digest)
+                                         .values_list('ordinal', flat=True)))
+        else:
+            self.committed = set()
+        self.skipped = 0
+
+    def is_committed(self, ordinal):
+        if ordinal in self.committed:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, ordinal, incident_id):
+        """
+        Record the Incident with the given ordinal as committed; to be
+        called within the transaction that writes the Incident.
+        """
+        ImportCheckpoint.objects.get_or_create(file_digest=self.file_digest,
+                                               ordinal=ordinal,
+                                               defaults={'incident_id': incident_id or ''})
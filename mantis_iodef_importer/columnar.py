@@ -0,0 +1,328 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import datetime
+
+import json
+
+import os
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS
+
+from django.db.models import Max
+
+from django.utils import timezone
+
+from dingos.models import InfoObject2Fact
+
+from mantis_iodef_importer.routers import current_shard
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# Export of the facts of imported IODEF Incidents into columnar files
+# for analytics (e.g., with NumPy or pandas), written in chunks of
+# facts (rows of InfoObject2Fact), one file per chunk. Each row of a file
+# is one value of a fact, with the following columns:
+#
+# - fact_id, iobject_id: primary keys of the InfoObject2Fact row and the Incident
+# - timestamp: timestamp of the Incident revision (microseconds since the epoch, UTC)
+# - csirt, node_id, term, attribute, value: dictionary-encoded strings,
+#   i.e., int32 codes into a dictionary of the distinct strings of the file
+# - port_low, port_high: int32 port (range) for values of Port and Portlist
+#   elements (-1 for other values)
+# - ipv4: int64 IPv4 address for values of Address elements that are
+#   IPv4 addresses (-1 for other values)
+#
+# The last exported primary key is kept in a state file in the export
+# directory, so that the next run only exports the facts written since.
+# Facts of deleted revisions (see purge.py) are not removed from earlier
+# files.
+#
+# The files of a database are written into a generation directory
+# '<database>/<generation>' of the export directory. A full export starts
+# a new generation rather than adding all facts once more to the files
+# of the current one, so that each fact occurs once in the files of a
+# generation; readers use the current generation (see 'current_files').
+# The files of earlier generations may be removed once the full export
+# has finished.
+#
+# The dictionaries of the string columns are arrays of Python strings
+# (dtype object) rather than of fixed-width strings, which would take as much
+# space per entry as the longest value; hence, .npz files must be loaded with
+# numpy.load(path, allow_pickle=True).
+
+STRING_COLUMNS = ['csirt', 'node_id', 'term', 'attribute', 'value']
+
+FORMATS = ['npz', 'parquet']
+
+STATE_FILE = 'export-state.json'
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+RE_IPV4 = re.compile(r'^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$')
+
+RE_PORTS = re.compile(r'^\s*(\d{1,5})\s*(?:-\s*(\d{1,5})\s*)?$')
+
+
+def ipv4_value(term, value):
+    """
+    Return the IPv4 address in a value of an Address element as
+    integer, or -1.
+    """
+    if not term.endswith('Address') or not value:
+        return -1
+    match = RE_IPV4.match(value.strip())
+    if not match:
+        return -1
+    octets = [int(octet) for octet in match.groups()]
+    if max(octets) > 255:
+        return -1
+    return (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+
+
+def port_values(term, value):
+    """
+    Return the pair (low, high) for a value of a Port or Portlist
+    element (a port or a port range; port lists are split into single
+    values on import), or (-1, -1).
+    """
+    if term.rsplit('/', 1)[-1] not in ('Port', 'Portlist') or not value:
+        return (-1, -1)
+    match = RE_PORTS.match(value)
+    if not match:
+        return (-1, -1)
+    low = int(match.group(1))
+    high = int(match.group(2) or low)
+    if high > 65535 or low > high:
+        return (-1, -1)
+    return (low, high)
+
+
+def epoch_microseconds(timestamp):
+    if not timezone.is_aware(timestamp):
+        timestamp = timezone.make_aware(timestamp, timezone.utc)
+    delta = timestamp - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class DictionaryEncoder(object):
+    """
+    Maps strings to int32 codes in the order of their first occurrence.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.dictionary = []
+
+    def encode(self, value):
+        value = value or ''
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        return code
+
+
+def fact_chunk(rows):
+    """
+    Return the columns (see above) for a list of rows
+    (fact_id, iobject_id, timestamp, csirt, node_id, term, attribute, value)
+    as dictionary of NumPy arrays; a string column is given by the array of
+    codes '<column>' and the array of strings '<column>_dictionary'.
+    """
+    encoders = dict([(column, DictionaryEncoder()) for column in STRING_COLUMNS])
+    columns = dict([(column, []) for column in ['fact_id', 'iobject_id', 'timestamp', 'port_low', 'port_high', 'ipv4']
+                    + STRING_COLUMNS])
+
+    for (fact_id, iobject_id, timestamp, csirt, node_id, term, attribute, value) in rows:
+        columns['fact_id'].append(fact_id)
+        columns['iobject_id'].append(iobject_id)
+        columns['timestamp'].append(epoch_microseconds(timestamp))
+        for (column, string) in zip(STRING_COLUMNS, [csirt, node_id, term, attribute, value]):
+            columns[column].append(encoders[column].encode(string))
+        (low, high) = port_values(term, value) if not attribute else (-1, -1)
+        columns['port_low'].append(low)
+        columns['port_high'].append(high)
+        columns['ipv4'].append(ipv4_value(term, value) if not attribute else -1)
+
+    result = {'fact_id': numpy.array(columns['fact_id'], dtype=numpy.int64),
+              'iobject_id': numpy.array(columns['iobject_id'], dtype=numpy.int64),
+              'timestamp': numpy.array(columns['timestamp'], dtype='datetime64[us]'),
+              'port_low': numpy.array(columns['port_low'], dtype=numpy.int32),
+              'port_high': numpy.array(columns['port_high'], dtype=numpy.int32),
+              'ipv4': numpy.array(columns['ipv4'], dtype=numpy.int64)}
+    for column in STRING_COLUMNS:
+        result[column] = numpy.array(columns[column], dtype=numpy.int32)
+        result[column + '_dictionary'] = numpy.array(encoders[column].dictionary, dtype=object)
+    return result
+
+
+def write_npz(path, chunk):
+    numpy.savez_compressed(path, **chunk)
+
+
+def write_parquet(path, chunk):
+    # The string columns become dictionary arrays, which Parquet stores
+    # dictionary-encoded.
+    arrays = []
+    names = []
+    for (name, values) in sorted(chunk.items()):
+        if name.endswith('_dictionary'):
+            continue
+        if name in STRING_COLUMNS:
+            arrays.append(pyarrow.DictionaryArray.from_arrays(pyarrow.array(values),
+                                                              pyarrow.array(chunk[name + '_dictionary'].tolist(),
+                                                                            type=pyarrow.string())))
+        else:
+            arrays.append(pyarrow.array(values))
+        names.append(name)
+    pyarrow.parquet.write_table(pyarrow.Table.from_arrays(arrays, names=names), path)
+
+
+WRITERS = {'npz': write_npz,
+           'parquet': write_parquet}
+
+
+def check_format(format):
+    """
+    Raise ValueError if the given format is unknown or its library
+    is not installed.
+    """
+    if format not in WRITERS:
+        raise ValueError("Unknown export format '%s' (use one of %s)" % (format, ', '.join(FORMATS)))
+    if numpy is None:
+        raise ValueError("The export requires NumPy (pip install numpy)")
+    if format == 'parquet' and pyarrow is None:
+        raise ValueError("The Parquet export requires pyarrow (pip install pyarrow)")
+
+
+def read_state(directory):
+    path = os.path.join(directory, STATE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as state_file:
+        return json.load(state_file)
+
+
+def write_state(directory, state):
+    # The state is replaced atomically, so that an interrupted export
+    # leaves a consistent state behind.
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w') as state_file:
+        json.dump(state, state_file, indent=2, sort_keys=True)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(path + '.tmp', path)
+
+
+def generation_directory(directory, database, generation):
+    return os.path.join(directory, database, '%04d' % generation)
+
+
+def current_files(directory, database=DEFAULT_DB_ALIAS):
+    """
+    Return the sorted list of files of the current generation of the
+    given database in the export directory.
+    """
+    generation = read_state(directory).get('generation', {}).get(database)
+    if not generation:
+        return []
+    path = generation_directory(directory, database, generation)
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.startswith('facts-'))
+
+
+def export_facts(directory, format='npz', chunk_size=100000, full=False, progress=None):
+    """
+    Export the facts of the IODEF Incidents in the database written to (see
+    routers.py) into columnar files in 'directory' and return the list of
+    written files.
+
+    Only the facts written since the last export into the directory are
+    exported, unless 'full' is True, in which case all facts are exported
+    into a new generation directory. The facts are read in chunks
+    of 'chunk_size' primary keys; the function 'progress' is called with
+    the last primary key of the chunk, the highest primary key and the number
+    of rows exported so far after each chunk.
+
+    Note that facts that are committed by an import running at the time of
+    the export with primary keys below those exported already are only
+    picked up by a 'full' export.
+    """
+    check_format(format)
+
+    database = current_shard() or DEFAULT_DB_ALIAS
+    state = read_state(directory)
+    last_pks = state.setdefault('last_pk', {})
+    generations = state.setdefault('generation', {})
+    if full or not generations.get(database):
+        generations[database] = generations.get(database, 0) + 1
+        last_pks[database] = 0
+    lower = last_pks.get(database, 0)
+
+    # The new generation is recorded right away, so that an interrupted
+    # full export is continued in it.
+
+    path = generation_directory(directory, database, generations[database])
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    write_state(directory, state)
+
+    facts = InfoObject2Fact.objects.using(database).filter(iobject__iobject_family__name='iodef')
+    max_pk = facts.aggregate(Max('pk'))['pk__max'] or 0
+
+    written = []
+    exported = 0
+    while lower < max_pk:
+        upper = min(lower + chunk_size, max_pk)
+        rows = list(facts.filter(pk__gt=lower, pk__lte=upper)
+                    .order_by('pk')
+                    .values_list('pk',
+                                 'iobject',
+                                 'iobject__timestamp',
+                                 'iobject__identifier__uid',
+                                 'node_id__name',
+                                 'fact__fact_term__term',
+                                 'fact__fact_term__attribute',
+                                 'fact__fact_values__value'))
+        if rows:
+            filepath = os.path.join(path, 'facts-%s-%010d-%010d.%s' % (database, lower + 1, upper, format))
+            WRITERS[format](filepath, fact_chunk(rows))
+            written.append(filepath)
+            exported += len(rows)
+
+        # The state is advanced after each chunk, so that an interrupted
+        # export continues with the next chunk.
+
+        last_pks[database] = upper
+        write_state(directory, state)
+        lower = upper
+        if progress:
+            progress(upper, max_pk, exported)
+    return written
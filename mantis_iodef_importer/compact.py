@@ -0,0 +1,171 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from dingos.core.datastructures import DingoObjDict
+
+
+# Markers for empty dictionaries and lists (DingoObjDicts contain
+# neither tuples nor these, so they cannot be confused with values).
+
+EMPTY_DICT = ('dict',)
+EMPTY_LIST = ('list',)
+
+# Values up to this length are interned: attribute values such as
+# 'ipv4-addr' or 'mitigation' recur in most Incidents of a feed.
+
+MAX_INTERNED_VALUE_LENGTH = 32
+
+STRING_TYPES = (type(b''), type(u''))
+
+# Maximal number of interned objects; the table is cleared when it is full.
+
+MAX_INTERNED = 100000
+
+_interned = {}
+
+
+def intern_object(obj):
+    """
+    Return the canonical instance of a string or path tuple. (The builtin
+    'intern' does not take unicode strings in Python 2.)
+    """
+    try:
+        return _interned[obj]
+    except KeyError:
+        if len(_interned) >= MAX_INTERNED:
+            _interned.clear()
+        _interned[obj] = obj
+        return obj
+
+
+class CompactIncident(object):
+    """
+    Compact representation of the DingoObjDict of an Incident, used
+    while the Incident waits between parsing and persistence.
+
+    A DingoObjDict keeps a sorted dictionary (a dict plus a key list)
+    per element. The compact representation keeps two flat lists instead:
+    for each leaf of the dictionary (text, attribute value, empty element)
+    its path and its value. A path is a tuple of keys, where a key that
+    is followed by an integer stands for the list of repeated elements
+    of that name and the integer for the position in that list, e.g.::
+
+        ('EventData', 'Flow', 0, 'System', 1, 'Node', 'Address', '_value')
+
+    Keys, paths and short values are interned, so that they are shared by
+    all Incidents with the same structure.
+
+    'to_dict' restores the DingoObjDict with the original key order.
+    """
+
+    __slots__ = ('paths', 'values')
+
+    def __init__(self, paths=None, values=None):
+        self.paths = paths or []
+        self.values = values or []
+
+    @classmethod
+    def from_dict(cls, elt_dict):
+        result = cls()
+        result.add_dict(elt_dict, ())
+        return result
+
+    def add_dict(self, contents, path):
+        for (key, value) in contents.items():
+            key_path = path + (intern_object(key),)
+            if isinstance(value, list):
+                if not value:
+                    self.add_leaf(key_path, EMPTY_LIST)
+                for (position, item) in enumerate(value):
+                    self.add_value(key_path + (position,), item)
+            else:
+                self.add_value(key_path, value)
+
+    def add_value(self, path, value):
+        if isinstance(value, dict):
+            if value:
+                self.add_dict(value, path)
+            else:
+                self.add_leaf(path, EMPTY_DICT)
+        else:
+            self.add_leaf(path, value)
+
+    def add_leaf(self, path, value):
+        self.paths.append(intern_object(path))
+        if isinstance(value, STRING_TYPES) and len(value) <= MAX_INTERNED_VALUE_LENGTH:
+            value = intern_object(value)
+        self.values.append(value)
+
+    def to_dict(self):
+        root = DingoObjDict()
+        for (path, value) in zip(self.paths, self.values):
+            if value == EMPTY_DICT:
+                value = DingoObjDict()
+            elif value == EMPTY_LIST:
+                value = []
+
+            node = root
+            i = 0
+            last = len(path) - 1
+            while True:
+                key = path[i]
+                if i < last and isinstance(path[i + 1], int):
+                    items = node.get(key)
+                    if items is None:
+                        items = node[key] = []
+                    if i + 1 == last:
+                        items.append(value)
+                        break
+                    if path[i + 1] == len(items):
+                        items.append(DingoObjDict())
+                    node = items[path[i + 1]]
+                    i += 2
+                elif i == last:
+                    node[key] = value
+                    break
+                else:
+                    child = node.get(key)
+                    if child is None:
+                        child = node[key] = DingoObjDict()
+                    node = child
+                    i += 1
+        return root
+
+    def __len__(self):
+        return len(self.paths)
+
+    # With __slots__, objects must provide their state for pickling
+    # (e.g., for handing them to worker processes); the receiving
+    # process interns the paths again.
+
+    def __getstate__(self):
+        return (self.paths, self.values)
+
+    def __setstate__(self, state):
+        (paths, values) = state
+        self.paths = [intern_object(path) for path in paths]
+        self.values = values
+
+
+def expand(elt_dict):
+    """
+    Return the DingoObjDict for a compact or non-compact representation.
+    """
+    if isinstance(elt_dict, CompactIncident):
+        return elt_dict.to_dict()
+    return elt_dict
@@ -0,0 +1,233 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+import logging
+
+import re
+
+from django.conf import settings
+
+from django.db.models import Count
+
+from mantis_iodef_importer import metrics
+
+from mantis_iodef_importer.models import IncidentObservable
+
+logger = logging.getLogger(__name__)
+
+
+# Hash values found in AdditionalData, by length of the hex digest
+
+RE_HEX = re.compile('^[0-9a-fA-F]+$')
+
+HASH_KINDS = {32: 'md5', 40: 'sha1', 64: 'sha256'}
+
+# Port ranges in a Portlist (e.g., '137-139') are only expanded up to this size
+
+MAX_PORT_RANGE = 1024
+
+MAX_VALUE_LENGTH = 255
+
+
+def text(value):
+    if isinstance(value, dict):
+        value = value.get('_value')
+    return value.strip() if value else None
+
+
+def normalize(kind, value):
+    """
+    Normalize an observable value, so that different spellings of the
+    same observable are found under the same key.
+    """
+    value = value.strip().lower()
+    if kind == 'domain':
+        value = value.rstrip('.')
+    elif kind == 'port':
+        value = value.lstrip('0') or '0'
+    return value
+
+
+def observable_digest(kind, value):
+    return hashlib.sha256(('%s:%s' % (kind, value)).encode('utf-8')).hexdigest()
+
+
+def portlist_ports(portlist):
+    """
+    Expand a Portlist such as '137-139,445' into single ports.
+    """
+    result = []
+    for item in portlist.split(','):
+        item = item.strip()
+        if '-' in item:
+            (low, high) = item.split('-', 1)
+            try:
+                (low, high) = (int(low), int(high))
+            except ValueError:
+                continue
+            if 0 <= high - low <= MAX_PORT_RANGE:
+                result.extend([str(port) for port in range(low, high + 1)])
+        elif item:
+            result.append(item)
+    return result
+
+
+def extract_observables(contents, result=None):
+    """
+    Return the set of (kind, normalized value) pairs of the observables
+    in the DingoObjDict of an Incident:
+
+    - Address: kind is the address category (default 'ipv4-addr')
+    - NodeName: kind 'domain'
+    - Port and Portlist: kind 'port'
+    - AdditionalData consisting of an MD5, SHA-1 or SHA-256 hex digest:
+      kind 'md5', 'sha1' resp. 'sha256'
+    """
+    if result is None:
+        result = set()
+
+    if isinstance(contents, list):
+        for item in contents:
+            extract_observables(item, result)
+        return result
+
+    if not isinstance(contents, dict):
+        return result
+
+    for (key, value) in contents.items():
+        if key.startswith('@') or key == '_value':
+            continue
+        for item in (value if isinstance(value, list) else [value]):
+            item_text = text(item) if key in ('Address', 'NodeName', 'Port', 'Portlist', 'AdditionalData') else None
+
+            if key == 'Address' and item_text:
+                category = item.get('@category', 'ipv4-addr') if isinstance(item, dict) else 'ipv4-addr'
+                result.add((category, normalize(category, item_text)))
+            elif key == 'NodeName' and item_text:
+                result.add(('domain', normalize('domain', item_text)))
+            elif key == 'Port' and item_text:
+                result.add(('port', normalize('port', item_text)))
+            elif key == 'Portlist' and item_text:
+                result.update([('port', normalize('port', port)) for port in portlist_ports(item_text)])
+            elif key == 'AdditionalData' and item_text and len(item_text) in HASH_KINDS and RE_HEX.match(item_text):
+                kind = HASH_KINDS[len(item_text)]
+                result.add((kind, normalize(kind, item_text)))
+            else:
+                extract_observables(item, result)
+
+    return result
+
+
+class CorrelationIndex(object):
+    """
+    Maintains the IncidentObservable index during an import.
+
+    For each imported Incident, the Incidents that share observables with it
+    are determined with one lookup by the digests of its observables, and
+    the observables of the Incident are then added to the index. The cost
+    thus depends on the number of observables of the new Incident, not on
+    the size of the index.
+
+    Observables found in more than 'max_frequency' Incidents already
+    (e.g., common ports or the address of a popular resolver) are indexed,
+    but not used for correlation: they say little about an Incident, and
+    each lookup would return a good part of the index. At most
+    'max_correlations' correlations are reported per Incident, those with
+    the most shared observables.
+    """
+
+    def __init__(self, max_frequency=None, max_correlations=None):
+        if max_frequency is None:
+            max_frequency = getattr(settings, 'MANTIS_IODEF_CORRELATION_MAX_FREQUENCY', 1000)
+        if max_correlations is None:
+            max_correlations = getattr(settings, 'MANTIS_IODEF_CORRELATION_MAX_RESULTS', 100)
+        self.max_frequency = max_frequency
+        self.max_correlations = max_correlations
+        self.stats = {'observables': 0, 'correlations': 0, 'frequent': 0}
+
+    def copy(self):
+        return CorrelationIndex(max_frequency=self.max_frequency, max_correlations=self.max_correlations)
+
+    def frequent_digests(self, digests):
+        """
+        Return the set of those digests that occur in the index for
+        more than 'max_frequency' Information Objects.
+        """
+        return set(IncidentObservable.objects
+                   .filter(digest__in=digests)
+                   .values('digest')
+                   .annotate(frequency=Count('iobject'))
+                   .filter(frequency__gt=self.max_frequency)
+                   .values_list('digest', flat=True))
+
+    def update(self, iobject, elt_dict):
+        """
+        Index the observables of the Incident with Information Object 'iobject'
+        and return its correlations as dictionary mapping the pk of each
+        correlated Information Object to the list of shared (kind, value) pairs
+        (at most 'max_correlations' entries). Other revisions of the same
+        Incident are not reported.
+        """
+        observables = dict([(observable_digest(kind, value), (kind, value))
+                            for (kind, value) in extract_observables(elt_dict)
+                            if len(value) <= MAX_VALUE_LENGTH])
+
+        if not observables:
+            return {}
+
+        frequent = self.frequent_digests(list(observables.keys()))
+        digests = [digest for digest in observables if digest not in frequent]
+
+        correlations = {}
+        if digests:
+            matches = (IncidentObservable.objects
+                       .filter(digest__in=digests)
+                       .exclude(iobject__identifier=iobject.identifier_id)
+                       .values_list('iobject', 'digest'))
+            for (iobject_pk, digest) in matches:
+                correlations.setdefault(iobject_pk, []).append(observables[digest])
+
+        found = len(correlations)
+        if found > self.max_correlations:
+            kept = sorted(correlations.items(), key=lambda item: (-len(item[1]), item[0]))[:self.max_correlations]
+            correlations = dict(kept)
+
+        # An existing index entry of the same object stems from an earlier
+        # import of the same revision; it is replaced.
+
+        IncidentObservable.objects.filter(iobject=iobject).delete()
+        IncidentObservable.objects.bulk_create([IncidentObservable(digest=digest,
+                                                                   kind=kind,
+                                                                   value=value,
+                                                                   iobject=iobject)
+                                                for (digest, (kind, value)) in observables.items()])
+
+        self.stats['observables'] += len(observables)
+        self.stats['correlations'] += found
+        self.stats['frequent'] += len(frequent)
+        metrics.CORRELATIONS.inc(found)
+
+        if found:
+            logger.info("Incident %s shares observables with %s other Incidents (%s reported, "
+                        "%s frequent observables not correlated)" % (iobject.pk,
+                                                                     found,
+                                                                     len(correlations),
+                                                                     len(frequent)))
+        return correlations
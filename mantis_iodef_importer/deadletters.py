@@ -0,0 +1,190 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import glob
+
+import hashlib
+
+import json
+
+import os
+
+import threading
+
+from xml.sax.saxutils import quoteattr
+
+import libxml2
+
+from django.utils import timezone
+
+from dingos.core.xml_utils import extract_attributes
+
+
+class DeadLetterSpool(object):
+    """
+    Directory of Incidents that could not be imported.
+
+    Each dead letter consists of two files with the same base name:
+
+    - '<name>.xml': a self-contained IODEF document that contains just
+      the failed Incident (and can therefore be imported again like any
+      other IODEF file)
+    - '<name>.err': a JSON document with the error and the origin of
+      the Incident (input file, ordinal and IncidentID)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Created concurrently by another import
+                if not os.path.isdir(directory):
+                    raise
+
+    def write(self, incident_xml, error, root_name='IODEF-Document', root_attributes=None, **info):
+        """
+        Write a dead letter for the serialized Incident 'incident_xml' that
+        failed with 'error'; 'root_name' and 'root_attributes' (including the
+        namespace declarations) are those of the IODEF-Document element in
+        which the Incident was found (see IncidentSource). Further
+        information about the Incident's origin can be passed as keyword arguments.
+
+        Returns the path of the XML file of the dead letter.
+        """
+        if not isinstance(incident_xml, bytes):
+            incident_xml = incident_xml.encode('utf-8')
+
+        name = "%s-%s" % (timezone.now().strftime('%Y%m%dT%H%M%S%f'),
+                          hashlib.sha256(incident_xml).hexdigest()[:16])
+
+        attributes = dict(root_attributes or {})
+        attributes.setdefault('version', '1.00')
+        root_attributes = ''.join([' %s=%s' % (key, quoteattr(attributes[key])) for key in sorted(attributes)])
+
+        xml_path = os.path.join(self.directory, '%s.xml' % name)
+        with open(xml_path, 'wb') as xml_file:
+            xml_file.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+            xml_file.write(('<%s%s>\n' % (root_name, root_attributes)).encode('utf-8'))
+            xml_file.write(incident_xml)
+            xml_file.write(('\n</%s>\n' % root_name).encode('utf-8'))
+
+        info['error'] = error
+        info['timestamp'] = timezone.now().isoformat()
+        self.write_error(xml_path, info)
+
+        return xml_path
+
+    def error_path(self, xml_path):
+        return '%s.err' % os.path.splitext(xml_path)[0]
+
+    def write_error(self, xml_path, info):
+        with open(self.error_path(xml_path), 'w') as error_file:
+            json.dump(info, error_file, indent=2, default=str)
+
+    def read_error(self, xml_path):
+        try:
+            with open(self.error_path(xml_path)) as error_file:
+                return json.load(error_file)
+        except (IOError, ValueError):
+            return {}
+
+    def remove(self, xml_path):
+        for path in [xml_path, self.error_path(xml_path)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def paths(self):
+        """
+        Return the paths of the XML files of all dead letters, oldest first.
+        """
+        return sorted(glob.glob(os.path.join(self.directory, '*.xml')))
+
+    def __len__(self):
+        return len(self.paths())
+
+
+class IncidentSource(object):
+    """
+    Access to the raw XML of the Incidents of an imported document, from
+    which dead letters are written.
+
+    The tree that is walked by the import is pruned and freed along the way,
+    and most Incidents never fail; rather than keeping the XML of every
+    Incident, the document is therefore parsed again from the file or content
+    when the first dead letter is written for it (see 'close').
+    """
+
+    def __init__(self, filepath=None, xml_content=None):
+        self.filepath = filepath
+        self.xml_content = xml_content
+        self.doc = None
+        self.lock = threading.Lock()
+
+    def incident(self, ordinal):
+        """
+        Return the serialized 'ordinal'-th Incident (counting from 1) of the document
+        along with the qualified name and the attributes of the document element.
+        The attributes include all namespace declarations of the document element,
+        so that the Incident can be wrapped into a document of its own. Returns
+        None if the document has no such Incident.
+        """
+        with self.lock:
+            if self.doc is None:
+                if self.xml_content:
+                    self.doc = libxml2.parseDoc(self.xml_content)
+                else:
+                    self.doc = libxml2.recoverFile(self.filepath)
+
+            root = self.doc.getRootElement()
+
+            count = 0
+            child = root.children
+            while child:
+                if child.type == 'element' and child.name == 'Incident':
+                    count += 1
+                    if count == ordinal:
+                        return (child.serialize('UTF-8'),) + self.root_info(root)
+                child = child.next
+        return None
+
+    def root_info(self, root):
+        attributes = extract_attributes(root, prefix_key_char='')
+
+        ns_def = root.nsDefs()
+        while ns_def:
+            if ns_def.name:
+                attributes['xmlns:%s' % ns_def.name] = ns_def.content
+            else:
+                attributes['xmlns'] = ns_def.content
+            ns_def = ns_def.next
+
+        namespace = root.ns()
+        prefix = namespace.name if namespace is not None else None
+
+        return ('%s:%s' % (prefix, root.name) if prefix else root.name, attributes)
+
+    def close(self):
+        """
+        Free the parsed document (if any).
+        """
+        with self.lock:
+            if self.doc is not None:
+                self.doc.freeDoc()
+                self.doc = None
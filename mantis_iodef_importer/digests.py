@@ -0,0 +1,75 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+from dingos import DINGOS_BLOB_TABLE
+
+from dingos.models import BlobStorage
+
+from mantis_iodef_importer import metrics
+
+
+class FactValueDigestIndex(object):
+    """
+    Store long values in the blob table of DINGO and refer to them via
+    their digest.
+
+    DINGO looks up (or creates) a FactValue for each value of each fact
+    by an equality lookup on the value column, whose cost grows with
+    the length of the value; it only moves values of more than
+    DINGOS_MAX_VALUE_SIZE_WRITTEN_TO_VALUE_TABLE (2048) characters into its
+    blob table. Values with at least 'threshold' characters are moved
+    there, too: each distinct value is written once into the blob table,
+    keyed by its SHA-256 digest, and the fact is given the pair
+    (digest, DINGOS_BLOB_TABLE) as value, so that the FactValue is looked
+    up via the fixed-size digest.
+
+    Just as for the values that DINGO moves into the blob table itself,
+    the FactValue then holds the digest rather than the value: DINGO
+    resolves it when naming an object, but 'to_dict' returns the digest,
+    and the value cannot be found by searching for it. The index is therefore
+    only used if a threshold has been configured.
+
+    No in-memory cache is kept of the stored values: a blob written for an
+    Incident that is rolled back (see iodef_Import.shard_batch_import)
+    would remain in the cache; the lookup of a blob is a single query on
+    the unique digest column.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def applies(self, value):
+        return bool(value) and len(value) >= self.threshold
+
+    def stored_value(self, value):
+        """
+        Return the value to be handed to DINGO for the given long value:
+        the pair of its digest and DINGOS_BLOB_TABLE. The value is
+        written into the blob table unless it is stored there already.
+        """
+        encoded = value if isinstance(value, bytes) else value.encode('utf-8')
+        digest = hashlib.sha256(encoded).hexdigest()
+
+        blob, created = BlobStorage.objects.get_or_create(sha256=digest, defaults={'content': value})
+        self.stats['misses' if created else 'hits'] += 1
+        metrics.CACHE_REQUESTS.inc(cache='value_digest', result='miss' if created else 'hit')
+
+        return (digest, DINGOS_BLOB_TABLE)
@@ -0,0 +1,188 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import datetime
+
+import threading
+
+from django.utils import timezone
+
+from django.utils.dateparse import parse_datetime, parse_date
+
+
+class IncidentFilter(object):
+    """
+    Declarative filter for the Incidents of an IODEF document.
+
+    The filter is evaluated by the iodef importer while the
+    XML is walked, i.e., before an Incident is turned into
+    a DingoObjDict (see 'id_and_revision_extractor' in the importer).
+    An Incident is accepted if it satisfies all given conditions:
+
+    - purpose: list of accepted values of the Incident's 'purpose' attribute
+    - restriction: list of accepted values of the Incident's 'restriction' attribute
+    - csirt: list of accepted values of the 'name' attribute of the IncidentID
+    - incident_id: list of accepted IncidentID values
+    - report_time_after/report_time_before: bounds for the ReportTime
+    - max_age_days: maximal age of the ReportTime in days, counted from the
+      time of import
+
+    Incidents without ReportTime are rejected if a condition on the
+    ReportTime has been given.
+
+    The filter keeps statistics about accepted and rejected Incidents; it
+    may be shared by concurrent imports.
+
+    For the command line, a filter is specified as list of strings
+    of the form '<key>=<value>[,<value>...]', e.g.::
+
+        purpose=mitigation,reporting
+        max_age_days=30
+
+    (dashes may be used instead of underscores in the key).
+    """
+
+    LIST_KEYS = ['purpose', 'restriction', 'csirt', 'incident_id']
+
+    TIME_KEYS = ['report_time_after', 'report_time_before']
+
+    def __init__(self,
+                 purpose=None,
+                 restriction=None,
+                 csirt=None,
+                 incident_id=None,
+                 report_time_after=None,
+                 report_time_before=None,
+                 max_age_days=None):
+
+        self.purpose = set(purpose) if purpose else None
+        self.restriction = set(restriction) if restriction else None
+        self.csirt = set(csirt) if csirt else None
+        self.incident_id = set(incident_id) if incident_id else None
+        self.report_time_after = report_time_after
+        self.report_time_before = report_time_before
+        self.max_age_days = max_age_days
+
+        self.stats_lock = threading.Lock()
+
+        self.reset_stats()
+
+    @classmethod
+    def from_specs(cls, specs):
+        """
+        Create a filter from a list of '<key>=<value>[,<value>...]' strings.
+        """
+        kwargs = {}
+        for spec in specs:
+            if not '=' in spec:
+                raise ValueError("Filter specification '%s' is not of the form <key>=<value>" % spec)
+            (key, value) = spec.split('=', 1)
+            key = key.strip().replace('-', '_')
+            value = value.strip()
+
+            if key in cls.LIST_KEYS:
+                kwargs.setdefault(key, []).extend([x.strip() for x in value.split(',') if x.strip()])
+            elif key in cls.TIME_KEYS:
+                kwargs[key] = parse_filter_time(value)
+            elif key == 'max_age_days':
+                kwargs[key] = int(value)
+            else:
+                raise ValueError("Unknown filter key '%s'" % key)
+
+        return cls(**kwargs)
+
+    @classmethod
+    def coerce(cls, incident_filter):
+        """
+        Turn the 'incident_filter' argument of the importer into an
+        IncidentFilter: the argument may be an IncidentFilter, a dictionary
+        of keyword arguments or a list of filter specifications.
+        """
+        if not incident_filter or isinstance(incident_filter, IncidentFilter):
+            return incident_filter or None
+        if isinstance(incident_filter, dict):
+            return cls(**incident_filter)
+        return cls.from_specs(incident_filter)
+
+    def reset_stats(self):
+        self.stats = {'accepted': 0,
+                      'rejected': {}}
+
+    def rejection_reason(self, attributes, csirt, incident_id, report_time, now=None):
+        """
+        Return None if an Incident with the given data is accepted; otherwise,
+        the name of the first condition that failed.
+        """
+        if self.purpose is not None and attributes.get('purpose') not in self.purpose:
+            return 'purpose'
+        if self.restriction is not None and attributes.get('restriction') not in self.restriction:
+            return 'restriction'
+        if self.csirt is not None and csirt not in self.csirt:
+            return 'csirt'
+        if self.incident_id is not None and incident_id not in self.incident_id:
+            return 'incident_id'
+
+        if self.report_time_after or self.report_time_before or self.max_age_days is not None:
+            if not report_time:
+                return 'report_time'
+            if self.report_time_after and report_time < self.report_time_after:
+                return 'report_time'
+            if self.report_time_before and report_time > self.report_time_before:
+                return 'report_time'
+            if self.max_age_days is not None:
+                if not now:
+                    now = timezone.now()
+                if report_time < now - datetime.timedelta(days=self.max_age_days):
+                    return 'report_time'
+        return None
+
+    def check(self, attributes, csirt, incident_id, report_time, now=None):
+        """
+        Evaluate the filter for an Incident and record the outcome in the
+        filter statistics. Returns True if the Incident is accepted.
+        """
+        reason = self.rejection_reason(attributes, csirt, incident_id, report_time, now=now)
+        with self.stats_lock:
+            if reason:
+                self.stats['rejected'][reason] = self.stats['rejected'].get(reason, 0) + 1
+            else:
+                self.stats['accepted'] += 1
+        return not reason
+
+    def stats_summary(self):
+        rejected = self.stats['rejected']
+        result = "%s Incidents accepted, %s rejected" % (self.stats['accepted'], sum(rejected.values()))
+        if rejected:
+            result += " (%s)" % ", ".join(["%s: %s" % (key, rejected[key]) for key in sorted(rejected)])
+        return result
+
+
+def parse_filter_time(value):
+    """
+    Parse a datetime or date given in a filter specification; naive
+    values are interpreted as UTC.
+    """
+    result = parse_datetime(value)
+    if not result:
+        date = parse_date(value)
+        if not date:
+            raise ValueError("Cannot parse date/time '%s'" % value)
+        result = datetime.datetime(date.year, date.month, date.day)
+    if not timezone.is_aware(result):
+        result = timezone.make_aware(result, timezone.utc)
+    return result
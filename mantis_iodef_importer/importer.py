@@ -16,10 +16,30 @@
 #
 
 
+import copy
+
 import logging
 
+import functools
+
+import multiprocessing
+
+import multiprocessing.pool
+
+import os
+
 import re
 
+import sys
+
+import threading
+
+import time
+
+from django.conf import settings
+
+from django.db import connections
+
 from django.utils import timezone
 
 from django.utils.dateparse import parse_datetime
@@ -32,20 +52,71 @@ from dingos.core.utilities import search_by_re_list, set_dict
 
 from dingos.core.xml_utils import extract_attributes
 
+from dingos.import_handling import EXIST_ID_AND_EXACT_TIMESTAMP
+
 from mantis_core.import_handling import MantisImporter
 
 from mantis_core.models import FactDataType
 
 from mantis_core.models import Identifier
 
+from mantis_iodef_importer.aggregates import AggregateCounter
+
+from mantis_iodef_importer.batching import BatchController
+
+from mantis_iodef_importer.checkpoints import Checkpointer, input_digest
+
+from mantis_iodef_importer.compact import CompactIncident, expand
+
+from mantis_iodef_importer.correlation import CorrelationIndex
+
+from mantis_iodef_importer.deadletters import DeadLetterSpool, IncidentSource
+
+from mantis_iodef_importer.digests import FactValueDigestIndex
+
+from mantis_iodef_importer.filtering import IncidentFilter
+
+from mantis_iodef_importer.markings import MarkingCache, create_marking_links, marking_identifier, resolve_markings
+
+from mantis_iodef_importer.memo import StructureMemo
+
+from mantis_iodef_importer import metrics
+
+from mantis_iodef_importer.naming import IncidentNamer
+
+from mantis_iodef_importer.projection import Projection
+
+from mantis_iodef_importer.routers import configured_shards, current_shard, group_by_shard, shard_for, use_shard
+
+from mantis_iodef_importer.scheduler import FairScheduler
+
+from mantis_iodef_importer.snapshots import record_snapshot
+
+from mantis_iodef_importer.streaming import iter_documents
+
+from mantis_iodef_importer.timeline import record_timeline
+
+from mantis_iodef_importer.transactions import atomic, savepoint
+
 logger = logging.getLogger(__name__)
 
 
 
-class iodef_Import:
-    def __init__(self, *args, **kwargs):
+class ImportContext(object):
+    """
+    State of a single run of iodef_Import.xml_import.
+
+    Everything that is set up or changed while a document is imported lives
+    here rather than in the importer object, so that one importer can
+    carry out several imports at the same time (e.g., in several threads).
+    Each import works with a copy of the importer to which its context
+    is bound (see iodef_Import.bind); the hooks that are passed to the
+    generic DINGO xml import read the context from there.
+    """
+
+    def __init__(self, identifier_ns_uri=None, markings=None):
 
-        # We initialize the namespace dictionary for this importer
+        # We initialize the namespace dictionary for this import
         # with the dingos default namespace. In case the XML file
         # does not provide namespace information, the default
         # namespace is used.
@@ -54,9 +125,8 @@ class iodef_Import:
 
 
         # Whenever an object is created, we save the creation time.
-        # Note that the xml_import function below makes a call to
-        # __init__, so the timestamp is set freshly for each
-        # call to this function.
+        # A new context is created for each call of xml_import,
+        # so the timestamp is set freshly for each call to this function.
 
         self.create_timestamp = timezone.now()
 
@@ -64,7 +134,177 @@ class iodef_Import:
         # a namespace. In case we cannot extract one from the
         # xml, we set the default Dingos ID namespace.
 
-        self.identifier_ns_uri = DINGOS_DEFAULT_ID_NAMESPACE_URI
+        self.identifier_ns_uri = identifier_ns_uri or DINGOS_DEFAULT_ID_NAMESPACE_URI
+
+        # We provide default values for family name and revision in case
+        # there is no namespace info.
+
+        self.iobject_family_name = 'iodef'
+        self.iobject_family_revision_name = ''
+
+        # Namespace of the top-level element
+
+        self.default_ns = None
+
+        # Markings with which all generated Information Objects are associated
+
+        self.markings = markings or []
+
+        # Copies of the markings in the shard databases (see iodef_Import.shard_markings)
+
+        self.markings_by_shard = {}
+
+        # Marking objects looked up in this import run (see markings.MarkingCache)
+
+        self.marking_cache = MarkingCache()
+
+        # Database aliases across which the Incidents are distributed
+        # (see routers.py); empty if the database is not sharded
+
+        self.shards = []
+
+        # Filter for Incidents (see filtering.IncidentFilter)
+
+        self.incident_filter = None
+
+        # Projection of Incident contents (see projection.Projection)
+
+        self.projection = None
+
+        # Storage of long values via their digest (see digests.FactValueDigestIndex)
+
+        self.value_digests = None
+
+        # Checkpointing of committed Incidents (see checkpoints.Checkpointer)
+
+        self.checkpointer = None
+
+        # Number of Incidents encountered so far in the document
+
+        self.incident_ordinal = 0
+
+        # Name of the imported file (for reporting)
+
+        self.source = None
+
+        # Number of Incidents that are written to the database
+        # in one transaction
+
+        self.batch_size = 1
+
+        # Controller that adapts the batch size to the observed
+        # transaction times (see batching.BatchController); if set,
+        # it takes precedence over 'batch_size'
+
+        self.batch_controller = None
+
+        # Number of facts written so far (counted by the fact handlers)
+
+        self.facts = 0
+
+        # Spool for Incidents that could not be imported (see deadletters.DeadLetterSpool)
+
+        self.dead_letters = None
+
+        # Raw XML of the Incidents of the document for the dead letters
+        # (see deadletters.IncidentSource)
+
+        self.incident_source = None
+
+        # Whether a failed Incident is to be reported and skipped (rather
+        # than aborting the import)
+
+        self.isolate_failures = True
+
+        # Number of Incidents that could not be imported
+
+        self.failed = 0
+
+        # Index of observables shared between Incidents (see correlation.CorrelationIndex)
+
+        self.correlation_index = None
+
+        # Whether the points in time of the Incidents are written to the
+        # timeline (see models.IncidentTimeline)
+
+        self.timeline = False
+
+        # Whether the aggregate counts (see models.IncidentAggregate) are maintained
+
+        self.aggregate = False
+
+        # Whether a snapshot of each Incident is stored (see models.IncidentSnapshot)
+
+        self.snapshots = False
+
+        # Memo of fact terms, node ids and namespace maps (see memo.StructureMemo);
+        # None if facts are written by DINGO's add_fact
+
+        self.memo = None
+
+        # Naming of Incidents from their dictionaries (see naming.IncidentNamer)
+
+        self.namer = IncidentNamer()
+
+        # Function that is called after each committed batch with the list
+        # of id and revision info of the Incidents that have been committed
+
+        self.on_commit = None
+
+        # Scheduler into which the Incidents are queued rather than written
+        # right away (see iodef_Import.scheduled_import)
+
+        self.scheduler = None
+
+        # Purposes of Incidents that are scheduled before all others
+
+        self.priority_purposes = ()
+
+        # Number of scheduled Incidents of the document that have not been written yet
+
+        self.outstanding = 0
+
+    def worker_copy(self):
+        """
+        Return a copy of the context for the persistence stage in a worker
+        process: state of the parse stage (filter, projection) is left out, and
+        caches are started afresh.
+        """
+        copy = ImportContext(identifier_ns_uri=self.identifier_ns_uri, markings=self.markings)
+        for attr in ['namespace_dict',
+                     'create_timestamp',
+                     'iobject_family_name',
+                     'iobject_family_revision_name',
+                     'default_ns',
+                     'source',
+                     'batch_size',
+                     'timeline',
+                     'aggregate',
+                     'snapshots',
+                     'shards',
+                     'dead_letters',
+                     'incident_source',
+                     'isolate_failures']:
+            setattr(copy, attr, getattr(self, attr))
+        if self.value_digests:
+            copy.value_digests = FactValueDigestIndex(self.value_digests.threshold)
+        if self.checkpointer:
+            copy.checkpointer = Checkpointer(self.checkpointer.file_digest)
+        if self.correlation_index:
+            copy.correlation_index = self.correlation_index.copy()
+        if self.batch_controller:
+            copy.batch_controller = self.batch_controller.copy()
+        if self.memo:
+            copy.memo = StructureMemo()
+        return copy
+
+
+class iodef_Import:
+    def __init__(self, *args, **kwargs):
+
+        # The importer itself carries no state of a running import
+        # (see ImportContext above) -- only configuration that
+        # does not change between imports.
 
         # We use the list of regular expressions below to
         # extract namespace and revision info from the provided
@@ -91,12 +331,40 @@ class iodef_Import:
            "(?P<family_ns>urn:ietf:params:xml:ns:(?P<family>(?P<family_tag>[^-]*)))-(?P<revision>.*)")
         ]
 
-        # We provide default values for family name and revision in case
-        # there is no namespace info.
 
-        self.iobject_family_name = 'iodef'
-        self.iobject_family_revision_name = ''
+    # The ImportContext of the running import; it is only set on the
+    # copies of the importer that are made for each import (see 'bind').
+
+    ctx = None
+
+    # The DingoObjDict of the Incident whose facts are being written and
+    # which is still to be named (see 'iodef_naming_fact_handler'); it is
+    # only set on the copy of the importer made for that Incident.
 
+    incident_dict = None
+
+    # The entries of the running batch in the memo of the import (see
+    # memo.MemoBatch) and the InfoObject2Fact rows written so far for the
+    # object being imported (see 'iodef_memo_fact_handler'); they are only
+    # set on the copy of the importer made for that object.
+
+    memo_batch = None
+
+    written_facts = None
+
+    def bind(self, ctx):
+        """
+        Return a (shallow) copy of the importer to which the given
+        ImportContext is bound as 'ctx'.
+
+        The hooks for the generic DINGO import keep their signatures and
+        read the state of the running import from 'self.ctx'; since each
+        import works with a copy of its own, the importer can still
+        carry out several imports at the same time.
+        """
+        importer = copy.copy(self)
+        importer.ctx = ctx
+        return importer
 
     #
     # First of all, we define functions for the hooks provided to us
@@ -166,13 +434,24 @@ class iodef_Import:
         For the iodef import, we only extract embedded 'Incident' objects and
         therefore must teach this function to extract identifier and
         timestamp for incidents.
+
+        The state of the running import is read from the ImportContext
+        'self.ctx' (see 'bind').
         """
 
+        ctx = self.ctx
+
         result = {'id': None, 'timestamp': None}
 
         if not xml_elt.name == "Incident":
             return result
 
+        # We number the Incidents of the document; the ordinal identifies
+        # the Incident for checkpointing.
+
+        ctx.incident_ordinal += 1
+        result['ordinal'] = ctx.incident_ordinal
+
         # So we have an Incident node. These have the following shape::
         #
         #    <Incident purpose="mitigation">
@@ -188,20 +467,31 @@ class iodef_Import:
         found_id = False
         found_ts = False
 
+        csirt = None
+        incident_id = None
+
         while child:
             attributes = extract_attributes(child, prefix_key_char='')
 
             if child.name == "IncidentID":
-                result['id'] = '%s:%s' % (attributes.get('name'), child.content)
+                csirt = attributes.get('name')
+                incident_id = child.content
+                result['id'] = '%s:%s' % (csirt, incident_id)
                 found_id = True
 
             elif child.name == "ReportTime":
-                naive = parse_datetime(child.content)
-                if not timezone.is_aware(naive):
-                    aware = timezone.make_aware(naive, timezone.utc)
+                try:
+                    naive = parse_datetime(child.content)
+                except ValueError:
+                    naive = None
+                if not naive:
+                    # We cannot raise an exception here, because
+                    # that would abort the import of the whole document.
+                    result['error'] = "Cannot parse ReportTime '%s'" % child.content
+                elif not timezone.is_aware(naive):
+                    result['timestamp'] = timezone.make_aware(naive, timezone.utc)
                 else:
-                    aware = naive
-                result['timestamp'] = aware
+                    result['timestamp'] = naive
 
                 found_ts = True
 
@@ -210,9 +500,83 @@ class iodef_Import:
 
             child = child.next
 
+        # Incidents that have been committed by an earlier run of the import
+        # are skipped right away. As for filtered Incidents (see below), the
+        # identifier is kept and the pruned Incident is handed on by the
+        # generic import, so that xml_import can account for it.
+
+        if ctx.checkpointer and ctx.checkpointer.is_committed(ctx.incident_ordinal):
+            self.prune_incident(xml_elt)
+            result['skipped'] = True
+            result['extract_empty_embedded'] = True
+            return result
+
+        # Incidents for which we cannot extract identifier information
+        # are reported as failed by xml_import -- there is no point in
+        # walking their contents. The pruned Incident must be handed on
+        # nevertheless, since otherwise xml_import never learns of the
+        # failure (and writes no dead letter for it).
+
+        if 'error' in result:
+            self.prune_incident(xml_elt)
+            result['extract_empty_embedded'] = True
+            return result
+
+        # If a filter has been configured, we evaluate it here: this is
+        # the earliest point at which we have all information about the
+        # Incident at hand. Rejected Incidents are pruned from the XML tree
+        # and marked, so that the generic import does not walk their contents
+        # and no Information Object is created for them.
+        #
+        # Note that the identifier must be kept: the generic import
+        # derives an identifier from that of the IODEF-Document (which
+        # has none) for embedded objects without one. Since the pruned
+        # Incident is empty, we ask the generic import to hand it on
+        # nevertheless, so that it is accounted for by xml_import.
+
+        if ctx.incident_filter or ctx.scheduler:
+            attributes = extract_attributes(xml_elt, prefix_key_char='')
+
+        if ctx.incident_filter:
+            if not ctx.incident_filter.check(attributes,
+                                             csirt,
+                                             incident_id,
+                                             result['timestamp'],
+                                             now=ctx.create_timestamp):
+                self.prune_incident(xml_elt)
+                result['filtered'] = True
+                result['extract_empty_embedded'] = True
+                return result
+
+        # If the Incidents are scheduled, the purpose decides on
+        # their priority (see 'schedule_document').
+
+        if ctx.scheduler:
+            result['purpose'] = attributes.get('purpose')
+
+        # If the database is sharded, the shard of the Incident is
+        # determined by the reporting CSIRT.
+
+        if ctx.shards:
+            result['shard'] = shard_for(csirt, ctx.shards)
+
         return result
 
 
+    def prune_incident(self, xml_elt):
+        """
+        Remove all children of an Incident node that is not to be imported.
+        The generic xml import then creates only an empty dictionary
+        for the Incident rather than walking its whole subtree.
+        """
+        child = xml_elt.children
+        while child:
+            next_child = child.next
+            child.unlinkNode()
+            child.freeNode()
+            child = next_child
+
+
     def transformer(self, elt_name, contents):
         """
         This function is called for each DingoObjectDict
@@ -220,11 +584,17 @@ class iodef_Import:
         it is given the element name and the DingObject Dict
         for the contents found under that element.
 
-        We do not need to transform anything for iodef import.
-        If you want to see an transfomer in action, have a look
+        For iodef import, we apply the configured projection (if any)
+        to each Incident: configured branches such as
+        'Record/RecordData/RecordItem' are dropped, truncated or moved into
+        the blob store before facts are generated from the dictionary.
+        If you want to see another transfomer in action, have a look
         at the importer for OpenIOC.
 
+        The projection is taken from the ImportContext 'self.ctx' (see 'bind').
         """
+        if self.ctx.projection and elt_name == 'Incident':
+            self.ctx.projection.apply(contents)
         return (elt_name, contents)
 
 
@@ -314,14 +684,48 @@ class iodef_Import:
           'add_fact_kargs' and thus change the fact that will be created.
 
 
-        For the iodef import, do not need much extra handling: all that we do
-        is to split comma-separated port lists: we do this here to showcase the
+        For the iodef import, do not need much extra handling: the first handler
+        hands the name of an Incident to DINGO before its facts are written
+        (see 'iodef_naming_fact_handler'). We split comma-separated
+        port lists: we do this here to showcase the
         use of the fact_handler_list and also to show that the DINGOS datamodel allows
         one fact to be associated with several values. Whether you want to
         keep the port lists in one piece depens on how you want to process the imported information ...
+
+        Further, if configured, long values (such as Description texts or AdditionalData)
+        are stored via their digest (see 'iodef_value_digest_fact_handler').
+
+        Then, the facts and values are counted for the metrics of the
+        importer and for the batch controller (see 'iodef_metrics_fact_handler').
+
+        Finally, if the import memoizes the structure of facts, the fact
+        is written with the fact term, node id and namespace map taken from
+        the memo rather than by DINGO (see 'iodef_memo_fact_handler').
+
+        These handlers work with the ImportContext 'self.ctx' (see 'bind').
         """
 
-        return [(lambda fact, attr_info: fact['term'].split('/')[-1] == "Portlist", self.iodef_portlist_fact_handler)]
+        return [(lambda fact, attr_info: self.incident_dict is not None, self.iodef_naming_fact_handler),
+                (lambda fact, attr_info: fact['term'].split('/')[-1] == "Portlist", self.iodef_portlist_fact_handler),
+                (lambda fact, attr_info: (self.ctx.value_digests
+                                          and self.ctx.value_digests.applies(fact['value'])
+                                          and fact['term'].split('/')[-1] != "Portlist"),
+                 self.iodef_value_digest_fact_handler),
+                (lambda fact, attr_info: True, self.iodef_metrics_fact_handler),
+                (lambda fact, attr_info: self.memo_batch is not None, self.iodef_memo_fact_handler)]
+
+    def iodef_naming_fact_handler(self, enrichment, fact, attr_info, add_fact_kargs):
+        """
+        Handler that is run for the first fact of an Incident only: the name
+        of the Incident is computed from its DingoObjDict and preset on
+        the Information Object (see naming.IncidentNamer.preset), so that
+        DINGO does not read the facts again to name the object after
+        writing them.
+        """
+
+        self.ctx.namer.preset(enrichment, self.incident_dict)
+        self.incident_dict = None
+        return True
 
     def iodef_portlist_fact_handler(self, enrichment, fact, attr_info, add_fact_kargs):
         """
@@ -344,6 +748,42 @@ class iodef_Import:
         add_fact_kargs['values'] = fact['value'].split(',')
         return True
 
+    def iodef_value_digest_fact_handler(self, enrichment, fact, attr_info, add_fact_kargs):
+        """
+        Handler for values that are longer than the configured threshold.
+
+        Such values are written into the blob table of DINGO, and the
+        fact is given the pair of the SHA-256 digest of the value and the
+        storage location as value (see digests.FactValueDigestIndex). Thus,
+        the cost of looking up the FactValue does not depend on the length of
+        the value, and each distinct long value is stored once.
+        """
+
+        add_fact_kargs['values'] = [self.ctx.value_digests.stored_value(fact['value'])]
+        return True
+
+    def iodef_metrics_fact_handler(self, enrichment, fact, attr_info, add_fact_kargs):
+        """
+        Handler that counts each fact and its values for the metrics
+        of the importer; it comes after the handlers that set values, so that
+        the values set by them (e.g., the split port lists) are counted.
+        """
+
+        self.ctx.facts += 1
+        metrics.FACTS.inc()
+        metrics.VALUES.inc(len(add_fact_kargs.get('values') or [fact['value']]))
+        return True
+
+    def iodef_memo_fact_handler(self, enrichment, fact, attr_info, add_fact_kargs):
+        """
+        Handler that writes the fact itself, with the fact term, node id and
+        namespace map taken from the memo of the import (see memo.MemoBatch.write_fact).
+        It is the last handler in the list: the InfoObject2Fact object it
+        returns tells DINGO that the fact has been added.
+        """
+
+        return self.memo_batch.write_fact(enrichment, add_fact_kargs, self.written_facts)
+
 
     def attr_ignore_predicate(self, fact_dict):
         """
@@ -433,53 +873,481 @@ class iodef_Import:
                    xml_content=None,
                    markings=None,
                    identifier_ns_uri=None,
+                   processes=None,
+                   threads=None,
+                   incident_filter=None,
+                   projection=None,
+                   blob_store=None,
+                   value_digest_threshold=None,
+                   checkpoint=False,
+                   resume=False,
+                   batch_size=None,
+                   dead_letter_dir=None,
+                   isolate_failures=True,
+                   profiler=None,
+                   metrics_textfile=None,
+                   correlate=None,
+                   on_commit=None,
+                   adaptive_batching=None,
+                   stream=None,
+                   source=None,
+                   scheduler=None,
+                   priority_purposes=None,
+                   aggregate=None,
+                   snapshots=None,
+                   timeline=None,
+                   memoize=None,
+                   marking_cache=None,
                    **kwargs):
         """
         Import a iodef XML  from file <filepath>.
+
+        Alternatively, a stream of IODEF documents can be imported: pass a
+        file-like object as 'stream' or '-' as 'filepath' for stdin. The
+        documents are read one after another (see streaming.iter_documents)
+        and each is imported as soon as it is complete.
+
         You can provide:
 
         - a list of markings with which all generated Information Objects
-           will be associated (e.g., in order to provide provenance function)
+           will be associated (e.g., in order to provide provenance function);
+           a marking may be given as object or as identifier '<namespace uri>:<uid>'.
+           Identifiers are looked up via a markings.MarkingCache, which may be
+           passed as 'marking_cache' to share it between the imports of a run.
+           The links to the markings are created with one insert per batch.
 
         - The uri of a namespace of the identifiers for the generated information objects.
           This namespace identifiers the 'owner' of the object. For iodef import, this
           should not be necessary, because the XML schema makes sure that each
           Inicdent is associated with ownership information via the 'name' attribute.
 
+        - The number of worker processes across which the Incidents of the
+          document are to be spread (see 'parallel_import' below). If
+          'processes' is not given or smaller than 2, the import is carried
+          out sequentially in the calling process.
+
+        - Alternatively, the number of threads across which the Incidents
+          are to be spread ('threads'). When the import is bound by the
+          round trips to the database, threads give concurrency without
+          the memory cost of worker processes. (Note that each thread
+          uses a database connection of its own, so this does not work
+          with an in-memory SQLite database.)
+
+        - A filter for the Incidents to be imported: either an IncidentFilter,
+          a dictionary with the keyword arguments for creating one, or a list
+          of filter specifications such as 'purpose=mitigation' (see
+          filtering.IncidentFilter). Rejected Incidents are dropped while
+          walking the XML, i.e., before any dictionary or fact is created for them.
+
+        - A projection to be applied to each Incident before facts are generated:
+          either a projection.Projection or a list of projection rules; the
+          default is taken from setting MANTIS_IODEF_PROJECTION. For rules that
+          externalize content, the directory of the blob store must be given
+          (default: setting MANTIS_IODEF_BLOB_STORE).
+
+        - The minimal length of values that are stored in the blob table and
+          looked up via their digest (see digests.FactValueDigestIndex; default:
+          setting MANTIS_IODEF_VALUE_DIGEST_THRESHOLD). If no threshold is given,
+          values are stored as usual.
+
+        - Whether committed Incidents are to be recorded in a checkpoint for
+          the input ('checkpoint') and whether Incidents recorded in the checkpoint
+          by an earlier run are to be skipped ('resume', implies 'checkpoint').
+          The input is identified by the digest of its content; skipped Incidents
+          are dropped while walking the XML, just as filtered Incidents.
+
+        - The number of Incidents that are written in one transaction. If it is not
+          given, the number is adapted to the observed transaction times and facts
+          per Incident (see batching.BatchController), starting at setting
+          MANTIS_IODEF_BATCH_SIZE (default: 100); 'adaptive_batching=False'
+          (or setting MANTIS_IODEF_ADAPTIVE_BATCHING) switches this off; a
+          batching.BatchController may be passed as 'adaptive_batching' to
+          carry the adaptation across imports.
+          Each Incident is written within a savepoint of the transaction: if writing
+          an Incident fails, only the changes for this Incident are rolled back.
+
+        - A directory into which Incidents that cannot be imported are written
+          as dead letters (see deadletters.DeadLetterSpool; default: setting
+          MANTIS_IODEF_DEAD_LETTER_DIR). Failed Incidents are reported and skipped
+          in any case; if 'isolate_failures' is False, the import is aborted instead
+          (after the Incidents of the running transaction have been rolled back).
+
+        - A profiler (see profiling.ImportProfiler) that is used to profile
+          the import.
+
+        - Whether the observables of the Incidents (addresses, domain names,
+          ports, hashes) are added to the correlation index and correlations with
+          existing Incidents are reported (see correlation.CorrelationIndex;
+          default: setting MANTIS_IODEF_CORRELATE or, if not set, False).
+
+        - A function that is called after each committed transaction with the
+          list of id and revision info of the Incidents written in it ('on_commit');
+          used, e.g., for measuring the latency of imports. The function is
+          not called for Incidents imported by worker processes.
+
+        - A file to which the metrics of the importer (see metrics.REGISTRY)
+          are written in Prometheus text format after the import ('metrics_textfile').
+
+        - The name of the input for reporting ('source'; default: the file path).
+
+        - Whether the counts of imported Incidents per day, CSIRT, impact type and
+          severity (see models.IncidentAggregate) are to be updated ('aggregate';
+          default: setting MANTIS_IODEF_AGGREGATES or, if not set, False).
+
+        - Whether a compressed snapshot of the contents of each Incident is
+          stored, from which the Incident can be read without its facts
+          (see models.IncidentSnapshot; 'snapshots'; default: setting
+          MANTIS_IODEF_SNAPSHOTS or, if not set, False).
+
+        - Whether the fact terms, node ids and namespace maps of the facts are
+          looked up once per import rather than once per fact (see memo.StructureMemo;
+          'memoize'; default: setting MANTIS_IODEF_MEMOIZE or, if not set, True).
+          A memo.StructureMemo may be passed to share the memo between imports.
+
+        - Whether the ReportTime, DetectTime, StartTime and EndTime of each Incident
+          are written to the timeline for time-range queries (see models.IncidentTimeline;
+          'timeline'; default: setting MANTIS_IODEF_TIMELINE or, if not set, False).
+
+        - A scheduler.FairScheduler ('scheduler'): the Incidents of the document are
+          queued into it rather than written right away; this is used by
+          'scheduled_import', which also writes them. Incidents whose purpose
+          is among 'priority_purposes' are queued with priority.
+
         The kwargs are not read -- they are present to allow the use of the
         DingoImportCommand class for easy definition of commandline import commands
         (the class passes all command line arguments to the xml_import function, so
         without the **kwargs parameter, an error would occur.
         """
 
-        # Clear state in case xml_import is used several times
-
-        self.__init__()
-
-        # Initialize  default arguments
+        if stream is None and filepath == '-':
+            stream = sys.stdin
+
+        if stream is not None:
+            self.stream_import(stream,
+                               markings=markings,
+                               identifier_ns_uri=identifier_ns_uri,
+                               processes=processes,
+                               threads=threads,
+                               incident_filter=incident_filter,
+                               projection=projection,
+                               blob_store=blob_store,
+                               value_digest_threshold=value_digest_threshold,
+                               checkpoint=checkpoint,
+                               resume=resume,
+                               batch_size=batch_size,
+                               dead_letter_dir=dead_letter_dir,
+                               isolate_failures=isolate_failures,
+                               profiler=profiler,
+                               metrics_textfile=metrics_textfile,
+                               correlate=correlate,
+                               on_commit=on_commit,
+                               adaptive_batching=adaptive_batching,
+                               aggregate=aggregate,
+                               snapshots=snapshots,
+                               timeline=timeline,
+                               memoize=memoize,
+                               marking_cache=marking_cache,
+                               source=source or ('<stdin>' if stream is sys.stdin else '<stream>'))
+            return
+
+        # All state of this import is kept in a fresh context, so
+        # that xml_import can be used several times -- also concurrently.
+        # The context also takes care of initializing default arguments
+        # (e.g., the default namespace when 'None' is passed explicitly).
+
+        ctx = ImportContext(identifier_ns_uri=identifier_ns_uri)
+
+        if marking_cache is not None:
+            ctx.marking_cache = marking_cache
+        ctx.markings = resolve_markings(markings, ctx.marking_cache)
+
+        ctx.source = source or filepath or 'XML content'
+
+        ctx.batch_size = batch_size or getattr(settings, 'MANTIS_IODEF_BATCH_SIZE', 100)
+
+        if adaptive_batching is None:
+            adaptive_batching = getattr(settings, 'MANTIS_IODEF_ADAPTIVE_BATCHING', True)
+        if isinstance(adaptive_batching, BatchController):
+            ctx.batch_controller = adaptive_batching
+        elif adaptive_batching and not batch_size:
+            ctx.batch_controller = BatchController.from_settings()
+
+        ctx.isolate_failures = isolate_failures
+
+        ctx.on_commit = on_commit
+
+        ctx.shards = configured_shards()
+
+        ctx.scheduler = scheduler
+
+        if timeline is None:
+            timeline = getattr(settings, 'MANTIS_IODEF_TIMELINE', False)
+        ctx.timeline = timeline
+
+        if aggregate is None:
+            aggregate = getattr(settings, 'MANTIS_IODEF_AGGREGATES', False)
+        ctx.aggregate = aggregate
+
+        if snapshots is None:
+            snapshots = getattr(settings, 'MANTIS_IODEF_SNAPSHOTS', False)
+        ctx.snapshots = snapshots
+
+        if memoize is None:
+            memoize = getattr(settings, 'MANTIS_IODEF_MEMOIZE', True)
+        if isinstance(memoize, StructureMemo):
+            ctx.memo = memoize
+        elif memoize:
+            ctx.memo = StructureMemo()
+
+        if priority_purposes is None:
+            priority_purposes = getattr(settings, 'MANTIS_IODEF_PRIORITY_PURPOSES', ['mitigation'])
+        ctx.priority_purposes = priority_purposes
+
+        if dead_letter_dir is None:
+            dead_letter_dir = getattr(settings, 'MANTIS_IODEF_DEAD_LETTER_DIR', None)
+        if dead_letter_dir:
+            ctx.dead_letters = DeadLetterSpool(dead_letter_dir)
+            ctx.incident_source = IncidentSource(filepath=filepath, xml_content=xml_content)
+
+        ctx.incident_filter = IncidentFilter.coerce(incident_filter)
+
+        ctx.projection = Projection.coerce(projection, blob_store=blob_store)
+
+        if value_digest_threshold is None:
+            value_digest_threshold = getattr(settings, 'MANTIS_IODEF_VALUE_DIGEST_THRESHOLD', None)
+        if value_digest_threshold:
+            ctx.value_digests = FactValueDigestIndex(value_digest_threshold)
+
+        if correlate is None:
+            correlate = getattr(settings, 'MANTIS_IODEF_CORRELATE', False)
+        if correlate:
+            ctx.correlation_index = CorrelationIndex()
+
+        if checkpoint or resume:
+            ctx.checkpointer = Checkpointer(input_digest(filepath=filepath, xml_content=xml_content),
+                                            resume=resume)
+
+        status = 'failed'
+        try:
+            if profiler:
+                with profiler.profile(ctx.source):
+                    self.import_document(ctx, filepath=filepath, xml_content=xml_content,
+                                         processes=processes, threads=threads)
+            else:
+                self.import_document(ctx, filepath=filepath, xml_content=xml_content,
+                                     processes=processes, threads=threads)
+            status = 'ok'
+        finally:
+            metrics.FILES.inc(status=status)
+            if ctx.dead_letters:
+                metrics.DEAD_LETTERS.set(len(ctx.dead_letters))
+            if metrics_textfile:
+                metrics.REGISTRY.write_textfile(metrics_textfile)
+
+
+    def stream_import(self, stream, source='<stream>', **options):
+        """
+        Import the IODEF documents read from a file-like object one after another
+        with xml_import and the given options.
+
+        The filter, projection, batch controller, memo and marking cache are set
+        up once, so that their statistics, adaptation resp. entries carry over
+        from one document to the next.
+        A document that cannot be imported is reported and skipped (unless
+        'isolate_failures' is False).
+        """
+        if options.get('adaptive_batching') is None:
+            options['adaptive_batching'] = getattr(settings, 'MANTIS_IODEF_ADAPTIVE_BATCHING', True)
+        if options['adaptive_batching'] is True and not options.get('batch_size'):
+            options['adaptive_batching'] = BatchController.from_settings()
+
+        if options.get('memoize') is None:
+            options['memoize'] = getattr(settings, 'MANTIS_IODEF_MEMOIZE', True)
+        if options['memoize'] is True:
+            options['memoize'] = StructureMemo()
+
+        if options.get('marking_cache') is None:
+            options['marking_cache'] = MarkingCache()
+
+        options['incident_filter'] = IncidentFilter.coerce(options.get('incident_filter'))
+        options['projection'] = Projection.coerce(options.get('projection'), blob_store=options.get('blob_store'))
+
+        documents = 0
+        for (name, content) in iter_documents(stream, name=source):
+            documents += 1
+            try:
+                self.xml_import(xml_content=content, source=name, **options)
+            except Exception:
+                if options.get('isolate_failures') is False:
+                    raise
+                logger.exception("Import of %s failed" % name)
+
+        logger.info("Imported %s documents from %s" % (documents, source))
+
+
+    def scheduled_import(self, filepaths,
+                         threads=None,
+                         source_weights=None,
+                         source_concurrency=None,
+                         max_queued=None,
+                         **options):
+        """
+        Import several IODEF files with fair scheduling across their sources,
+        rather than one file after another.
+
+        - The files are parsed in deficit round robin order across their
+          directories (one directory per sending partner is assumed), with the
+          file size as cost, and only as long as fewer than 'max_queued'
+          Incidents are waiting to be written. Small feeds are thus not
+          parsed only after a large backlog.
+
+        - The Incidents of the parsed files are queued per reporting CSIRT
+          (the name of the IncidentID) into a scheduler.FairScheduler, with
+          the weights given as dictionary 'source_weights'. Incidents with a
+          purpose among 'priority_purposes' (default: mitigation) are written
+          before all others.
+
+        - Batches of Incidents (of the same file and source) are written by
+          'threads' threads (default: 1); at most 'source_concurrency' batches
+          of the same source are written at the same time (default: 1, which
+          keeps the Incidents of a source in order).
+
+        The further options are passed to xml_import (without 'processes').
+        A file that cannot be parsed is reported and skipped (unless
+        'isolate_failures' is False).
+        """
+        options.pop('processes', None)
+
+        workers = max(1, threads or 1)
+
+        if max_queued is None:
+            max_queued = getattr(settings, 'MANTIS_IODEF_SCHEDULER_MAX_QUEUED', 10000)
+
+        if source_concurrency is None:
+            source_concurrency = getattr(settings, 'MANTIS_IODEF_SOURCE_CONCURRENCY', 1)
+
+        # As for streams, the filter, projection, batch controller, memo
+        # and marking cache are set up once for all files.
+
+        if options.get('adaptive_batching') is None:
+            options['adaptive_batching'] = getattr(settings, 'MANTIS_IODEF_ADAPTIVE_BATCHING', True)
+        if options['adaptive_batching'] is True and not options.get('batch_size'):
+            options['adaptive_batching'] = BatchController.from_settings()
+        controller = options['adaptive_batching'] if isinstance(options['adaptive_batching'],
+                                                                BatchController) else None
+        batch_size = options.get('batch_size') or getattr(settings, 'MANTIS_IODEF_BATCH_SIZE', 100)
+
+        if options.get('memoize') is None:
+            options['memoize'] = getattr(settings, 'MANTIS_IODEF_MEMOIZE', True)
+        if options['memoize'] is True:
+            options['memoize'] = StructureMemo()
+
+        if options.get('marking_cache') is None:
+            options['marking_cache'] = MarkingCache()
+
+        options['incident_filter'] = IncidentFilter.coerce(options.get('incident_filter'))
+        options['projection'] = Projection.coerce(options.get('projection'), blob_store=options.get('blob_store'))
+
+        documents = FairScheduler()
+        for filepath in filepaths:
+            documents.put(os.path.dirname(os.path.abspath(filepath)),
+                          filepath,
+                          cost=os.path.getsize(filepath))
+
+        scheduler = FairScheduler(weights=source_weights, max_in_flight=source_concurrency)
+
+        condition = threading.Condition()
+        state = {'in_flight': 0}
+        errors = []
+
+        def write_unit(source, ctx, items):
+            try:
+                self.batch_import(ctx, items)
+            except Exception as e:
+                with condition:
+                    errors.append(e)
+            finally:
+                if workers > 1:
+                    close_db_connections()
+                scheduler.done(source)
+                with condition:
+                    ctx.outstanding -= len(items)
+                    finished = not ctx.outstanding
+                    state['in_flight'] -= 1
+                    condition.notify_all()
+                if finished:
+                    self.finish_document(ctx)
+
+        pool = multiprocessing.pool.ThreadPool(processes=workers) if workers > 1 else None
+        try:
+            while not errors:
+                while len(scheduler) < max_queued and len(documents):
+                    (directory, [filepath]) = documents.get()
+                    documents.done(directory)
+                    try:
+                        self.xml_import(filepath=filepath, scheduler=scheduler, **options)
+                    except Exception:
+                        if options.get('isolate_failures') is False:
+                            raise
+                        logger.exception("Import of %s failed" % filepath)
+
+                with condition:
+                    while state['in_flight'] >= workers and not errors:
+                        condition.wait()
+                    if errors:
+                        break
+                    unit = scheduler.get(max_items=controller.size if controller else batch_size,
+                                         group=lambda entry: entry[0])
+                    if unit is None:
+                        if not state['in_flight']:
+                            if not len(scheduler) and not len(documents):
+                                break
+                        else:
+                            # All sources with queued Incidents are at their cap.
+                            condition.wait()
+                        continue
+                    state['in_flight'] += 1
+
+                (source, entries) = unit
+                ctx = entries[0][0]
+                items = [item for (entry_ctx, item) in entries]
+                if pool:
+                    pool.apply_async(write_unit, (source, ctx, items))
+                else:
+                    write_unit(source, ctx, items)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
 
-        # '[]' would be mutable, so we initialize here
-        if not markings:
-            markings = []
+        if errors:
+            raise errors[0]
 
-        # Initalizing here allows us to also get the default namespace when
-        # explicitly passing 'None' as parameter.
 
-        if identifier_ns_uri:
-            self.identifier_ns_uri = identifier_ns_uri
+    def import_document(self, ctx, filepath=None, xml_content=None, processes=None, threads=None):
+        """
+        Parse the document given as file path or content and import the
+        Incidents found in it, using the ImportContext 'ctx' set up by xml_import.
+        """
 
         # Use the generic XML import customized for  OpenIOC import
         # to turn XML into DingoObjDicts
 
+        parse_start = time.time()
+
+        importer = self.bind(ctx)
+
         import_result = MantisImporter.xml_import(xml_fname=filepath,
                                                   xml_content=xml_content,
-                                                  ns_mapping=self.namespace_dict,
-                                                  embedded_predicate=self.embedding_pred,
-                                                  id_and_revision_extractor=self.id_and_revision_extractor,
-                                                  transformer=self.transformer,
+                                                  ns_mapping=ctx.namespace_dict,
+                                                  embedded_predicate=importer.embedding_pred,
+                                                  id_and_revision_extractor=importer.id_and_revision_extractor,
+                                                  transformer=importer.transformer,
                                                   keep_attrs_in_created_reference=False,
         )
 
+        metrics.STAGE_SECONDS.observe(time.time() - parse_start, stage='parse')
+
         # The result is of the following form::
         #
         #
@@ -503,82 +1371,528 @@ class iodef_Import:
 
         embedded_objects = import_result['embedded_objects']
 
-        default_ns = self.namespace_dict.get(elt_dict.get('@@ns', None))
+        ctx.default_ns = ctx.namespace_dict.get(elt_dict.get('@@ns', None))
 
         # Here, we could try to extract the family name and version from
         # the namespace information, but we do not do that for now.
 
-        ns_info = search_by_re_list(self.RE_LIST_NS_TYPE_FROM_NS_URL,default_ns)
+        ns_info = search_by_re_list(self.RE_LIST_NS_TYPE_FROM_NS_URL,ctx.default_ns)
 
         if ns_info:
             if 'family' in ns_info:
-                self.iobject_family_name = ns_info['family']
+                ctx.iobject_family_name = ns_info['family']
             if 'revision' in ns_info:
-                self.iobject_family_revision_name = ns_info['revision']
+                ctx.iobject_family_revision_name = ns_info['revision']
 
         # Initialize stack with import_results.
 
         # First, the result from the top-level import
         pending_stack = [(id_and_rev_info, elt_name, elt_dict)]
 
-        # Then the embedded objects
+        # Then the embedded objects. Until they are written, the Incidents
+        # are kept in compact form (see compact.CompactIncident); we drop
+        # the references to their DingoObjDicts in the import result,
+        # so that the dictionaries can be freed right away.
+
         for embedded_object in embedded_objects:
             id_and_rev_info = embedded_object['id_and_rev_info']
+            if id_and_rev_info.get('filtered'):
+                metrics.INCIDENTS.inc(outcome='filtered')
+                continue
+            if id_and_rev_info.get('skipped'):
+                metrics.INCIDENTS.inc(outcome='skipped')
+                continue
+            if 'error' in id_and_rev_info:
+                self.incident_failed(ctx, id_and_rev_info, id_and_rev_info['error'])
+                continue
             elt_name = embedded_object['elt_name']
-            elt_dict = embedded_object['dict_repr']
+            elt_dict = CompactIncident.from_dict(embedded_object['dict_repr'])
+            embedded_object['dict_repr'] = None
             pending_stack.append((id_and_rev_info, elt_name, elt_dict))
 
+        del import_result, embedded_objects
 
-        for (id_and_rev_info, elt_name, elt_dict) in pending_stack:
-            # call the importer that turns DingoObjDicts into Information Objects in the database
+        if ctx.incident_filter:
+            logger.info("Incident filter for %s: %s" % (ctx.source, ctx.incident_filter.stats_summary()))
 
-            if id_and_rev_info['timestamp']:
-                ts = id_and_rev_info['timestamp']
-            else:
-                ts = self.create_timestamp
+        if ctx.checkpointer and ctx.checkpointer.skipped:
+            logger.info("Resuming import of %s: skipped %s committed Incidents" % (ctx.source,
+                                                                                  ctx.checkpointer.skipped))
 
-            iobject_type_name = elt_name
+        if ctx.scheduler:
+            self.schedule_document(ctx, pending_stack)
+            return
 
-            ns_info = search_by_re_list(self.RE_LIST_NS_TYPE_FROM_NS_URL,default_ns)
+        if ((processes and processes > 1) or (threads and threads > 1)) and len(pending_stack) > 2:
+            self.parallel_import(ctx, pending_stack, processes=processes, threads=threads)
+        else:
+            self.batch_import(ctx, pending_stack)
 
-            iobject_type_namespace_uri = None
-            iobject_type_revision_name = None
+        self.finish_document(ctx)
 
-            if ns_info:
-                if 'family_ns' in ns_info:
-                    iobject_type_namespace_uri = ns_info['family_ns']
-                if 'revision' in ns_info:
-                    iobject_type_revision_name = ns_info['revision']
 
-            if not iobject_type_namespace_uri:
-                iobject_type_namespace_uri = self.namespace_dict.get(elt_dict.get('@@ns', None), DINGOS_GENERIC_FAMILY_NAME)
+    def finish_document(self, ctx):
+        """
+        Report on the import of a document once all its Incidents have been written.
+        """
+        if ctx.failed:
+            logger.error("%s Incidents of %s could not be imported" % (ctx.failed, ctx.source))
+
+        if ctx.correlation_index and ctx.correlation_index.stats['correlations']:
+            logger.info("%s correlations with existing Incidents found in %s" % (
+                ctx.correlation_index.stats['correlations'], ctx.source))
+
+        if ctx.incident_source:
+            ctx.incident_source.close()
+
+
+    def schedule_document(self, ctx, pending_stack):
+        """
+        Queue the Incidents of a parsed document into the scheduler of 'ctx':
+        the source of an Incident is the name of its IncidentID (the
+        reporting CSIRT), its cost the size of its compact representation,
+        and Incidents whose purpose is among ctx.priority_purposes
+        are queued with priority.
+        """
+
+        ctx.outstanding = 0
+        for item in pending_stack:
+            (id_and_rev_info, elt_name, elt_dict) = item
+
+            # The top-level IODEF-Document carries no identifier
+            # and is not imported.
 
             if not id_and_rev_info['id']:
-                logger.error("Attempt to import object (element name %s) without id -- object is ignored" % elt_name)
                 continue
 
-            MantisImporter.create_iobject(iobject_family_name=self.iobject_family_name,
-                                          iobject_family_revision_name=self.iobject_family_revision_name,
-                                          iobject_type_name=iobject_type_name,
-                                          iobject_type_namespace_uri=iobject_type_namespace_uri,
-                                          iobject_type_revision_name=iobject_type_revision_name,
-                                          iobject_data=elt_dict,
-                                          uid=id_and_rev_info['id'].split(":")[0],
-                                          identifier_ns_uri=id_and_rev_info['id'].split(":")[1],
-                                          timestamp=ts,
-                                          create_timestamp=self.create_timestamp,
-                                          markings=markings,
-                                          config_hooks={'special_ft_handler': self.fact_handler_list(),
-                                                        'datatype_extractor': self.datatype_extractor,
-                                                        'attr_ignore_predicate': self.attr_ignore_predicate},
-                                          namespace_dict=self.namespace_dict,
+            ctx.scheduler.put(id_and_rev_info['id'].split(":")[0],
+                              (ctx, item),
+                              cost=len(elt_dict) if isinstance(elt_dict, CompactIncident) else 1,
+                              priority=id_and_rev_info.get('purpose') in ctx.priority_purposes)
+            ctx.outstanding += 1
+
+        if not ctx.outstanding:
+            self.finish_document(ctx)
+
+
+    def iobject_import(self, ctx, id_and_rev_info, elt_name, elt_dict, marked=None, counter=None, memo_batch=None):
+        """
+        Turn the DingoObjDict of a single object extracted by the xml import
+        into an Information Object in the database. The object may be given
+        in compact form (see compact.CompactIncident).
+
+        This is the fact-generation and persistence stage for one work unit;
+        it reads the state that 'xml_import' has set up for the current
+        document in the ImportContext 'ctx' (namespace dictionary, family name
+        and revision, creation timestamp) and may therefore also be run in a worker
+        (see 'parallel_import').
+
+        If a list is given as 'marked', the object is not marked right away
+        but appended to the list, so that the links to the markings
+        of all objects of a batch can be created at once. Likewise, newly
+        created Incidents are counted with the aggregates.AggregateCounter
+        given as 'counter'. If the import memoizes the structure of facts,
+        the entries for the object are added to 'memo_batch' (see memo.MemoBatch).
+
+        Incidents are named from their dictionaries (see naming.IncidentNamer)
+        rather than by DINGO from their facts.
+
+        Returns True if an Information Object was created and False if
+        the object was ignored.
+        """
+
+        elt_dict = expand(elt_dict)
+
+        if id_and_rev_info['timestamp']:
+            ts = id_and_rev_info['timestamp']
+        else:
+            ts = ctx.create_timestamp
+
+        iobject_type_name = elt_name
+
+        ns_info = search_by_re_list(self.RE_LIST_NS_TYPE_FROM_NS_URL,ctx.default_ns)
+
+        iobject_type_namespace_uri = None
+        iobject_type_revision_name = None
+
+        if ns_info:
+            if 'family_ns' in ns_info:
+                iobject_type_namespace_uri = ns_info['family_ns']
+            if 'revision' in ns_info:
+                iobject_type_revision_name = ns_info['revision']
+
+        if not iobject_type_namespace_uri:
+            iobject_type_namespace_uri = ctx.namespace_dict.get(elt_dict.get('@@ns', None), DINGOS_GENERIC_FAMILY_NAME)
+
+        if not id_and_rev_info['id']:
+            logger.error("Attempt to import object (element name %s) without id -- object is ignored" % elt_name)
+            if elt_name == 'Incident':
+                metrics.INCIDENTS.inc(outcome='no_id')
+            return False
+
+        importer = self.bind(ctx)
+        if elt_name == 'Incident':
+            importer.incident_dict = elt_dict
+        if memo_batch is not None:
+            importer.memo_batch = memo_batch
+            importer.written_facts = {}
+
+        info_obj, existed = MantisImporter.create_iobject(iobject_family_name=ctx.iobject_family_name,
+                                                          iobject_family_revision_name=ctx.iobject_family_revision_name,
+                                                          iobject_type_name=iobject_type_name,
+                                                          iobject_type_namespace_uri=iobject_type_namespace_uri,
+                                                          iobject_type_revision_name=iobject_type_revision_name,
+                                                          iobject_data=elt_dict,
+                                                          uid=id_and_rev_info['id'].split(":")[0],
+                                                          identifier_ns_uri=id_and_rev_info['id'].split(":")[1],
+                                                          timestamp=ts,
+                                                          create_timestamp=ctx.create_timestamp,
+                                                          markings=self.shard_markings(ctx) if marked is None else None,
+                                                          config_hooks={'special_ft_handler': importer.fact_handler_list(),
+                                                                        'datatype_extractor': importer.datatype_extractor,
+                                                                        'attr_ignore_predicate': importer.attr_ignore_predicate},
+                                                          namespace_dict=ctx.namespace_dict,
             )
 
+        # The points in time of the Incident are written to the timeline
+        # (see models.IncidentTimeline), so that time-range queries do not
+        # have to parse the fact values.
+
+        if ctx.timeline and elt_name == 'Incident':
+            record_timeline(info_obj, elt_dict, report_time=id_and_rev_info['timestamp'])
+
+        # The contents of the Incident are stored as snapshot (see models.IncidentSnapshot),
+        # from which the Incident can be read with a single primary-key lookup.
+
+        if ctx.snapshots and elt_name == 'Incident':
+            record_snapshot(info_obj, elt_dict)
+
+        # The observables of the Incident are added to the correlation index;
+        # Incidents sharing observables with this one are reported.
+
+        if ctx.correlation_index and elt_name == 'Incident':
+            ctx.correlation_index.update(info_obj, elt_dict)
+
+        # The checkpoint entry is written in the same transaction as the object.
+
+        if ctx.checkpointer and 'ordinal' in id_and_rev_info:
+            ctx.checkpointer.record(id_and_rev_info['ordinal'], id_and_rev_info['id'])
+
+        if marked is not None:
+            marked.append(info_obj)
+
+        # Re-imports of a revision that exists already are not counted.
+
+        if counter is not None and elt_name == 'Incident' and existed != EXIST_ID_AND_EXACT_TIMESTAMP:
+            counter.add(info_obj.timestamp, id_and_rev_info['id'].split(":")[0], elt_dict)
+        return True
+
+
+    def shard_markings(self, ctx):
+        """
+        Return the markings for the objects written by the current thread.
+
+        A marking is an Information Object itself and can only be
+        related to objects in its own database. If the database is sharded,
+        each marking is therefore copied into the shard that is written to,
+        with the same identifier and timestamp. The copies are looked up
+        via the marking cache of the import run (see markings.MarkingCache)
+        once per shard and created only if the shard has none yet.
+        """
+        shard = current_shard()
+        if not shard or not ctx.markings:
+            return ctx.markings
+
+        if shard not in ctx.markings_by_shard:
+            markings = []
+            for marking in ctx.markings:
+                if marking._state.db == shard:
+                    markings.append(marking)
+                    continue
+                identifier = marking_identifier(marking)
+                copy = ctx.marking_cache.get(identifier, database=shard)
+                if copy is not None:
+                    markings.append(copy)
+                    continue
+                copy, existed = MantisImporter.create_iobject(
+                    iobject_family_name=marking.iobject_family.name,
+                    iobject_family_revision_name=marking.iobject_family_revision.name,
+                    iobject_type_name=marking.iobject_type.name,
+                    iobject_type_namespace_uri=marking.iobject_type.namespace.uri,
+                    iobject_type_revision_name=marking.iobject_type_revision.name,
+                    iobject_data=marking.to_dict(),
+                    uid=marking.identifier.uid,
+                    identifier_ns_uri=marking.identifier.namespace.uri,
+                    timestamp=marking.timestamp,
+                    create_timestamp=marking.create_timestamp)
+                ctx.marking_cache.put(identifier, copy, database=shard)
+                markings.append(copy)
+            ctx.markings_by_shard[shard] = markings
+        return ctx.markings_by_shard[shard]
+
+
+    def batch_import(self, ctx, pending):
+        """
+        Import the given list of work items (triples of id and revision info,
+        element name and DingoObjDict) in batches of ctx.batch_size items
+        or, if a batch controller has been set up, of the size that the
+        controller determines from the preceding batches.
+
+        Each batch is written in one transaction; each item is written
+        within a savepoint, so that a failing item costs only its own
+        changes: it is reported (see 'incident_failed') and the import
+        continues with the next item.
+
+        If the database is sharded (see routers.py), the items are grouped
+        by shard first, and each batch is written to the database of its shard.
+
+        Returns the number of Information Objects that have been created.
+        """
+        created = 0
+        for (shard, items) in group_by_shard(pending):
+            with use_shard(shard):
+                created += self.shard_batch_import(ctx, shard, items)
+        return created
+
+
+    def shard_batch_import(self, ctx, shard, pending):
+        """
+        Import work items that belong to the same shard (None if the database
+        is not sharded) in batches, as described for 'batch_import'.
+        """
+        # The markings are copied into the shard up front rather than
+        # within the savepoint of the first Incident, which may be rolled back.
+
+        if shard and ctx.markings:
+            with atomic(using=shard):
+                self.shard_markings(ctx)
+
+        created = 0
+        start = 0
+        while start < len(pending):
+            size = ctx.batch_controller.size if ctx.batch_controller else ctx.batch_size
+            batch = pending[start:start + size]
+            start += size
+            committed = []
+            marked = []
+            counter = AggregateCounter() if ctx.aggregate else None
+            memo_batch = ctx.memo.batch() if ctx.memo else None
+            batch_start = time.time()
+            facts_before = ctx.facts
+            with atomic(using=shard):
+                for (id_and_rev_info, elt_name, elt_dict) in batch:
+                    try:
+                        incident_start = time.time()
+                        with savepoint(using=shard):
+                            if self.iobject_import(ctx, id_and_rev_info, elt_name, elt_dict,
+                                                   marked=marked, counter=counter, memo_batch=memo_batch):
+                                committed.append(id_and_rev_info)
+                        if memo_batch:
+                            memo_batch.keep()
+                        metrics.STAGE_SECONDS.observe(time.time() - incident_start, stage='incident')
+                    except Exception as e:
+                        if memo_batch:
+                            memo_batch.discard()
+                        if not ctx.isolate_failures:
+                            raise
+                        logger.exception("Import of Incident %s (no. %s) of %s failed" % (id_and_rev_info['id'],
+                                                                                           id_and_rev_info.get('ordinal'),
+                                                                                           ctx.source))
+                        self.incident_failed(ctx, id_and_rev_info, "%s: %s" % (e.__class__.__name__, e))
+                # The objects of the batch are marked with one insert.
+                create_marking_links(marked, self.shard_markings(ctx))
+                if counter is not None:
+                    counter.flush()
+                commit_start = time.time()
+            batch_end = time.time()
+            metrics.STAGE_SECONDS.observe(batch_end - commit_start, stage='commit')
+            # Entries of rows created in the batch are only shared once
+            # the rows have been committed.
+            if memo_batch:
+                memo_batch.commit()
+            # (With threads, ctx.facts also counts the facts of concurrent
+            # batches, so that the controller errs on the side of smaller batches.)
+            if ctx.batch_controller:
+                ctx.batch_controller.record(len(batch), batch_end - batch_start, ctx.facts - facts_before)
+            metrics.BATCH_SIZE.observe(len(batch))
+            metrics.INCIDENTS.inc(len(committed), outcome='imported')
+            created += len(committed)
+            if ctx.on_commit:
+                ctx.on_commit(committed)
+        return created
+
+
+    def incident_failed(self, ctx, id_and_rev_info, error):
+        """
+        Report an Incident that could not be imported and, if a dead letter
+        spool has been configured, write a dead letter for it.
+        """
+        if not ctx.isolate_failures:
+            raise ValueError("Incident %s (no. %s) of %s: %s" % (id_and_rev_info['id'],
+                                                                id_and_rev_info.get('ordinal'),
+                                                                ctx.source,
+                                                                error))
+
+        ctx.failed += 1
+        metrics.INCIDENTS.inc(outcome='failed')
+        logger.error("Incident %s (no. %s) of %s is ignored: %s" % (id_and_rev_info['id'],
+                                                                   id_and_rev_info.get('ordinal'),
+                                                                   ctx.source,
+                                                                   error))
+        # The raw XML of the Incident is only extracted now, from
+        # the document parsed once more (see deadletters.IncidentSource).
+
+        incident = None
+        if ctx.dead_letters and id_and_rev_info.get('ordinal'):
+            incident = ctx.incident_source.incident(id_and_rev_info['ordinal'])
+        if incident:
+            (incident_xml, root_name, root_attributes) = incident
+            ctx.dead_letters.write(incident_xml,
+                                   error,
+                                   root_name=root_name,
+                                   root_attributes=root_attributes,
+                                   source=ctx.source,
+                                   ordinal=id_and_rev_info['ordinal'],
+                                   incident_id=id_and_rev_info['id'])
+
+
+    def parallel_import(self, ctx, pending_stack, processes=None, threads=None):
+        """
+        Spread the work units of one document across a pool of worker processes
+        or, if 'threads' is given, threads.
+
+        The document has already been parsed and split into the top-level
+        object and the embedded Incidents; what remains to be done per
+        Incident -- the generation of facts and the creation of the Information
+        Object -- is independent of all other Incidents and therefore carried
+        out by the workers.
+
+        To obtain the same result as the sequential import, we
+
+        - import the first unit that carries an identifier in this process:
+          this creates the rows that all Incidents share (family, type,
+          namespaces, most fact terms) before the workers start to compete
+          for them;
+
+        - keep all revisions of the same Incident in a single work unit,
+          so that they are imported in document order by one worker;
+
+        - hand out work units in document order and collect the results
+          in that order (Pool.imap).
+        """
+
+        # Group by identifier; units without identifier (the
+        # top-level IODEF-Document) are kept as work units of their own
+        # so that they are reported just as during sequential import.
+
+        work_units = []
+        unit_by_id = {}
+        primed = False
+
+        for (id_and_rev_info, elt_name, elt_dict) in pending_stack:
+            if not primed and id_and_rev_info['id']:
+                primed = self.batch_import(ctx, [(id_and_rev_info, elt_name, elt_dict)])
+                continue
+            unit_id = id_and_rev_info['id']
+            if unit_id and unit_id in unit_by_id:
+                unit_by_id[unit_id].append((id_and_rev_info, elt_name, elt_dict))
+            else:
+                unit = [(id_and_rev_info, elt_name, elt_dict)]
+                if unit_id:
+                    unit_by_id[unit_id] = unit
+                work_units.append(unit)
+
+        if not work_units:
+            return
+
+        workers = threads or processes
+
+        # We hand out chunks of work units, a few per worker.
+
+        chunksize = max(1, len(work_units) // (workers * 4))
+        chunks = [work_units[i:i + chunksize] for i in range(0, len(work_units), chunksize)]
+
+        if threads:
+            # Threads share the context with this thread; each thread
+            # opens a database connection of its own, which is closed
+            # after each chunk.
+
+            pool = multiprocessing.pool.ThreadPool(processes=threads)
+            import_chunk = functools.partial(_import_chunk_in_thread, self, ctx)
+        else:
+            # The connection of this process must not be shared with the
+            # forked workers: we close it and let Django reconnect on demand.
+
+            close_db_connections()
+
+            pool = multiprocessing.Pool(processes=processes,
+                                        initializer=_init_import_worker,
+                                        initargs=(self.__class__, ctx.worker_copy()))
+            import_chunk = _import_chunk
+
+        created = primed
+        try:
+            for chunk_result in pool.imap(import_chunk, chunks):
+                if not threads:
+                    # Worker processes hand on their metrics with each result.
+                    (chunk_result, worker_metrics) = chunk_result
+                    metrics.REGISTRY.merge(worker_metrics)
+                created += chunk_result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        logger.info("Imported %s objects with %s worker %s" % (created,
+                                                                workers,
+                                                                'threads' if threads else 'processes'))
+
+
+def close_db_connections():
+    """
+    Close all database connections of the current process (resp. thread).
+    """
+    for connection in connections.all():
+        connection.close()
+
+
+def _import_work_units(importer, ctx, chunk):
+    return importer.batch_import(ctx, [item for unit in chunk for item in unit])
+
+
+def _import_chunk_in_thread(importer, ctx, chunk):
+    try:
+        return _import_work_units(importer, ctx, chunk)
+    finally:
+        close_db_connections()
+
+
+# The importer instance and context of a worker process
+# (see iodef_Import.parallel_import).
+
+_worker_importer = None
+_worker_ctx = None
+
 
+def _init_import_worker(importer_class, ctx):
+    global _worker_importer, _worker_ctx
 
+    # The worker has inherited the database connections of the parent
+    # process; these must not be used concurrently.
 
+    close_db_connections()
 
+    # Likewise, the metrics collected by the parent process so far
+    # are not to be handed back to it.
 
+    metrics.REGISTRY.drain()
 
+    _worker_importer = importer_class()
+    _worker_ctx = ctx
 
 
+def _import_chunk(chunk):
+    created = _import_work_units(_worker_importer, _worker_ctx, chunk)
+    return (created, metrics.REGISTRY.drain())
@@ -0,0 +1,81 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mantis_iodef_importer.columnar import FORMATS, check_format, export_facts
+
+from mantis_iodef_importer.routers import configured_shards, use_shard
+
+
+class Command(BaseCommand):
+    """
+    This class implements the command for exporting the facts of imported
+    IODEF Incidents into columnar files (see columnar.py).
+    """
+
+    args = '<directory>'
+    help = ('Exports the facts of imported IODEF Incidents written since the last export into '
+            'the directory as columnar files (NumPy .npz or Parquet) with dictionary-encoded '
+            'strings and numeric port and IPv4 columns.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format',
+                    action='store',
+                    dest='format',
+                    default='npz',
+                    help='File format: %s (default: npz; parquet requires pyarrow).' % ', '.join(FORMATS)),
+        make_option('--chunk-size',
+                    action='store',
+                    type='int',
+                    dest='chunk_size',
+                    default=100000,
+                    help='Number of fact primary keys per file (default: 100000).'),
+        make_option('--full',
+                    action='store_true',
+                    dest='full',
+                    default=False,
+                    help='Export all facts into a new generation directory rather than those written since the last export.'),
+        )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give the directory to export into.')
+        directory = args[0]
+
+        try:
+            check_format(options.get('format'))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # If the database is sharded, each shard is exported on its own.
+
+        for shard in configured_shards() or [None]:
+            name = shard or 'default'
+            with use_shard(shard):
+                def progress(position, max_pk, exported):
+                    self.stdout.write("%s: %s/%s facts read, %s rows exported\n" % (name, position, max_pk, exported))
+
+                written = export_facts(directory,
+                                       format=options.get('format'),
+                                       chunk_size=max(1, options.get('chunk_size') or 100000),
+                                       full=options.get('full'),
+                                       progress=progress)
+                self.stdout.write("%s: wrote %s files\n" % (name, len(written)))
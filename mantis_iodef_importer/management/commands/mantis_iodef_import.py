@@ -16,10 +16,34 @@
 #
 
 
+import glob
+
+import logging
+
+import os
+
+import sys
+
+from optparse import make_option
+
+from django.core.management.base import CommandError
+
 from dingos.importer import DingoImportCommand
 
 from mantis_iodef_importer.importer import iodef_Import as ImporterModule
 
+from mantis_iodef_importer.filtering import IncidentFilter
+
+from mantis_iodef_importer.markings import MarkingCache, marking_identifier
+
+from mantis_iodef_importer.metrics import start_http_server
+
+from mantis_iodef_importer.profiling import ImportProfiler
+
+from mantis_iodef_importer.projection import Projection
+
+logger = logging.getLogger(__name__)
+
 class Command(DingoImportCommand):
     """
     This class implements the command for importing a OpenIOC XML
@@ -28,5 +52,320 @@ class Command(DingoImportCommand):
 
     Importer = ImporterModule()
 
+    args = 'xml-file xml-file ... (you can use wildcards; use - to read a stream of documents from stdin)'
+
     help = 'Imports IODEF XML files of specified paths into DINGOS'
 
+    option_list = DingoImportCommand.option_list + (
+        make_option('--processes',
+                    action='store',
+                    type='int',
+                    dest='processes',
+                    default=None,
+                    help='Number of worker processes across which the Incidents of each '
+                         'IODEF document are spread (default: sequential import).'),
+        make_option('--threads',
+                    action='store',
+                    type='int',
+                    dest='threads',
+                    default=None,
+                    help='Number of threads across which the Incidents of each IODEF document '
+                         'are spread; an alternative to --processes for imports that are bound '
+                         'by database round trips.'),
+        make_option('--filter',
+                    action='append',
+                    dest='incident_filter',
+                    default=None,
+                    help='Import only Incidents matching the given condition of the form '
+                         '<key>=<value>[,<value>...]; keys are purpose, restriction, csirt, '
+                         'incident_id, report_time_after, report_time_before and max_age_days. '
+                         'May be given several times.'),
+        make_option('--drop',
+                    action='append',
+                    dest='drop',
+                    default=None,
+                    help='Path of IODEF elements (relative to Incident, e.g., '
+                         'Record/RecordData/RecordItem) that are not to be imported. '
+                         'May be given several times.'),
+        make_option('--truncate',
+                    action='append',
+                    dest='truncate',
+                    default=None,
+                    help='<path>:<length>: truncate the text content of IODEF elements '
+                         'with the given path. May be given several times.'),
+        make_option('--externalize',
+                    action='append',
+                    dest='externalize',
+                    default=None,
+                    help='Path of IODEF elements whose content is moved into the blob store; '
+                         'only a reference is imported. May be given several times.'),
+        make_option('--blob-store',
+                    action='store',
+                    dest='blob_store',
+                    default=None,
+                    help='Directory of the blob store for externalized content.'),
+        make_option('--value-digest-threshold',
+                    action='store',
+                    type='int',
+                    dest='value_digest_threshold',
+                    default=None,
+                    help='Store values with at least the given number of characters in the '
+                         'blob table of DINGO and look them up via their SHA-256 digest '
+                         '(default: setting MANTIS_IODEF_VALUE_DIGEST_THRESHOLD; not set: off).'),
+        make_option('--checkpoint',
+                    action='store_true',
+                    dest='checkpoint',
+                    default=False,
+                    help='Record committed Incidents of each file, so that an interrupted '
+                         'import can be resumed with --resume.'),
+        make_option('--resume',
+                    action='store_true',
+                    dest='resume',
+                    default=False,
+                    help='Skip Incidents that have been committed by an earlier (interrupted) '
+                         'import of the same file; implies --checkpoint.'),
+        make_option('--batch-size',
+                    action='store',
+                    type='int',
+                    dest='batch_size',
+                    default=None,
+                    help='Number of Incidents written in one transaction (default: adapted to the '
+                         'observed transaction times, starting at 100).'),
+        make_option('--dead-letter-dir',
+                    action='store',
+                    dest='dead_letter_dir',
+                    default=None,
+                    help='Directory into which Incidents that cannot be imported are written; '
+                         'use mantis_iodef_replay_dead_letters to import them again.'),
+        make_option('--profile',
+                    action='store',
+                    dest='profile',
+                    default=None,
+                    help='Profile the import of each file with cProfile and write the statistics '
+                         '(<file name>-<timestamp>.pstats) into the given directory.'),
+        make_option('--trace-memory',
+                    action='store_true',
+                    dest='trace_memory',
+                    default=False,
+                    help='Record the peak memory (resident set size), CPU times and page faults of '
+                         'the import of each file with getrusage and write them '
+                         '(<file name>-<timestamp>.memory.txt) into the directory given with '
+                         '--profile (default: current directory).'),
+        make_option('--profile-every',
+                    action='store',
+                    type='int',
+                    dest='profile_every',
+                    default=1,
+                    help='Only profile every n-th file (default: every file).'),
+        make_option('--timeline',
+                    action='store_true',
+                    dest='timeline',
+                    default=None,
+                    help='Write the ReportTime, DetectTime, StartTime and EndTime of the imported '
+                         'Incidents to the timeline for time-range queries '
+                         '(default: setting MANTIS_IODEF_TIMELINE; not set: off).'),
+        make_option('--aggregate',
+                    action='store_true',
+                    dest='aggregate',
+                    default=None,
+                    help='Update the counts of imported Incidents per day, CSIRT, impact type and '
+                         'severity with each batch (default: setting MANTIS_IODEF_AGGREGATES; '
+                         'not set: off).'),
+        make_option('--snapshots',
+                    action='store_true',
+                    dest='snapshots',
+                    default=None,
+                    help='Store a compressed snapshot of each imported Incident, from which it can be '
+                         'read without its facts (default: setting MANTIS_IODEF_SNAPSHOTS; not set: off).'),
+        make_option('--correlate',
+                    action='store_true',
+                    dest='correlate',
+                    default=None,
+                    help='Add the observables of the imported Incidents to the correlation index and '
+                         'report correlations with existing Incidents '
+                         '(default: setting MANTIS_IODEF_CORRELATE; not set: off).'),
+        make_option('--metrics-textfile',
+                    action='store',
+                    dest='metrics_textfile',
+                    default=None,
+                    help='Write the metrics of the import in Prometheus text format to the given '
+                         'file after each file (e.g., for the textfile collector of the node exporter).'),
+        make_option('--metrics-port',
+                    action='store',
+                    type='int',
+                    dest='metrics_port',
+                    default=None,
+                    help='Serve the metrics of the import in Prometheus text format via HTTP '
+                         'on the given port of localhost while the import is running.'),
+        make_option('--fair',
+                    action='store_true',
+                    dest='fair',
+                    default=False,
+                    help='Interleave the files rather than importing one after another: Incidents '
+                         'are queued per reporting CSIRT and written in weighted round robin, '
+                         'Incidents with a priority purpose first. Use --threads for the number '
+                         'of batches written at the same time.'),
+        make_option('--source-weight',
+                    action='append',
+                    dest='source_weights',
+                    default=None,
+                    help='<csirt>=<weight>: share of a reporting CSIRT with --fair (default weight: 1). '
+                         'May be given several times.'),
+        make_option('--source-concurrency',
+                    action='store',
+                    type='int',
+                    dest='source_concurrency',
+                    default=None,
+                    help='Number of batches of the same reporting CSIRT written at the same '
+                         'time with --fair (default: 1).'),
+        make_option('--priority-purpose',
+                    action='append',
+                    dest='priority_purposes',
+                    default=None,
+                    help='Purpose of Incidents that are written before all others with --fair '
+                         '(default: mitigation). May be given several times.'),
+        )
+
+    def handle(self, *args, **options):
+
+        # We create the filter once for all files, so that the
+        # filter statistics are accumulated across the import.
+
+        incident_filter = None
+        if options.get('incident_filter'):
+            try:
+                incident_filter = IncidentFilter.coerce(options['incident_filter'])
+            except ValueError as e:
+                raise CommandError(str(e))
+            options['incident_filter'] = incident_filter
+
+        if options.get('drop') or options.get('truncate') or options.get('externalize'):
+            try:
+                options['projection'] = Projection.from_specs(drop=options.get('drop'),
+                                                              truncate=options.get('truncate'),
+                                                              externalize=options.get('externalize'),
+                                                              blob_store=options.get('blob_store'))
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if options.get('profile') or options.get('trace_memory'):
+            try:
+                options['profiler'] = ImportProfiler(options.get('profile') or '.',
+                                                     cpu=bool(options.get('profile')),
+                                                     trace_memory=options.get('trace_memory'),
+                                                     every=options.get('profile_every'))
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        metrics_server = None
+        if options.get('metrics_port'):
+            metrics_server = start_http_server(options['metrics_port'])
+
+        files = [arg for arg in args if arg != '-']
+
+        if options.get('source_weights'):
+            options['source_weights'] = self.parse_weights(options['source_weights'])
+
+        # The markings are set up once for all files (and stdin); the marking
+        # cache is handed on, so that the copies of the markings in the
+        # shards are also created once.
+
+        options['marking_cache'] = MarkingCache()
+        markings = self.import_markings(args, options)
+
+        try:
+            if len(files) < len(args):
+                self.import_stdin(markings, dict(options))
+            if files and options.get('fair'):
+                self.import_fair(files, markings, dict(options))
+            elif files or not args:
+                self.import_files(files, markings, options)
+        finally:
+            if metrics_server:
+                metrics_server.shutdown()
+
+        if incident_filter:
+            # self.stdout is only set up if the command is run via 'execute'.
+            stdout = getattr(self, 'stdout', sys.stdout)
+            stdout.write("Incident filter: %s\n" % incident_filter.stats_summary())
+
+    def parse_weights(self, specs):
+        weights = {}
+        for spec in specs:
+            try:
+                (source, weight) = spec.rsplit('=', 1)
+                weights[source] = float(weight)
+            except ValueError:
+                raise CommandError("Source weight '%s' is not of the form <csirt>=<weight>" % spec)
+            if weights[source] <= 0:
+                raise CommandError("Source weight '%s' must be positive" % spec)
+        return weights
+
+    def import_fair(self, args, markings, options):
+        """
+        Import the given files with fair scheduling (see iodef_Import.scheduled_import).
+        """
+        filepaths = []
+        for arg in args:
+            matches = sorted(glob.glob(arg))
+            if not matches:
+                logger.warning("No file(s) %s for import found!" % arg)
+            filepaths.extend(matches)
+
+        self.Importer.scheduled_import(filepaths, markings=markings, **options)
+
+    def import_stdin(self, markings, options):
+        """
+        Import the stream of IODEF documents on stdin (see streaming.iter_documents).
+        """
+        self.Importer.xml_import(filepath='-', markings=markings, **options)
+
+    def import_files(self, args, markings, options):
+        """
+        Import the given files one after another, as the generic command
+        does, but with the markings that have already been set up.
+        """
+        if not args:
+            logger.warning("No files for import specified!")
+
+        for arg in args:
+            filenames = glob.glob(arg)
+            if not filenames:
+                logger.warning("No file(s) %s for import found!" % arg)
+
+            for filename in filenames:
+                logger.info("Starting import of %s" % filename)
+                try:
+                    self.Importer.xml_import(filepath=filename, markings=markings, **options)
+                except Exception:
+                    logger.exception("Something went wrong when importing %s" % filename)
+
+                if options.get('destination_path'):
+                    dest_path = os.path.join(options['destination_path'], os.path.basename(filename))
+                    logger.info("Moving %s to %s" % (os.path.basename(filename), dest_path))
+                    try:
+                        os.rename(filename, dest_path)
+                    except OSError:
+                        logger.exception("Could not move file %s:" % filename)
+
+    def import_markings(self, args, options):
+        """
+        Create the marking given with --marking_json (if any) and look up
+        the markings given with --marking-id via the marking cache in
+        options['marking_cache'], which also receives the created marking.
+        """
+        cache = options['marking_cache']
+
+        marking = self.create_import_marking(args, options)
+        markings = [marking] if marking else []
+        if marking:
+            cache.put(marking_identifier(marking), marking)
+
+        for marking_id in options.get('marking_ids') or []:
+            marking = cache.get(marking_id)
+            if marking is None:
+                logger.warning('Could not find marking object %s in system' % marking_id)
+            else:
+                markings.append(marking)
+
+        return markings
@@ -0,0 +1,110 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mantis_iodef_importer.filtering import parse_filter_time
+
+from mantis_iodef_importer.purge import collect_garbage, purge_revisions
+
+from mantis_iodef_importer.routers import configured_shards, use_shard
+
+
+class Command(BaseCommand):
+    """
+    This class implements the command for deleting old revisions of
+    imported Incidents together with the facts, values, blobs and node ids
+    that are no longer used (see purge.py).
+    """
+
+    args = ''
+    help = ('Deletes old revisions of imported IODEF Incidents (per IncidentID) in chunks and '
+            'removes facts, fact values, blobs and node ids that are no longer referred to. '
+            'The latest revision of an Incident is always kept.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--keep',
+                    action='store',
+                    type='int',
+                    dest='keep',
+                    default=None,
+                    help='Keep the newest N revisions of each Incident.'),
+        make_option('--older-than',
+                    action='store',
+                    dest='older_than',
+                    default=None,
+                    help='Delete revisions with a timestamp before this date/time (e.g. 2014-01-01); '
+                         'together with --keep, only revisions beyond the newest N are deleted.'),
+        make_option('--chunk-size',
+                    action='store',
+                    type='int',
+                    dest='chunk_size',
+                    default=500,
+                    help='Number of primary keys deleted in one transaction (default: 500).'),
+        make_option('--skip-gc',
+                    action='store_true',
+                    dest='skip_gc',
+                    default=False,
+                    help='Do not remove facts, values, blobs and node ids that are no longer referred to.'),
+        )
+
+    def handle(self, *args, **options):
+        keep = options.get('keep')
+        if keep is not None and keep < 1:
+            raise CommandError('--keep must be at least 1.')
+
+        older_than = options.get('older_than')
+        if older_than:
+            try:
+                older_than = parse_filter_time(older_than)
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        if keep is None and not older_than:
+            raise CommandError('Give --keep and/or --older-than.')
+
+        chunk_size = max(1, options.get('chunk_size') or 500)
+
+        # If the database is sharded, each shard is purged on its own.
+
+        for shard in configured_shards() or [None]:
+            name = shard or 'default'
+            with use_shard(shard):
+                def revision_progress(position, max_pk, deleted):
+                    self.stdout.write("%s: %s/%s Incidents checked, %s revisions deleted\n" % (
+                        name, position, max_pk, deleted))
+
+                deleted = purge_revisions(keep=keep,
+                                          older_than=older_than,
+                                          chunk_size=chunk_size,
+                                          progress=revision_progress)
+                self.stdout.write("%s: deleted %s revisions\n" % (name, deleted))
+
+                if options.get('skip_gc'):
+                    continue
+
+                def gc_progress(model_name, position, max_pk, deleted):
+                    self.stdout.write("%s: %s/%s %s rows checked, %s deleted\n" % (
+                        name, position, max_pk, model_name, deleted))
+
+                collected = collect_garbage(chunk_size=chunk_size, progress=gc_progress)
+                self.stdout.write("%s: deleted %s\n" % (
+                    name,
+                    ", ".join(["%s %s rows" % (count, model_name) for (model_name, count) in sorted(collected.items())])))
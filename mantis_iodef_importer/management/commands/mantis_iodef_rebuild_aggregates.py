@@ -0,0 +1,64 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from mantis_iodef_importer.aggregates import rebuild_aggregates
+
+from mantis_iodef_importer.models import IncidentAggregate
+
+from mantis_iodef_importer.routers import configured_shards, use_shard
+
+
+class Command(BaseCommand):
+    """
+    This class implements the command for recomputing the counts of
+    imported Incidents per day, CSIRT, impact type and severity from the
+    Incidents in the database.
+    """
+
+    args = ''
+    help = ('Recomputes the IODEF import aggregates (Incidents per day, CSIRT, impact type and severity) '
+            'from the imported Incidents, e.g., for a backfill. The aggregate table is locked '
+            'during the rebuild, so imports with aggregates wait for it; imports should not run meanwhile.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size',
+                    action='store',
+                    type='int',
+                    dest='chunk_size',
+                    default=1000,
+                    help='Number of Incidents read at a time (default: 1000).'),
+        )
+
+    def handle(self, *args, **options):
+        # If the database is sharded, each shard has aggregates of its own.
+
+        for shard in configured_shards() or [None]:
+            with use_shard(shard):
+                def progress(counted):
+                    self.stdout.write("%s: %s Incidents counted\n" % (shard or 'default', counted))
+
+                counted = rebuild_aggregates(chunk_size=max(1, options.get('chunk_size') or 1000),
+                                             progress=progress)
+                self.stdout.write("%s: rebuilt %s aggregate rows from %s Incidents\n" % (
+                    shard or 'default',
+                    IncidentAggregate.objects.count(),
+                    counted))
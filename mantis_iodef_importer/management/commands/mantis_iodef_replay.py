@@ -0,0 +1,250 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import math
+
+import os
+
+import tarfile
+
+import threading
+
+import time
+
+import zipfile
+
+import multiprocessing.pool
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django.db import connection
+
+from dingos.models import dingos_class_map
+
+from mantis_iodef_importer.importer import iodef_Import, close_db_connections
+
+from mantis_iodef_importer.models import IncidentObservable, IncidentTimeline
+
+
+def corpus_documents(path):
+    """
+    Yield (name, content) for the IODEF documents of a corpus: the XML files
+    in a directory (and its subdirectories) or the members of a tar or
+    zip archive, in the order of their names.
+    """
+    if os.path.isdir(path):
+        names = []
+        for (directory, subdirectories, files) in os.walk(path):
+            names.extend([os.path.join(directory, name) for name in files if name.endswith('.xml')])
+        for name in sorted(names):
+            with open(name, 'rb') as xml_file:
+                yield (name, xml_file.read())
+    elif zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        try:
+            for name in sorted(archive.namelist()):
+                if name.endswith('.xml'):
+                    yield (name, archive.read(name))
+        finally:
+            archive.close()
+    elif tarfile.is_tarfile(path):
+        archive = tarfile.open(path)
+        try:
+            members = sorted([member for member in archive.getmembers()
+                              if member.isfile() and member.name.endswith('.xml')],
+                             key=lambda member: member.name)
+            for member in members:
+                yield (member.name, archive.extractfile(member).read())
+        finally:
+            archive.close()
+    else:
+        raise CommandError("%s is neither a directory nor a tar or zip archive" % path)
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(fraction * len(sorted_values))) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+def row_counts():
+    models = [dingos_class_map[name] for name in sorted(dingos_class_map.keys())] + [IncidentTimeline,
+                                                                                      IncidentObservable]
+    return [(model.__name__, model.objects.count()) for model in models]
+
+
+def database_size():
+    """
+    Size of the database in bytes (PostgreSQL and SQLite files), or None.
+    """
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_database_size(current_database())")
+        return cursor.fetchone()[0]
+    if vendor == 'sqlite':
+        name = connection.settings_dict.get('NAME')
+        if name and name != ':memory:' and os.path.exists(name):
+            return os.path.getsize(name)
+    return None
+
+
+class Command(BaseCommand):
+    """
+    This class implements the command for replaying a corpus of IODEF
+    documents against the importer at a controlled rate and measuring
+    the latency of each Incident from the arrival of its document
+    to the commit of its transaction.
+    """
+
+    args = '<directory or archive>'
+    help = ('Replays the IODEF documents in a directory or tar/zip archive against the importer '
+            'and reports latency percentiles, throughput and database growth.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rate',
+                    action='store',
+                    type='float',
+                    dest='rate',
+                    default=None,
+                    help='Number of documents that arrive per second (default: all at once).'),
+        make_option('--concurrency',
+                    action='store',
+                    type='int',
+                    dest='concurrency',
+                    default=1,
+                    help='Number of documents imported at the same time (default: 1, in the '
+                         'calling thread). With SQLite and a concurrency above 1, use a database file '
+                         'rather than an in-memory database.'),
+        make_option('--batch-size',
+                    action='store',
+                    type='int',
+                    dest='batch_size',
+                    default=None,
+                    help='Number of Incidents written in one transaction.'),
+        make_option('--limit',
+                    action='store',
+                    type='int',
+                    dest='limit',
+                    default=None,
+                    help='Replay only the first n documents of the corpus.'),
+        )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Give one directory or archive to replay.')
+
+        rate = options.get('rate')
+        concurrency = max(1, options.get('concurrency') or 1)
+
+        importer = iodef_Import()
+
+        # Without concurrency, the documents are imported in this thread
+        # (and with its database connection).
+
+        pool = multiprocessing.pool.ThreadPool(processes=concurrency) if concurrency > 1 else None
+
+        lock = threading.Lock()
+        latencies = []
+        failures = []
+
+        def import_document(name, content, arrival):
+            def committed(id_and_rev_infos):
+                now = time.time()
+                with lock:
+                    latencies.extend([now - arrival] * len(id_and_rev_infos))
+            try:
+                importer.xml_import(xml_content=content,
+                                    batch_size=options.get('batch_size'),
+                                    on_commit=committed)
+            except Exception as e:
+                with lock:
+                    failures.append((name, "%s: %s" % (e.__class__.__name__, e)))
+            finally:
+                if pool:
+                    close_db_connections()
+
+        counts_before = row_counts()
+        size_before = database_size()
+
+        documents = 0
+        start = time.time()
+        try:
+            for (name, content) in corpus_documents(args[0]):
+                if options.get('limit') is not None and documents >= options['limit']:
+                    break
+                # Documents arrive on schedule, independent of how fast they
+                # are imported: the latency includes the time spent waiting.
+                if rate:
+                    arrival = start + documents / rate
+                    delay = arrival - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                else:
+                    arrival = time.time()
+                if pool:
+                    pool.apply_async(import_document, (name, content, arrival))
+                else:
+                    import_document(name, content, arrival)
+                documents += 1
+            if pool:
+                pool.close()
+        except:
+            if pool:
+                pool.terminate()
+            raise
+        finally:
+            if pool:
+                pool.join()
+
+        elapsed = time.time() - start
+
+        counts_after = row_counts()
+        size_after = database_size()
+
+        latencies.sort()
+
+        self.stdout.write("Replayed %s documents with %s Incidents in %.2f s (%.1f Incidents/s, %.2f documents/s)\n" % (
+            documents,
+            len(latencies),
+            elapsed,
+            len(latencies) / elapsed if elapsed else 0,
+            documents / elapsed if elapsed else 0))
+
+        if latencies:
+            self.stdout.write("Latency from arrival to commit: p50 %.3f s, p95 %.3f s, p99 %.3f s, max %.3f s\n" % (
+                percentile(latencies, 0.5),
+                percentile(latencies, 0.95),
+                percentile(latencies, 0.99),
+                latencies[-1]))
+
+        growth = [(name, after - before)
+                  for ((name, before), (name_after, after)) in zip(counts_before, counts_after)
+                  if after != before]
+        self.stdout.write("Database growth: %s\n" % (", ".join(["%s +%s" % x for x in growth]) or 'none'))
+        if size_before is not None and size_after is not None:
+            self.stdout.write("Database size: %s bytes (+%s)\n" % (size_after, size_after - size_before))
+
+        for (name, error) in failures:
+            self.stdout.write("Import of %s failed: %s\n" % (name, error))
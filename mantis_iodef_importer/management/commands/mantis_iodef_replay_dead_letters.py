@@ -0,0 +1,75 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+from optparse import make_option
+
+from django.conf import settings
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mantis_iodef_importer.deadletters import DeadLetterSpool
+
+from mantis_iodef_importer.importer import iodef_Import
+
+
+class Command(BaseCommand):
+    """
+    This class implements the command for importing the Incidents
+    that have been written to the dead letter spool by failed imports.
+    """
+
+    args = ''
+    help = 'Imports the Incidents in the IODEF dead letter spool; successfully imported dead letters are removed.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--dead-letter-dir',
+                    action='store',
+                    dest='dead_letter_dir',
+                    default=None,
+                    help='Dead letter directory (default: setting MANTIS_IODEF_DEAD_LETTER_DIR).'),
+        )
+
+    def handle(self, *args, **options):
+        directory = options.get('dead_letter_dir') or getattr(settings, 'MANTIS_IODEF_DEAD_LETTER_DIR', None)
+        if not directory:
+            raise CommandError('No dead letter directory given.')
+
+        spool = DeadLetterSpool(directory)
+        importer = iodef_Import()
+
+        replayed = 0
+        failed = 0
+
+        for path in spool.paths():
+            try:
+                # A failure aborts the import of the dead letter (rather
+                # than writing a new dead letter); the dead letter then
+                # stays in the spool.
+                importer.xml_import(filepath=path,
+                                    dead_letter_dir=False,
+                                    isolate_failures=False)
+            except Exception as e:
+                failed += 1
+                info = spool.read_error(path)
+                info['retries'] = info.get('retries', 0) + 1
+                info['last_error'] = "%s: %s" % (e.__class__.__name__, e)
+                spool.write_error(path, info)
+            else:
+                replayed += 1
+                spool.remove(path)
+
+        self.stdout.write("Replayed %s dead letters; %s failed again\n" % (replayed, failed))
@@ -26,16 +26,17 @@ from dingos.models import InfoObjectType, InfoObjectNaming
 
 from dingos.management.commands.dingos_manage_naming_schemas import Command as ManageCommand
 
+from mantis_iodef_importer.naming import INCIDENT_NAMING_SCHEMAS
+
+from mantis_iodef_importer.routers import configured_shards, use_shard
+
 
 schema_list = [
     [
         "Incident",
         "iodef",
         "urn:ietf:params:xml:ns:iodef",
-        [
-            "[Description] ([@purpose])",
-            "[Description]"
-        ]
+        INCIDENT_NAMING_SCHEMAS
     ]
 ]
 
@@ -61,4 +62,8 @@ class Command(ManageCommand):
         options['input_list'] = self.schemas
         #manage_command.handle(*args,**options)
         super(Command,self).handle(*args,**options)
+        # If the database is sharded, each shard needs the schemas, too.
+        for shard in configured_shards():
+            with use_shard(shard):
+                super(Command,self).handle(*args,**options)
 
@@ -0,0 +1,127 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+
+from dingos.models import InfoObject, Marking2X
+
+from mantis_iodef_importer import metrics
+
+from mantis_iodef_importer.routers import current_shard
+
+
+def marking_identifier(marking):
+    """
+    Return the identifier '<namespace uri>:<uid>' of a marking object.
+    """
+    return '%s:%s' % (marking.identifier.namespace.uri, marking.identifier.uid)
+
+
+class MarkingCache(object):
+    """
+    Maps marking identifiers ('<namespace uri>:<uid>', as given with
+    --marking-id) to the marking Information Objects, per database.
+
+    A cache belongs to one import run: a call of xml_import, the import
+    of a stream or of scheduled files, or a run of the import command.
+    Within the run, each marking (and its copy in each shard) is looked up
+    once rather than once per document; a marking that has been revised
+    or deleted meanwhile is looked up afresh by the next run.
+    """
+
+    # Maximal number of entries; the cache is cleared when it is full.
+
+    MAX_SIZE = 1000
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def get(self, identifier, database=None):
+        """
+        Return the latest revision of the marking with the given identifier
+        in the given database (default: as routed), or None if there is none.
+        """
+        database = database or current_shard()
+        key = (database, identifier)
+        with self.lock:
+            marking = self.objects.get(key)
+        if marking is not None:
+            metrics.CACHE_REQUESTS.inc(cache='marking', result='hit')
+            return marking
+        metrics.CACHE_REQUESTS.inc(cache='marking', result='miss')
+
+        if ':' not in identifier:
+            return None
+        (namespace_uri, uid) = identifier.rsplit(':', 1)
+        queryset = InfoObject.objects.exclude(latest_of=None)
+        if database:
+            queryset = queryset.using(database)
+        markings = list(queryset.filter(identifier__uid=uid, identifier__namespace__uri=namespace_uri)[:1])
+        if not markings:
+            return None
+        self.put(identifier, markings[0], database=database)
+        return markings[0]
+
+    def put(self, identifier, marking, database=None):
+        database = database or current_shard()
+        with self.lock:
+            if len(self.objects) >= self.MAX_SIZE:
+                self.objects.clear()
+            self.objects[(database, identifier)] = marking
+
+    def clear(self):
+        with self.lock:
+            self.objects.clear()
+
+
+def resolve_markings(markings, cache=None):
+    """
+    Return the list of marking objects for a list of marking objects and/or
+    marking identifiers, which are looked up via the given MarkingCache
+    (default: a new one). Raises ValueError for an identifier without marking.
+    """
+    if cache is None:
+        cache = MarkingCache()
+    result = []
+    for marking in markings or []:
+        if isinstance(marking, InfoObject):
+            result.append(marking)
+            continue
+        resolved = cache.get(marking)
+        if resolved is None:
+            raise ValueError("Could not find marking object %s" % marking)
+        result.append(resolved)
+    return result
+
+
+def create_marking_links(iobjects, markings):
+    """
+    Mark all given Information Objects with all given markings
+    with a single insert.
+    """
+    if not iobjects or not markings:
+        return
+    content_type = ContentType.objects.get_for_model(InfoObject)
+    Marking2X.objects.bulk_create([Marking2X(marking=marking,
+                                             content_type=content_type,
+                                             object_id=iobject.pk)
+                                   for iobject in iobjects
+                                   for marking in markings])
@@ -0,0 +1,225 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import itertools
+
+import threading
+
+from dingos.models import DataTypeNameSpace, FactTermNamespaceMap, InfoObject2Fact, NodeID, PositionalNamespace
+from dingos.models import get_or_create_fact, get_or_create_fact_term
+
+from mantis_iodef_importer import metrics
+
+from mantis_iodef_importer.routers import current_shard
+
+
+class StructureMemo(object):
+    """
+    Memoizes the rows that describe the structure of facts rather than
+    their values: fact terms (with their data types and object types),
+    node identifiers and the namespace maps of fact terms.
+
+    For each fact, DINGO's 'add_fact' resolves these rows anew -- about a dozen
+    queries per fact, although the Incidents of a document have almost the
+    same structure. With the memo, they are resolved once per import and
+    database (see routers.py); see 'write_fact'.
+
+    Entries become visible to other batches only after the batch that
+    created them has been committed (see MemoBatch), so that a rolled back
+    batch leaves no entries behind that refer to rows that do not exist.
+    For the same reason, imports must not share a memo (e.g., the import of
+    a stream) while mantis_iodef_purge removes node ids that are no longer
+    referred to.
+    """
+
+    # Maximal number of entries; the memo is cleared when it is full.
+
+    MAX_SIZE = 100000
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return self.entries.get(key)
+
+    def update(self, entries):
+        with self.lock:
+            if len(self.entries) + len(entries) > self.MAX_SIZE:
+                self.entries.clear()
+            self.entries.update(entries)
+
+    def batch(self):
+        return MemoBatch(self)
+
+
+class MemoBatch(object):
+    """
+    The entries that a batch of Incidents (see iodef_Import.shard_batch_import)
+    adds to a StructureMemo.
+
+    The entries of the Incident that is being written are kept apart
+    until its savepoint has been released ('keep') or rolled back ('discard');
+    the entries kept are handed on to the memo when the batch has been
+    committed ('commit').
+    """
+
+    def __init__(self, memo):
+        self.memo = memo
+        self.kept = {}
+        self.pending = {}
+
+    def get(self, key):
+        for entries in (self.pending, self.kept):
+            if key in entries:
+                metrics.CACHE_REQUESTS.inc(cache='structure', result='hit')
+                return entries[key]
+        value = self.memo.get(key)
+        metrics.CACHE_REQUESTS.inc(cache='structure', result='miss' if value is None else 'hit')
+        return value
+
+    def put(self, key, value):
+        self.pending[key] = value
+        return value
+
+    def keep(self):
+        self.kept.update(self.pending)
+        self.pending = {}
+
+    def discard(self):
+        self.pending = {}
+
+    def commit(self):
+        self.memo.update(self.kept)
+        self.kept = {}
+
+    def fact_term(self, iobject, add_fact_kargs):
+        """
+        Return the fact term (as created by DINGO's 'get_or_create_fact_term', which
+        also relates the term to the object type and data type) for a fact
+        of the given Information Object.
+        """
+        key = ('fact_term',
+               current_shard(),
+               iobject.iobject_family_id,
+               iobject.iobject_type_id,
+               add_fact_kargs['fact_term_name'],
+               add_fact_kargs['fact_term_attribute'] or '',
+               add_fact_kargs.get('fact_dt_name', 'String'),
+               add_fact_kargs['fact_dt_namespace_uri'])
+        fact_term = self.get(key)
+        if fact_term is None:
+            (fact_term, created) = get_or_create_fact_term(
+                iobject_family_name=iobject.iobject_family.name,
+                fact_term_name=add_fact_kargs['fact_term_name'],
+                fact_term_attribute=add_fact_kargs['fact_term_attribute'],
+                iobject_type_name=iobject.iobject_type.name,
+                iobject_type_namespace_uri=iobject.iobject_type.namespace.uri,
+                fact_dt_name=add_fact_kargs.get('fact_dt_name', 'String'),
+                fact_dt_kind=add_fact_kargs['fact_dt_kind'],
+                fact_dt_namespace_name=add_fact_kargs['fact_dt_namespace_name'],
+                fact_dt_namespace_uri=add_fact_kargs['fact_dt_namespace_uri'])
+            self.put(key, fact_term)
+        return fact_term
+
+    def node_id(self, name):
+        """
+        Return the primary key of the node identifier with the given name.
+        """
+        key = ('node_id', current_shard(), name)
+        pk = self.get(key)
+        if pk is None:
+            (node_id, created) = NodeID.objects.get_or_create(name=name)
+            pk = self.put(key, node_id.pk)
+        return pk
+
+    def namespace_map(self, fact_term, namespaces):
+        """
+        Return the primary key of the namespace map of the given fact term
+        for the given list of pairs of namespace uri and slug, as
+        found or created by DINGO's 'add_fact', or 0 if no map is
+        required.
+        """
+        uris = [uri for (uri, slug) in namespaces]
+        key = ('namespace_map', current_shard(), fact_term.pk, tuple(uris))
+        pk = self.get(key)
+        if pk is not None:
+            return pk
+
+        pk = 0
+        elements = FactTermNamespaceMap.objects.filter(fact_term=fact_term).order_by(
+            'id', 'namespaces_thru__position').values_list('id', 'namespaces_thru__namespace__uri')
+        for (map_id, group) in itertools.groupby(elements, lambda element: element[0]):
+            if uris == [uri for (element_id, uri) in group]:
+                pk = map_id
+                break
+
+        if not pk and [uri for uri in uris if uri]:
+            namespace_map = FactTermNamespaceMap.objects.create(fact_term=fact_term)
+            positional_namespaces = []
+            for (position, (uri, slug)) in enumerate(namespaces):
+                if uri:
+                    (namespace, created) = DataTypeNameSpace.objects.get_or_create(uri=uri, defaults={'name': slug})
+                    positional_namespaces.append(PositionalNamespace(fact_term_namespace_map=namespace_map,
+                                                                     position=position,
+                                                                     namespace_id=namespace.pk))
+            PositionalNamespace.objects.bulk_create(positional_namespaces)
+            pk = namespace_map.pk
+
+        return self.put(key, pk)
+
+    def write_fact(self, iobject, add_fact_kargs, written):
+        """
+        Add a fact to the given Information Object with the same result as
+        DINGO's 'add_fact', but with the fact term, node identifier and namespace
+        map taken from the memo. 'written' maps the node identifiers of the
+        facts written so far for the object to the primary keys of their
+        InfoObject2Fact rows; it is used to find the fact to which an
+        attribute belongs.
+
+        Returns the new InfoObject2Fact object.
+        """
+        fact_term = self.fact_term(iobject, add_fact_kargs)
+
+        (fact, created) = get_or_create_fact(fact_term,
+                                             fact_dt_name=add_fact_kargs.get('fact_dt_name', 'String'),
+                                             fact_dt_namespace_uri=add_fact_kargs['fact_dt_namespace_uri'],
+                                             values=add_fact_kargs['values'])
+
+        node_id_name = add_fact_kargs['node_id_name']
+
+        attributed_fact_id = None
+        components = node_id_name.split(':')
+        if components[-1] and components[-1][0] == 'A':
+            attributed_node_id_name = ':'.join(components[:-1])
+            attributed_fact_id = written.get(attributed_node_id_name)
+            if attributed_fact_id is None:
+                pks = list(InfoObject2Fact.objects.filter(iobject=iobject,
+                                                          node_id__name=attributed_node_id_name).values_list(
+                    'pk', flat=True)[:1])
+                attributed_fact_id = pks[0] if pks else None
+
+        io2f = InfoObject2Fact.objects.create(node_id_id=self.node_id(node_id_name),
+                                              iobject=iobject,
+                                              fact=fact,
+                                              attributed_fact_id=attributed_fact_id,
+                                              namespace_map_id=self.namespace_map(fact_term,
+                                                                                  add_fact_kargs['namespaces']) or None)
+        written[node_id_name] = io2f.pk
+        return io2f
@@ -0,0 +1,273 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import tempfile
+
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+# Metrics of the iodef importer in Prometheus text format
+# (https://prometheus.io/docs/instrumenting/exposition_formats/).
+#
+# The metrics are kept per process in the registry REGISTRY below.
+# They can be written to a file for the textfile collector of the
+# node exporter (Registry.write_textfile) or served via HTTP (start_http_server).
+
+
+class Metric(object):
+
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        registry.register(self)
+
+    def labelvalues(self, labels):
+        if set(labels.keys()) != set(self.labelnames):
+            raise ValueError("Metric %s takes labels %s" % (self.name, ', '.join(self.labelnames)))
+        return tuple([str(labels[name]) for name in self.labelnames])
+
+    def format_labels(self, labelvalues, extra=()):
+        pairs = list(zip(self.labelnames, labelvalues)) + list(extra)
+        if not pairs:
+            return ''
+        return '{%s}' % ','.join(['%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"'))
+                                  for (name, value) in pairs])
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.help),
+                 '# TYPE %s %s' % (self.name, self.kind)]
+        with self.lock:
+            for labelvalues in sorted(self.values.keys()):
+                lines.extend(self.render_value(labelvalues, self.values[labelvalues]))
+        return lines
+
+    def render_value(self, labelvalues, value):
+        return ['%s%s %s' % (self.name, self.format_labels(labelvalues), format_number(value))]
+
+    def drain(self):
+        with self.lock:
+            values = self.values
+            self.values = {}
+        return values
+
+
+class Counter(Metric):
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.labelvalues(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        with self.lock:
+            for (key, value) in values.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.labelvalues(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def drain(self):
+        # Gauges describe the state at hand; they are not handed
+        # on from worker processes.
+        return {}
+
+    def merge(self, values):
+        pass
+
+
+class Histogram(Metric):
+
+    kind = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super(Histogram, self).__init__(registry, name, help, labelnames=labelnames)
+
+    def observe(self, value, **labels):
+        key = self.labelvalues(labels)
+        with self.lock:
+            # Per label set: count per bucket (not cumulative), sum and count
+            data = self.values.get(key)
+            if data is None:
+                data = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for (i, bound) in enumerate(self.buckets):
+                if value <= bound:
+                    data[0][i] += 1
+                    break
+            data[1] += value
+            data[2] += 1
+
+    def merge(self, values):
+        with self.lock:
+            for (key, (bucket_counts, total, count)) in values.items():
+                data = self.values.get(key)
+                if data is None:
+                    data = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+                data[0] = [x + y for (x, y) in zip(data[0], bucket_counts)]
+                data[1] += total
+                data[2] += count
+
+    def render_value(self, labelvalues, data):
+        (bucket_counts, total, count) = data
+        lines = []
+        cumulative = 0
+        for (bound, bucket_count) in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            lines.append('%s_bucket%s %s' % (self.name,
+                                             self.format_labels(labelvalues, [('le', format_number(bound))]),
+                                             cumulative))
+        lines.append('%s_bucket%s %s' % (self.name, self.format_labels(labelvalues, [('le', '+Inf')]), count))
+        lines.append('%s_sum%s %s' % (self.name, self.format_labels(labelvalues), format_number(total)))
+        lines.append('%s_count%s %s' % (self.name, self.format_labels(labelvalues), count))
+        return lines
+
+
+def format_number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """
+        Return all metrics in Prometheus text format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def drain(self):
+        """
+        Return the values collected since the last call and reset them;
+        used to hand on the metrics of a worker process to its parent
+        process, which merges them (see 'merge').
+        """
+        return dict([(metric.name, metric.drain()) for metric in self.metrics])
+
+    def merge(self, drained):
+        for metric in self.metrics:
+            if metric.name in drained:
+                metric.merge(drained[metric.name])
+
+    def write_textfile(self, path):
+        """
+        Write the metrics to the given file; the file is replaced atomically,
+        as required by the textfile collector of the node exporter.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        (fd, tmp_path) = tempfile.mkstemp(dir=directory, prefix='.%s' % os.path.basename(path))
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(self.render())
+        os.chmod(tmp_path, 0o644)
+        os.rename(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+
+FILES = Counter(REGISTRY, 'mantis_iodef_files_total',
+                'IODEF documents processed by the importer.',
+                ['status'])
+
+INCIDENTS = Counter(REGISTRY, 'mantis_iodef_incidents_total',
+                    'Incidents by outcome (imported, filtered, skipped, failed, no_id).',
+                    ['outcome'])
+
+FACTS = Counter(REGISTRY, 'mantis_iodef_facts_total',
+                'Facts generated for imported Incidents.')
+
+VALUES = Counter(REGISTRY, 'mantis_iodef_values_total',
+                 'Fact values generated for imported Incidents.')
+
+STAGE_SECONDS = Histogram(REGISTRY, 'mantis_iodef_stage_seconds',
+                          'Latency of the import stages (parse: per document, incident: per Incident, '
+                          'commit: per batch).',
+                          ['stage'])
+
+BATCH_SIZE = Histogram(REGISTRY, 'mantis_iodef_batch_size',
+                       'Number of Incidents written per transaction.',
+                       buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+CACHE_REQUESTS = Counter(REGISTRY, 'mantis_iodef_cache_requests_total',
+                         'Lookups in the caches of the importer by result (hit, miss).',
+                         ['cache', 'result'])
+
+CORRELATIONS = Counter(REGISTRY, 'mantis_iodef_correlations_total',
+                       'Pairs of a newly imported Incident and an existing Incident sharing observables.')
+
+DEAD_LETTERS = Gauge(REGISTRY, 'mantis_iodef_dead_letters',
+                     'Number of Incidents waiting in the dead letter spool.')
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        content = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, address='127.0.0.1'):
+    """
+    Serve the metrics via HTTP on the given port in a daemon thread;
+    returns the server.
+    """
+    server = HTTPServer((address, port), MetricsRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
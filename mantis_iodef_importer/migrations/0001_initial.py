@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'ImportCheckpoint'
+        db.create_table(u'mantis_iodef_importer_importcheckpoint', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('file_digest', self.gf('django.db.models.fields.CharField')(max_length=64)),
+            ('ordinal', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('incident_id', self.gf('django.db.models.fields.CharField')(max_length=255, blank=True)),
+            ('timestamp', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, blank=True)),
+        ))
+        db.send_create_signal(u'mantis_iodef_importer', ['ImportCheckpoint'])
+
+        # Adding unique constraint on 'ImportCheckpoint', fields ['file_digest', 'ordinal']
+        db.create_unique(u'mantis_iodef_importer_importcheckpoint', ['file_digest', 'ordinal'])
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'ImportCheckpoint', fields ['file_digest', 'ordinal']
+        db.delete_unique(u'mantis_iodef_importer_importcheckpoint', ['file_digest', 'ordinal'])
+
+        # Deleting model 'ImportCheckpoint'
+        db.delete_table(u'mantis_iodef_importer_importcheckpoint')
+
+    models = {
+        u'mantis_iodef_importer.importcheckpoint': {
+            'Meta': {'unique_together': "(('file_digest', 'ordinal'),)", 'object_name': 'ImportCheckpoint'},
+            'file_digest': ('django.db.models.fields.CharField', [], {'max_length': '64'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'incident_id': ('django.db.models.fields.CharField', [], {'max_length': '255', 'blank': 'True'}),
+            'ordinal': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'timestamp': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['mantis_iodef_importer']
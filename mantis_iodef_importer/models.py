@@ -0,0 +1,242 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from django.db import IntegrityError, models
+
+from mantis_iodef_importer.transactions import savepoint
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Record of an Incident that has been committed during the import of an
+    input file, identified by the SHA-256 digest of the file's content.
+
+    The ordinal is the position of the Incident within the file (counting
+    from 1); it identifies the Incident even if the IncidentID is missing
+    or occurs several times in the file.
+    """
+
+    file_digest = models.CharField(max_length=64)
+
+    ordinal = models.PositiveIntegerField()
+
+    incident_id = models.CharField(max_length=255, blank=True)
+
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('file_digest', 'ordinal')
+
+
+class IncidentTimelineManager(models.Manager):
+
+    def incidents_between(self, start=None, end=None, kinds=None):
+        """
+        Return the Information Objects of the Incidents that have a point in
+        time of one of the given kinds (default: all kinds) between
+        'start' and 'end' (both inclusive; either bound may be left out).
+        """
+        from dingos.models import InfoObject
+
+        entries = self.all()
+        if kinds:
+            entries = entries.filter(kind__in=kinds)
+        if start:
+            entries = entries.filter(timestamp__gte=start)
+        if end:
+            entries = entries.filter(timestamp__lte=end)
+        return InfoObject.objects.filter(pk__in=entries.values('iobject'))
+
+
+class IncidentTimeline(models.Model):
+    """
+    Point in time of an Incident, as given by the IODEF elements
+    ReportTime, DetectTime, StartTime and EndTime of the Incident and its
+    EventData.
+
+    In the facts of an Incident, these times are strings; the timeline
+    holds them as parsed, timezone-aware datetimes, so that time-range
+    queries can use the index on the timestamp.
+    """
+
+    REPORT = 'report'
+    DETECT = 'detect'
+    START = 'start'
+    END = 'end'
+
+    KIND_CHOICES = ((REPORT, 'ReportTime'),
+                    (DETECT, 'DetectTime'),
+                    (START, 'StartTime'),
+                    (END, 'EndTime'))
+
+    iobject = models.ForeignKey('dingos.InfoObject', related_name='iodef_timeline')
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+
+    timestamp = models.DateTimeField(db_index=True)
+
+    objects = IncidentTimelineManager()
+
+    class Meta:
+        index_together = [('kind', 'timestamp')]
+
+
+class IncidentObservableManager(models.Manager):
+
+    def incidents_with(self, kind, value):
+        """
+        Return the Information Objects of the Incidents in which the
+        given observable (e.g., 'ipv4-addr', '192.0.2.1') occurs.
+        """
+        from dingos.models import InfoObject
+        from mantis_iodef_importer.correlation import observable_digest, normalize
+
+        entries = self.filter(digest=observable_digest(kind, normalize(kind, value)))
+        return InfoObject.objects.filter(pk__in=entries.values('iobject'))
+
+
+class IncidentObservable(models.Model):
+    """
+    Inverted index from observables (addresses, domain names, ports, hashes)
+    to the Incidents in which they occur.
+
+    Observables are normalized (see correlation.normalize) and looked up
+    via the SHA-256 digest of kind and value, so that the Incidents that
+    share observables with a new Incident are found with one indexed lookup
+    rather than a self-join over the fact values.
+    """
+
+    digest = models.CharField(max_length=64, db_index=True)
+
+    kind = models.CharField(max_length=32)
+
+    value = models.CharField(max_length=255)
+
+    iobject = models.ForeignKey('dingos.InfoObject', related_name='iodef_observables')
+
+    objects = IncidentObservableManager()
+
+    class Meta:
+        unique_together = ('digest', 'iobject')
+
+
+class IncidentSnapshotManager(models.Manager):
+
+    def get_snapshot(self, iobject):
+        """
+        Return the DingoObjDict of an imported Incident (given as Information
+        Object or primary key) from its snapshot, read with a single
+        primary-key lookup, or None if there is no snapshot.
+
+        For an Information Object, the snapshot is read from the database
+        the object has been read from (see routers.py).
+        """
+        from mantis_iodef_importer.snapshots import decode_snapshot
+
+        manager = self
+        if hasattr(iobject, '_state'):
+            manager = self.db_manager(iobject._state.db)
+            iobject = iobject.pk
+        data = list(manager.filter(pk=iobject).values_list('data', flat=True)[:1])
+        if not data:
+            return None
+        return decode_snapshot(data[0])
+
+    def get_snapshots(self, iobject_ids):
+        """
+        Return a dictionary that maps the given primary keys of Information
+        Objects to the DingoObjDicts of their snapshots, read with one query;
+        objects without snapshot are left out.
+        """
+        from mantis_iodef_importer.snapshots import decode_snapshot
+
+        return dict([(pk, decode_snapshot(data))
+                     for (pk, data) in self.filter(pk__in=iobject_ids).values_list('iobject', 'data')])
+
+
+class IncidentSnapshot(models.Model):
+    """
+    Snapshot of the contents of an imported Incident revision (the
+    DingoObjDict from which its facts have been generated, i.e., after the
+    projection), stored compressed (see snapshots.py).
+
+    Showing or exporting an Incident from its facts takes a join over
+    dozens of fact rows; the snapshot is read by the primary key of the
+    Information Object.
+    """
+
+    iobject = models.OneToOneField('dingos.InfoObject', primary_key=True, related_name='iodef_snapshot')
+
+    data = models.TextField()
+
+    objects = IncidentSnapshotManager()
+
+
+class IncidentAggregateManager(models.Manager):
+
+    def add_counts(self, deltas):
+        """
+        Add the counts in the dictionary 'deltas', which maps
+        (day, csirt, impact_type, severity) to a number of Incidents, to
+        the aggregate rows: one UPDATE per key, and an INSERT for keys
+        without row.
+        """
+        # The keys are processed in a fixed order, so that concurrent
+        # imports lock the rows in the same order.
+
+        for (key, count) in sorted(deltas.items()):
+            if not count:
+                continue
+            (day, csirt, impact_type, severity) = key
+            rows = self.filter(day=day, csirt=csirt, impact_type=impact_type, severity=severity)
+            if rows.update(count=models.F('count') + count):
+                continue
+            try:
+                with savepoint(using=self.db):
+                    self.create(day=day, csirt=csirt, impact_type=impact_type, severity=severity, count=count)
+            except IntegrityError:
+                # The row has been created concurrently.
+                rows.update(count=models.F('count') + count)
+
+
+class IncidentAggregate(models.Model):
+    """
+    Number of imported Incidents per day (of the ReportTime), reporting
+    CSIRT (the name of the IncidentID), impact type and severity (of
+    Assessment/Impact), maintained during import (see aggregates.py).
+
+    An Incident with several impacts is counted once per distinct pair
+    of impact type and severity; an Incident without impact is counted
+    with empty type and severity. Each imported revision of an Incident
+    is counted.
+    """
+
+    day = models.DateField(db_index=True)
+
+    csirt = models.CharField(max_length=255)
+
+    impact_type = models.CharField(max_length=64, blank=True)
+
+    severity = models.CharField(max_length=16, blank=True)
+
+    count = models.PositiveIntegerField(default=0)
+
+    objects = IncidentAggregateManager()
+
+    class Meta:
+        unique_together = ('day', 'csirt', 'impact_type', 'severity')
@@ -0,0 +1,99 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from dingos.models import InfoObjectNaming
+
+from mantis_iodef_importer.routers import current_shard
+
+
+# Naming schemas for Incidents (registered by mantis_iodef_set_naming)
+
+INCIDENT_NAMING_SCHEMAS = [
+    "[Description] ([@purpose])",
+    "[Description]"
+]
+
+
+def incident_name(elt_dict):
+    """
+    Compute the name of an Incident from its DingoObjDict, with the same
+    result as the naming schemas above applied to the facts of the
+    Incident: the (first) Description followed by the purpose.
+    Returns None if the Incident has no Description.
+    """
+    description = elt_dict.get('Description')
+    if isinstance(description, list):
+        description = description[0] if description else None
+    if isinstance(description, dict):
+        description = description.get('_value')
+    if description is None:
+        return None
+    if '@purpose' in elt_dict:
+        return "%s (%s)" % (description, elt_dict['@purpose'])
+    return description
+
+
+class IncidentNamer(object):
+    """
+    Names the Incidents of an import from their DingoObjDicts.
+
+    After writing the facts of an object, DINGO names it (InfoObject.set_name),
+    which reads the naming schemas and all facts of the object once more.
+    For Incidents, the name computed here is handed to the object before
+    its facts are written (see 'preset'), so that DINGO saves the object
+    with that name and does not extract it.
+
+    The computed name is only used for object types whose naming schemas
+    are the ones above (as registered by mantis_iodef_set_naming); otherwise,
+    DINGO's naming is left as it is. The schemas are read once per type,
+    shard (see routers.py) and import.
+    """
+
+    def __init__(self):
+        self.schemas_match = {}
+
+    def uses_incident_naming(self, iobject_type_id):
+        key = (current_shard(), iobject_type_id)
+        if key not in self.schemas_match:
+            schemas = list(InfoObjectNaming.objects.filter(iobject_type=iobject_type_id).order_by(
+                'position').values_list('format_string', flat=True))
+            self.schemas_match[key] = (schemas == INCIDENT_NAMING_SCHEMAS)
+        return self.schemas_match[key]
+
+    def preset(self, iobject, elt_dict):
+        """
+        Have the next call of 'set_name' on the given Information Object
+        (which DINGO's 'from_dict' issues after writing the facts) use the
+        name computed from the Incident's DingoObjDict rather than
+        extract the name from the facts.
+
+        Returns the preset name or None if the Incident naming does not
+        apply to the object.
+        """
+        if not self.uses_incident_naming(iobject.iobject_type_id):
+            return None
+        name = incident_name(elt_dict)
+        if name is None:
+            return None
+        set_name = iobject.set_name
+
+        def set_preset_name(name=name):
+            return set_name(name)
+
+        iobject.set_name = set_preset_name
+        return name
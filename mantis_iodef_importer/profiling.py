@@ -0,0 +1,135 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import cProfile
+
+import logging
+
+import os
+
+import sys
+
+import threading
+
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+class ImportProfiler(object):
+    """
+    Profiling of the import of input files.
+
+    For each profiled input, the profiler writes into 'directory'
+
+    - '<input name>-<timestamp>.pstats': cProfile statistics (if 'cpu' is True);
+      use the pstats module or a viewer such as snakeviz to inspect them
+
+    - '<input name>-<timestamp>.memory.txt': the peak resident set size of
+      the process before and after the import, together with the CPU
+      times and page faults of the import, as reported by
+      resource.getrusage (if 'trace_memory' is True)
+
+    To keep the overhead low in production, only every 'every'-th input
+    is profiled.
+
+    Note that cProfile only sees the thread that runs xml_import and that
+    the resource usage is that of the whole process. The peak resident set
+    size is a high-water mark: it only grows during an import that
+    needs more memory than any earlier one.
+    """
+
+    def __init__(self, directory, cpu=True, trace_memory=False, every=1):
+        if trace_memory and not resource:
+            raise ValueError("Tracing memory requires the resource module (not available on this platform).")
+        self.directory = directory
+        self.cpu = cpu
+        self.trace_memory = trace_memory
+        self.every = max(1, every or 1)
+
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def sampled(self):
+        with self.lock:
+            self.count += 1
+            return (self.count - 1) % self.every == 0
+
+    @contextmanager
+    def profile(self, source):
+        """
+        Context manager that profiles the enclosed import of 'source'
+        (if the input is sampled).
+        """
+        if not self.sampled():
+            yield
+            return
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        base_path = os.path.join(self.directory, '%s-%s' % (os.path.basename(source).replace(' ', '_'),
+                                                            timezone.now().strftime('%Y%m%dT%H%M%S%f')))
+
+        profile = None
+        if self.cpu:
+            profile = cProfile.Profile()
+        usage = None
+        if self.trace_memory:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+        if profile:
+            profile.enable()
+
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats('%s.pstats' % base_path)
+            if usage:
+                self.write_memory_report('%s.memory.txt' % base_path, source, usage,
+                                         resource.getrusage(resource.RUSAGE_SELF))
+            logger.info("Profile of import of %s written to %s.*" % (source, base_path))
+
+    def write_memory_report(self, path, source, before, after):
+        with open(path, 'w') as report:
+            report.write("Import of %s\n\n" % source)
+            report.write("Peak resident set size: %s KiB before, %s KiB after the import\n" % (
+                peak_rss_kib(before), peak_rss_kib(after)))
+            report.write("CPU time: %.3fs user, %.3fs system\n" % (after.ru_utime - before.ru_utime,
+                                                                  after.ru_stime - before.ru_stime))
+            report.write("Page faults: %s major, %s minor\n" % (after.ru_majflt - before.ru_majflt,
+                                                                after.ru_minflt - before.ru_minflt))
+
+
+def peak_rss_kib(usage):
+    """
+    Return the peak resident set size (in KiB) from the given resource usage;
+    getrusage reports it in bytes on OS X and in KiB elsewhere.
+    """
+    if sys.platform == 'darwin':
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
@@ -0,0 +1,259 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+import json
+
+import os
+
+import tempfile
+
+import zlib
+
+from collections import OrderedDict
+
+from django.conf import settings
+
+from dingos.core.datastructures import DingoObjDict
+
+from mantis_iodef_importer import metrics
+
+
+BLOB_REFERENCE_PREFIX = 'blob:sha256:'
+
+
+class BlobStore(object):
+    """
+    Content-addressed store for externalized IODEF content.
+
+    Each blob is stored zlib-compressed in a file named after the SHA-256
+    digest of its uncompressed content; identical content is thus
+    stored only once. Blobs are referenced by strings of the form
+    'blob:sha256:<hex digest>'.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[0:2], digest[2:4], '%s.z' % digest)
+
+    def put(self, content):
+        """
+        Store content (bytes or unicode) and return the reference to it.
+        """
+        if not isinstance(content, bytes):
+            content = content.encode('utf-8')
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+
+        if os.path.exists(path):
+            metrics.CACHE_REQUESTS.inc(cache='blob_store', result='hit')
+        else:
+            metrics.CACHE_REQUESTS.inc(cache='blob_store', result='miss')
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # Created concurrently by another import
+                    if not os.path.isdir(directory):
+                        raise
+
+            # We write to a temporary file and rename it, so that
+            # concurrent imports never see a partially written blob.
+
+            (fd, tmp_path) = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(zlib.compress(content))
+            os.rename(tmp_path, path)
+
+        return BLOB_REFERENCE_PREFIX + digest
+
+    def get(self, reference):
+        """
+        Return the (uncompressed) content for a reference created by 'put'.
+        """
+        if not reference.startswith(BLOB_REFERENCE_PREFIX):
+            raise ValueError("'%s' is not a blob reference" % reference)
+        with open(self.path(reference[len(BLOB_REFERENCE_PREFIX):]), 'rb') as blob_file:
+            return zlib.decompress(blob_file.read())
+
+
+class Projection(object):
+    """
+    Projection of the DingoObjDict of an Incident before facts are generated.
+
+    The projection is given as list of rules; each rule is a dictionary
+    with the following keys:
+
+    - 'path': path of elements relative to the Incident, e.g.,
+      'EventData/Record/RecordData/RecordItem'. A rule matches all elements
+      whose path ends with the given path, so 'Record/RecordData/RecordItem'
+      or just 'AdditionalData' may be used as well.
+
+    - 'action': one of
+
+      - 'drop': the element (including all its children) is removed
+
+      - 'truncate': the text content of the element is cut to 'length' characters
+
+      - 'externalize': the element content (the text, or, if the element has
+        children, its dictionary representation as JSON) is moved into the blob store;
+        the element then only contains a blob reference 'blob:sha256:<digest>'
+        (attributes of the element are kept). If 'min_length' is given,
+        only content at least that long is externalized.
+    """
+
+    ACTIONS = ['drop', 'truncate', 'externalize']
+
+    def __init__(self, rules, blob_store=None):
+
+        self.rules_by_tag = {}
+
+        for rule in rules:
+            action = rule.get('action')
+            if action not in self.ACTIONS:
+                raise ValueError("Unknown projection action '%s'" % action)
+            if action == 'truncate' and not rule.get('length'):
+                raise ValueError("Projection rule for '%s' needs a length for truncation" % rule.get('path'))
+            if action == 'externalize' and not blob_store:
+                raise ValueError("Projection rule for '%s' needs a blob store" % rule.get('path'))
+            path = tuple([x for x in rule['path'].split('/') if x])
+            self.rules_by_tag.setdefault(path[-1], []).append((path, rule))
+
+        if isinstance(blob_store, BlobStore) or not blob_store:
+            self.blob_store = blob_store
+        else:
+            self.blob_store = BlobStore(blob_store)
+
+        self.stats = dict([(action, 0) for action in self.ACTIONS])
+
+    @classmethod
+    def from_specs(cls, drop=None, truncate=None, externalize=None, blob_store=None):
+        """
+        Create a projection from command line specifications: lists of paths
+        to drop resp. externalize and a list of '<path>:<length>' for truncation.
+        """
+        rules = []
+        for path in drop or []:
+            rules.append({'path': path, 'action': 'drop'})
+        for spec in truncate or []:
+            if not ':' in spec:
+                raise ValueError("Truncation '%s' is not of the form <path>:<length>" % spec)
+            (path, length) = spec.rsplit(':', 1)
+            rules.append({'path': path, 'action': 'truncate', 'length': int(length)})
+        for path in externalize or []:
+            rules.append({'path': path, 'action': 'externalize'})
+        return cls(rules, blob_store=blob_store)
+
+    @classmethod
+    def coerce(cls, projection, blob_store=None):
+        """
+        Turn the 'projection' argument of the importer into a Projection: the
+        argument may be a Projection or a list of rules. If no projection
+        is given, the rules in setting MANTIS_IODEF_PROJECTION are used (if any).
+        """
+        if isinstance(projection, Projection):
+            return projection
+        if projection is None:
+            projection = getattr(settings, 'MANTIS_IODEF_PROJECTION', None)
+        if not projection:
+            return None
+        if not blob_store:
+            blob_store = getattr(settings, 'MANTIS_IODEF_BLOB_STORE', None)
+        return cls(projection, blob_store=blob_store)
+
+    def apply(self, contents, path=()):
+        """
+        Apply the projection to the dictionary 'contents' (in place).
+        """
+        for key in list(contents.keys()):
+            if key.startswith('@') or key == '_value':
+                continue
+            value = contents[key]
+            elt_path = path + (key,)
+
+            rule = self.matching_rule(elt_path)
+
+            if rule:
+                if rule['action'] == 'drop':
+                    del contents[key]
+                    self.stats['drop'] += 1
+                    continue
+                if isinstance(value, list):
+                    contents[key] = [self.apply_rule(rule, x) for x in value]
+                else:
+                    contents[key] = self.apply_rule(rule, value)
+            else:
+                if isinstance(value, list):
+                    for x in value:
+                        if isinstance(x, dict):
+                            self.apply(x, elt_path)
+                elif isinstance(value, dict):
+                    self.apply(value, elt_path)
+        return contents
+
+    def matching_rule(self, elt_path):
+        for (path, rule) in self.rules_by_tag.get(elt_path[-1], []):
+            if elt_path[-len(path):] == path:
+                return rule
+        return None
+
+    def apply_rule(self, rule, value):
+
+        if rule['action'] == 'truncate':
+            length = rule['length']
+            if isinstance(value, dict):
+                if len(value.get('_value') or '') > length:
+                    value['_value'] = value['_value'][:length]
+                    self.stats['truncate'] += 1
+            elif value and len(value) > length:
+                value = value[:length]
+                self.stats['truncate'] += 1
+            return value
+
+        # Externalization: attributes stay in place, the remaining
+        # content is moved to the blob store.
+
+        if isinstance(value, dict):
+            attributes = [(k, v) for (k, v) in value.items() if k.startswith('@')]
+            content = [(k, v) for (k, v) in value.items() if not k.startswith('@')]
+            if len(content) == 1 and content[0][0] == '_value':
+                content = content[0][1]
+            else:
+                content = json.dumps(OrderedDict(content))
+        else:
+            attributes = None
+            content = value
+
+        if not content or len(content) < rule.get('min_length', 0):
+            return value
+
+        reference = self.blob_store.put(content)
+        self.stats['externalize'] += 1
+
+        if attributes:
+            value = DingoObjDict()
+            for (key, attr_value) in attributes:
+                value[key] = attr_value
+            value['_value'] = reference
+            return value
+        return reference
@@ -0,0 +1,330 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import collections
+
+from django.contrib.contenttypes.models import ContentType
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from django.db.models import Max
+
+from dingos import DINGOS_BLOB_TABLE
+
+from dingos.models import BlobStorage, Fact, FactValue, Identifier, InfoObject, InfoObject2Fact, Marking2X, NodeID, Relation
+
+from mantis_iodef_importer.models import IncidentObservable, IncidentSnapshot, IncidentTimeline
+
+from mantis_iodef_importer.routers import current_shard
+
+from mantis_iodef_importer.transactions import atomic
+
+
+# Deleting the revisions of Incidents and their facts through the ORM
+# would load and delete each row on its own (and follow each relation in
+# Python). Here, the rows are deleted with plain SQL statements, one per
+# table and chunk of primary keys, each chunk in a transaction of its own.
+#
+# Imports may run at the same time:
+#
+# - The latest revision of an Incident is never deleted, and revisions
+#   are only deleted if they are not the latest one when the chunk is
+#   written; a revision imported meanwhile only makes older ones obsolete.
+#
+# - Facts, values and node ids are shared between Incidents; they are
+#   deleted once no row refers to them anymore. Candidates are locked
+#   (where the database supports it) before the deletes check again that
+#   they are unreferenced, so that no reference can be added in between.
+#   An import that picks up such a row just before it is deleted
+#   fails for the Incident concerned (which is then reported and can be
+#   replayed from the dead letter directory, see deadletters.py).
+
+
+def qn(database, name):
+    return connections[database].ops.quote_name(name)
+
+
+def table(database, model):
+    return qn(database, model._meta.db_table)
+
+
+def column(database, model, field_name):
+    return '%s.%s' % (table(database, model), qn(database, model._meta.get_field(field_name).column))
+
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def execute(database, sql, params):
+    cursor = connections[database].cursor()
+    cursor.execute(sql, params)
+    return cursor
+
+
+def revisions_to_purge(revisions, keep=None, older_than=None):
+    """
+    Return the primary keys of the revisions to be deleted from a list of
+    (identifier, pk, timestamp, latest) tuples of all revisions of some
+    Incidents, where 'latest' is the primary key of the latest revision of
+    the identifier.
+
+    Per identifier, the newest 'keep' revisions and the revisions not older
+    than 'older_than' are kept; if both are given, only revisions that
+    fulfil neither condition are deleted. The latest revision is always kept.
+    """
+    by_identifier = collections.defaultdict(list)
+    for (identifier, pk, timestamp, latest) in revisions:
+        by_identifier[identifier].append((timestamp, pk, latest))
+
+    result = []
+    for rows in by_identifier.values():
+        rows.sort(reverse=True)
+        for (position, (timestamp, pk, latest)) in enumerate(rows):
+            if pk == latest:
+                continue
+            if keep is not None and position < keep:
+                continue
+            if older_than is not None and timestamp >= older_than:
+                continue
+            result.append(pk)
+    return result
+
+
+def delete_iobjects(database, pks):
+    """
+    Delete the given Information Objects, their facts (the rows that link
+    them to their facts), markings, timeline, observables and snapshots in
+    one transaction; objects that are the latest revision of their
+    identifier are left out. Returns the number of deleted objects.
+    """
+    if not pks:
+        return 0
+
+    with atomic(using=database):
+        # The objects are locked, and the check for latest revisions is
+        # done under the lock.
+
+        sql = ("SELECT %(id)s FROM %(iobject)s WHERE %(id)s IN (%(pks)s) "
+               "AND NOT EXISTS (SELECT 1 FROM %(identifier)s WHERE %(latest)s = %(id)s)") % {
+            'id': column(database, InfoObject, 'id'),
+            'iobject': table(database, InfoObject),
+            'pks': placeholders(pks),
+            'identifier': table(database, Identifier),
+            'latest': column(database, Identifier, 'latest')}
+        if connections[database].features.has_select_for_update:
+            sql += " " + connections[database].ops.for_update_sql()
+        pks = [row[0] for row in execute(database, sql, pks).fetchall()]
+        if not pks:
+            return 0
+
+        content_type = ContentType.objects.db_manager(database).get_for_model(InfoObject)
+        execute(database,
+                "DELETE FROM %s WHERE %s = %%s AND %s IN (%s)" % (table(database, Marking2X),
+                                                                  column(database, Marking2X, 'content_type'),
+                                                                  column(database, Marking2X, 'object_id'),
+                                                                  placeholders(pks)),
+                [content_type.pk] + pks)
+
+        for model in [IncidentTimeline, IncidentObservable, IncidentSnapshot]:
+            execute(database,
+                    "DELETE FROM %s WHERE %s IN (%s)" % (table(database, model),
+                                                         column(database, model, 'iobject'),
+                                                         placeholders(pks)),
+                    pks)
+
+        # Attribute facts refer to the facts they belong to; these
+        # references are removed first, since some databases check
+        # them row by row.
+
+        execute(database,
+                "UPDATE %s SET %s = NULL WHERE %s IN (%s)" % (table(database, InfoObject2Fact),
+                                                              qn(database, InfoObject2Fact._meta.get_field('attributed_fact').column),
+                                                              column(database, InfoObject2Fact, 'iobject'),
+                                                              placeholders(pks)),
+                pks)
+        execute(database,
+                "DELETE FROM %s WHERE %s IN (%s)" % (table(database, InfoObject2Fact),
+                                                     column(database, InfoObject2Fact, 'iobject'),
+                                                     placeholders(pks)),
+                pks)
+        execute(database,
+                "DELETE FROM %s WHERE %s IN (%s)" % (table(database, InfoObject),
+                                                     column(database, InfoObject, 'id'),
+                                                     placeholders(pks)),
+                pks)
+    return len(pks)
+
+
+def purge_revisions(keep=None, older_than=None, chunk_size=500, progress=None):
+    """
+    Delete old revisions of the imported Incidents (see 'revisions_to_purge')
+    from the database written to (see routers.py) and return their number.
+
+    The Incidents are gone through in chunks of 'chunk_size' primary keys;
+    for each chunk, the revisions of the Incidents in it are read and
+    the obsolete revisions among the chunk are deleted. The function
+    'progress' is called with the last primary key of the chunk, the
+    highest primary key and the number of revisions deleted so far
+    after each chunk.
+    """
+    database = current_shard() or DEFAULT_DB_ALIAS
+    incidents = InfoObject.objects.using(database).filter(iobject_type__name='Incident',
+                                                          iobject_family__name='iodef')
+
+    # Incidents imported from here on are not considered.
+
+    max_pk = incidents.aggregate(Max('pk'))['pk__max'] or 0
+
+    deleted = 0
+    lower = 0
+    while lower < max_pk:
+        upper = lower + chunk_size
+        identifiers = set(incidents.filter(pk__gt=lower, pk__lte=upper).values_list('identifier', flat=True))
+        if identifiers:
+            revisions = incidents.filter(identifier__in=identifiers).values_list('identifier',
+                                                                                 'pk',
+                                                                                 'timestamp',
+                                                                                 'identifier__latest')
+            deleted += delete_iobjects(database, [pk for pk in revisions_to_purge(revisions, keep, older_than)
+                                                  if lower < pk <= upper])
+        lower = upper
+        if progress:
+            progress(min(lower, max_pk), max_pk, deleted)
+    return deleted
+
+
+def delete_unreferenced(database, model, references, dependents, lower, upper, key_field=None):
+    """
+    Delete the rows of 'model' with primary keys in the range (lower, upper]
+    to which no row refers via the (table, column) pairs in 'references';
+    rows referring to them via the (table, column) pairs in 'dependents' are
+    deleted beforehand. Returns the number of deleted rows.
+
+    The references refer to the primary key or, if given, to the field
+    'key_field' of 'model'; a reference may carry an SQL condition on the
+    referring row as third element.
+    """
+    def unreferenced(key):
+        conditions = []
+        for ref in references:
+            (ref_table, ref_column) = ref[:2]
+            condition = "%s.%s = %s" % (qn(database, ref_table), qn(database, ref_column), key)
+            if len(ref) > 2:
+                condition += " AND " + ref[2]
+            conditions.append("NOT EXISTS (SELECT 1 FROM %s WHERE %s)" % (qn(database, ref_table), condition))
+        return " AND ".join(conditions)
+
+    pk = column(database, model, model._meta.pk.name)
+    key = column(database, model, key_field) if key_field else pk
+
+    with atomic(using=database):
+        sql = "SELECT %s FROM %s WHERE %s > %%s AND %s <= %%s AND %s" % (pk,
+                                                                          table(database, model),
+                                                                          pk,
+                                                                          pk,
+                                                                          unreferenced(key))
+        if connections[database].features.has_select_for_update:
+            sql += " " + connections[database].ops.for_update_sql()
+        pks = [row[0] for row in execute(database, sql, [lower, upper]).fetchall()]
+        if not pks:
+            return 0
+
+        for (dep_table, dep_column) in dependents:
+            dep_key = '%s.%s' % (qn(database, dep_table), qn(database, dep_column))
+            execute(database,
+                    "DELETE FROM %s WHERE %s IN (%s) AND %s" % (qn(database, dep_table),
+                                                                 dep_key,
+                                                                 placeholders(pks),
+                                                                 unreferenced(dep_key)),
+                    pks)
+
+        cursor = execute(database,
+                         "DELETE FROM %s WHERE %s IN (%s) AND %s" % (table(database, model),
+                                                                      pk,
+                                                                      placeholders(pks),
+                                                                      unreferenced(key)),
+                         pks)
+        return cursor.rowcount
+
+
+def reference(model, field_name):
+    return (model._meta.db_table, model._meta.get_field(field_name).column)
+
+
+def collect_garbage(chunk_size=500, progress=None):
+    """
+    Delete the facts, fact values, blobs and node ids that are not referred
+    to anymore (e.g., after 'purge_revisions') from the database written to
+    and return a dictionary with the number of deleted rows per model name.
+    A blob (in DINGO's blob table, as written for long values by DINGO
+    and by digests.FactValueDigestIndex) is referred to by the fact values
+    stored in the blob table that hold its digest.
+
+    Unlike the other rows, a blob is not referred to by a foreign key:
+    an import with value digests that picks up a blob just before it is
+    deleted leaves a fact value without blob behind. Such imports should
+    therefore not run at the same time.
+
+    The tables are gone through in chunks of 'chunk_size' primary keys;
+    the function 'progress' is called with the model name, the last primary
+    key of the chunk, the highest primary key and the number of rows
+    deleted so far after each chunk.
+    """
+    database = current_shard() or DEFAULT_DB_ALIAS
+
+    values = Fact._meta.get_field('fact_values')
+
+    # The models in the order in which they are collected (a model is
+    # collected after the models that refer to it), the references that
+    # keep a row, the rows that are deleted with it and the field referred
+    # to (default: the primary key).
+
+    in_blob_table = "%s = %d" % (column(database, FactValue, 'storage_location'), DINGOS_BLOB_TABLE)
+
+    collected = [(Fact,
+                  [reference(InfoObject2Fact, 'fact'), reference(Relation, 'relation_type')],
+                  [(values.m2m_db_table(), values.m2m_column_name())],
+                  None),
+                 (FactValue,
+                  [(values.m2m_db_table(), values.m2m_reverse_name())],
+                  [],
+                  None),
+                 (BlobStorage,
+                  [reference(FactValue, 'value') + (in_blob_table,)],
+                  [],
+                  'sha256'),
+                 (NodeID,
+                  [reference(InfoObject2Fact, 'node_id')],
+                  [],
+                  None)]
+
+    result = {}
+    for (model, model_references, dependents, key_field) in collected:
+        max_pk = model.objects.using(database).aggregate(Max('pk'))['pk__max'] or 0
+        deleted = 0
+        lower = 0
+        while lower < max_pk:
+            upper = lower + chunk_size
+            deleted += delete_unreferenced(database, model, model_references, dependents, lower, upper,
+                                           key_field=key_field)
+            lower = upper
+            if progress:
+                progress(model.__name__, min(lower, max_pk), max_pk, deleted)
+        result[model.__name__] = deleted
+    return result
@@ -0,0 +1,174 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+import threading
+
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+# Sharding of the imported data by reporting CSIRT
+#
+# With the settings
+#
+#    MANTIS_IODEF_SHARDS = ['shard0', 'shard1', ...]
+#    DATABASE_ROUTERS = ['mantis_iodef_importer.routers.ShardRouter']
+#
+# each Incident is written to one of the given databases, chosen by a
+# stable hash of the 'name' attribute of its IncidentID (the reporting
+# CSIRT): all Incidents of a CSIRT end up in the same database, and
+# feeds of different partners write to different databases.
+#
+# Each shard carries the complete schema of the apps below (run
+# 'syncdb --database=<alias>' for each shard); the dimension tables
+# (fact terms, data types, namespaces, object types, ...) are filled
+# per shard as the Incidents of the shard need them. Queries across
+# all shards are carried out with 'fan_out'.
+
+SHARDED_APPS = ('contenttypes', 'dingos', 'mantis_core', 'mantis_iodef_importer')
+
+ROUTER_PATH = 'mantis_iodef_importer.routers.ShardRouter'
+
+_state = threading.local()
+
+
+def configured_shards():
+    """
+    Return the list of database aliases configured as shards (empty if
+    sharding is not configured).
+    """
+    shards = list(getattr(settings, 'MANTIS_IODEF_SHARDS', None) or [])
+    if shards and ROUTER_PATH not in getattr(settings, 'DATABASE_ROUTERS', []):
+        raise ImproperlyConfigured("MANTIS_IODEF_SHARDS requires '%s' in DATABASE_ROUTERS" % ROUTER_PATH)
+    return shards
+
+
+def shard_for(csirt, shards=None):
+    """
+    Return the database alias for the Incidents reported by the given CSIRT
+    (None if sharding is not configured).
+
+    The assignment depends only on the name and the list of shards (not on
+    Python's hash randomization), so that it is the same in every process.
+    """
+    if shards is None:
+        shards = configured_shards()
+    if not shards:
+        return None
+    if not isinstance(csirt, bytes):
+        csirt = (csirt or u'').encode('utf-8')
+    return shards[int(hashlib.sha1(csirt).hexdigest()[:8], 16) % len(shards)]
+
+
+def current_shard():
+    """
+    Return the shard that the current thread writes to (None outside of 'use_shard').
+    """
+    return getattr(_state, 'shard', None)
+
+
+@contextmanager
+def use_shard(alias):
+    """
+    Within the context, the models of the sharded apps are read from and
+    written to the given database (in the current thread). 'None' leaves the
+    routing as it is.
+    """
+    previous = current_shard()
+    if alias is not None:
+        _state.shard = alias
+    try:
+        yield
+    finally:
+        _state.shard = previous
+
+
+def group_by_shard(items):
+    """
+    Group work items (triples of id and revision info, element name and
+    DingoObjDict) by the shard recorded in their id and revision info;
+    returns a list of pairs (alias, items) in which the items keep
+    their order.
+    """
+    groups = []
+    group_by_alias = {}
+    for item in items:
+        alias = item[0].get('shard')
+        if alias not in group_by_alias:
+            group_by_alias[alias] = []
+            groups.append((alias, group_by_alias[alias]))
+        group_by_alias[alias].append(item)
+    return groups
+
+
+def fan_out(queryset, shards=None):
+    """
+    Iterate over the results of the queryset in each shard, one shard
+    after another. Without shards, the queryset is evaluated as it is.
+    """
+    if shards is None:
+        shards = configured_shards()
+    if not shards:
+        for result in queryset:
+            yield result
+        return
+    for alias in shards:
+        for result in queryset.using(alias):
+            yield result
+
+
+def fan_out_count(queryset, shards=None):
+    """
+    Return the sum of the counts of the queryset in each shard.
+    """
+    if shards is None:
+        shards = configured_shards()
+    if not shards:
+        return queryset.count()
+    return sum([queryset.using(alias).count() for alias in shards])
+
+
+class ShardRouter(object):
+    """
+    Database router that directs the models of the sharded apps to the
+    shard chosen with 'use_shard' for the current thread. Outside of
+    'use_shard', the router leaves the decision to Django.
+    """
+
+    def db_for_read(self, model, **hints):
+        # Related objects are read from the database of the object
+        # they are reached from.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return self.db_for_write(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in SHARDED_APPS:
+            return current_shard()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
@@ -0,0 +1,150 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import collections
+
+import threading
+
+
+class FairScheduler(object):
+    """
+    Queues of work items per source (e.g., per reporting CSIRT) that are
+    served by deficit round robin.
+
+    Each source has a weight (default: 1) and each item a cost (e.g., its
+    size). In each round, a source is granted 'quantum' times its weight
+    and may take items as long as its grant covers their cost: over
+    time, each source with queued items receives a share of the service
+    proportional to its weight, no matter how many items it has queued.
+    A source that dumps a large backlog thus delays the others by at
+    most one round.
+
+    Items put with 'priority' are served before all other items (again
+    fairly among their sources). The number of units of a source that
+    are in flight -- handed out by 'get' and not yet reported back with
+    'done' -- can be capped with 'max_in_flight'.
+
+    The scheduler may be used by several threads.
+    """
+
+    PRIORITY = 0
+    NORMAL = 1
+
+    def __init__(self, weights=None, default_weight=1, quantum=1, max_in_flight=None):
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.quantum = quantum
+        self.max_in_flight = max(1, max_in_flight) if max_in_flight else None
+
+        # Per class: queues of (item, cost) by source, the ring of
+        # sources with queued items (in the order they are served) and the
+        # deficits of these sources.
+
+        self.queues = ({}, {})
+        self.rings = ([], [])
+        self.deficits = ({}, {})
+
+        self.in_flight = collections.defaultdict(int)
+        self.length = 0
+        self.lock = threading.Lock()
+
+    def weight(self, source):
+        return self.weights.get(source, self.default_weight)
+
+    def put(self, source, item, cost=1, priority=False):
+        klass = self.PRIORITY if priority else self.NORMAL
+        with self.lock:
+            queue = self.queues[klass].get(source)
+            if queue is None:
+                queue = self.queues[klass][source] = collections.deque()
+                self.rings[klass].append(source)
+                self.deficits[klass][source] = 0
+            queue.append((item, max(cost, 1)))
+            self.length += 1
+
+    def get(self, max_items=1, group=None):
+        """
+        Return the next unit of work as pair (source, items) -- up to
+        'max_items' items of the same source and, if the function 'group'
+        is given, with the same value of group(item) -- or None if no
+        source with queued items is below its cap.
+
+        The caller reports the unit back with 'done' when it has been
+        processed.
+        """
+        with self.lock:
+            for klass in (self.PRIORITY, self.NORMAL):
+                unit = self.serve(klass, max_items, group)
+                if unit:
+                    self.in_flight[unit[0]] += 1
+                    return unit
+            return None
+
+    def done(self, source):
+        with self.lock:
+            self.in_flight[source] -= 1
+            if not self.in_flight[source]:
+                del self.in_flight[source]
+
+    def serve(self, klass, max_items, group):
+        queues = self.queues[klass]
+        ring = self.rings[klass]
+        deficits = self.deficits[klass]
+
+        eligible = [source for source in ring
+                    if not self.max_in_flight or self.in_flight[source] < self.max_in_flight]
+        if not eligible:
+            return None
+
+        # If none of the sources can be served with its grant, we
+        # grant as many further rounds at once as are needed for the first
+        # one to be served (rather than going round and round).
+
+        if all([deficits[source] < queues[source][0][1] for source in eligible]):
+            rounds = min([-(-(queues[source][0][1] - deficits[source]) // (self.quantum * self.weight(source)))
+                          for source in eligible])
+            for source in eligible:
+                deficits[source] += rounds * self.quantum * self.weight(source)
+
+        for source in eligible:
+            queue = queues[source]
+            if deficits[source] < queue[0][1]:
+                continue
+
+            items = []
+            key = group(queue[0][0]) if group else None
+            while (queue and len(items) < max_items and deficits[source] >= queue[0][1]
+                   and (not group or group(queue[0][0]) == key)):
+                (item, cost) = queue.popleft()
+                deficits[source] -= cost
+                items.append(item)
+            self.length -= len(items)
+
+            # The source goes to the end of the ring; a source without
+            # queued items leaves it and loses its remaining grant.
+
+            ring.remove(source)
+            if queue:
+                ring.append(source)
+            else:
+                del queues[source]
+                del deficits[source]
+            return (source, items)
+
+    def __len__(self):
+        return self.length
@@ -0,0 +1,72 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import base64
+
+import json
+
+import zlib
+
+from mantis_iodef_importer.compact import CompactIncident
+
+from mantis_iodef_importer.models import IncidentSnapshot
+
+
+# zlib compression level of the snapshots
+
+COMPRESSION_LEVEL = 6
+
+
+def encode_snapshot(elt_dict):
+    """
+    Return the snapshot of the DingoObjDict (or compact.CompactIncident) of
+    an Incident as text: the paths and values of the compact representation
+    as JSON, compressed with zlib and encoded with base64.
+
+    The compact representation is used because it keeps the order of the
+    keys of the dictionary, which JSON objects do not.
+    """
+    if not isinstance(elt_dict, CompactIncident):
+        elt_dict = CompactIncident.from_dict(elt_dict)
+    data = json.dumps([elt_dict.paths, elt_dict.values], separators=(',', ':'))
+    return base64.b64encode(zlib.compress(data.encode('utf-8'), COMPRESSION_LEVEL)).decode('ascii')
+
+
+def decode_snapshot(data):
+    """
+    Return the DingoObjDict of an Incident from its snapshot (see 'encode_snapshot').
+    """
+    (paths, values) = json.loads(zlib.decompress(base64.b64decode(data)).decode('utf-8'))
+
+    # JSON turns the tuples of the compact representation (paths and
+    # the markers of empty elements) into lists.
+
+    return CompactIncident([tuple(path) for path in paths],
+                           [tuple(value) if isinstance(value, list) else value for value in values]).to_dict()
+
+
+def record_snapshot(iobject, elt_dict):
+    """
+    Write the snapshot of an imported Incident; an existing snapshot of
+    the Information Object (from an earlier import of the same revision)
+    is replaced.
+    """
+    data = encode_snapshot(elt_dict)
+    if not IncidentSnapshot.objects.filter(iobject=iobject).update(data=data):
+        IncidentSnapshot.objects.create(iobject=iobject, data=data)
+    return len(data)
@@ -0,0 +1,161 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import base64
+
+import binascii
+
+import json
+
+import logging
+
+import re
+
+
+logger = logging.getLogger(__name__)
+
+
+# End of an IODEF document (with or without namespace prefix)
+
+RE_DOCUMENT_END = re.compile(r'</(?:[\w.-]+:)?IODEF-Document\s*>')
+
+RE_DOCUMENT_END_BYTES = re.compile(br'</(?:[\w.-]+:)?IODEF-Document\s*>')
+
+MAX_END_TAG_LENGTH = 256
+
+
+def iter_documents(stream, name='<stream>'):
+    """
+    Yield (name, content) for each IODEF document read from a file-like
+    object. Documents are yielded as soon as they are complete, so the
+    stream may be a pipe that never ends. Two framings are recognized
+    (by the first non-blank character of the stream):
+
+    - concatenated XML documents: a document ends with the closing
+      IODEF-Document tag;
+
+    - one document per line, either base64-encoded or as JSON envelope
+      {"xml": "<document>"} resp. {"base64": "<encoded document>"}, optionally
+      with a "name" for reporting. Blank lines are skipped, as are
+      lines that cannot be decoded (they are logged with their line number).
+    """
+    lines = read_lines(stream)
+
+    first = None
+    for line in lines:
+        if line.strip():
+            first = line
+            break
+
+    if first is None:
+        return
+
+    if first.lstrip()[:1] in ('<', b'<'):
+        documents = iter_xml_documents(first, lines)
+    else:
+        documents = iter_line_documents(first, lines, name)
+
+    count = 0
+    for (document_name, content) in documents:
+        count += 1
+        yield (document_name or '%s#%s' % (name, count), content)
+
+
+def read_lines(stream):
+    # Rather than iterating over the stream, we call readline: file
+    # iteration reads ahead, which would delay documents from a pipe.
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        yield line
+
+
+def iter_xml_documents(first, lines):
+    buffered = first
+    if isinstance(first, bytes):
+        re_document_end = RE_DOCUMENT_END_BYTES
+    else:
+        re_document_end = RE_DOCUMENT_END
+
+    # We only search the part of the buffer that can contain a new
+    # end tag, so that long documents are not scanned once per line.
+
+    search_from = 0
+    while True:
+        match = re_document_end.search(buffered, search_from)
+        if match:
+            # Whitespace between documents is dropped: the XML declaration
+            # must be at the very start of a document.
+            content = buffered[:match.end()].lstrip()
+            buffered = buffered[match.end():]
+            search_from = 0
+            yield (None, content)
+            continue
+        try:
+            line = next(lines)
+        except StopIteration:
+            break
+        search_from = max(0, len(buffered) - MAX_END_TAG_LENGTH)
+        buffered += line
+    if buffered.strip():
+        # An incomplete last document is handed on, so that the
+        # parse error is reported.
+        yield (None, buffered.lstrip())
+
+
+def iter_line_documents(first, lines, name='<stream>'):
+    line_number = 0
+    for line in chain_lines(first, lines):
+        line_number += 1
+        line = line.strip()
+        if not line:
+            continue
+        # A malformed line must not end the stream: it is logged and
+        # the next line is read.
+        try:
+            document = decode_line(line)
+        except (ValueError, TypeError, AttributeError, binascii.Error) as e:
+            logger.error("Skipping line %s of %s: %s: %s" % (line_number, name, e.__class__.__name__, e))
+            continue
+        yield document
+
+
+def decode_line(line):
+    """
+    Return (name, content) for a line that holds one document.
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    if line.startswith('{'):
+        envelope = json.loads(line)
+        if 'xml' in envelope:
+            content = envelope['xml'].encode('utf-8')
+        elif 'base64' in envelope:
+            content = base64.b64decode(envelope['base64'])
+        else:
+            raise ValueError("Envelope has neither 'xml' nor 'base64'")
+        return (envelope.get('name'), content)
+    else:
+        return (None, base64.b64decode(line))
+
+
+def chain_lines(first, lines):
+    yield first
+    for line in lines:
+        yield line
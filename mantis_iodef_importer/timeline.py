@@ -0,0 +1,93 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from django.utils import timezone
+
+from django.utils.dateparse import parse_datetime
+
+from mantis_iodef_importer.models import IncidentTimeline
+
+
+# Elements carrying points in time (RFC5070, sections 3.2 and 3.10);
+# ReportTime only occurs in the Incident itself.
+
+TIME_ELEMENTS = [('DetectTime', IncidentTimeline.DETECT),
+                 ('StartTime', IncidentTimeline.START),
+                 ('EndTime', IncidentTimeline.END)]
+
+
+def parse_time(value):
+    """
+    Parse the text of an IODEF time element (given as string or as
+    DingoObjDict); returns a timezone-aware datetime or None.
+    """
+    if isinstance(value, dict):
+        value = value.get('_value')
+    if not value:
+        return None
+    try:
+        result = parse_datetime(value.strip())
+    except ValueError:
+        return None
+    if result and not timezone.is_aware(result):
+        result = timezone.make_aware(result, timezone.utc)
+    return result
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def timeline_entries(elt_dict, report_time=None):
+    """
+    Return the list of (kind, timestamp) pairs for the DingoObjDict of an
+    Incident. The ReportTime has already been parsed by the importer and
+    is passed in 'report_time'. Times that cannot be parsed are left out.
+    """
+    entries = []
+    if report_time:
+        entries.append((IncidentTimeline.REPORT, report_time))
+
+    pending = [elt_dict]
+    while pending:
+        contents = pending.pop()
+        for (element, kind) in TIME_ELEMENTS:
+            for value in as_list(contents.get(element)):
+                timestamp = parse_time(value)
+                if timestamp:
+                    entries.append((kind, timestamp))
+        # EventData may be nested in EventData.
+        pending.extend([x for x in as_list(contents.get('EventData')) if isinstance(x, dict)])
+    return entries
+
+
+def record_timeline(iobject, elt_dict, report_time=None):
+    """
+    Write the timeline of an imported Incident; an existing timeline of
+    the Information Object (from an earlier import of the same revision)
+    is replaced.
+    """
+    entries = timeline_entries(elt_dict, report_time=report_time)
+    IncidentTimeline.objects.filter(iobject=iobject).delete()
+    IncidentTimeline.objects.bulk_create([IncidentTimeline(iobject=iobject, kind=kind, timestamp=timestamp)
+                                          for (kind, timestamp) in entries])
+    return len(entries)
@@ -0,0 +1,52 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from contextlib import contextmanager
+
+from django.db import transaction
+
+try:
+    from django.db.transaction import atomic
+    HAS_ATOMIC = True
+except ImportError:
+    # Django < 1.6
+    from django.db.transaction import commit_on_success as atomic
+    HAS_ATOMIC = False
+
+
+@contextmanager
+def savepoint(using=None):
+    """
+    Context manager for a block within a transaction (see 'atomic'):
+    if the block raises an exception, the changes made by the
+    block are rolled back to a savepoint taken before the block and
+    the exception is propagated; the enclosing transaction remains usable.
+    """
+    if HAS_ATOMIC:
+        # A nested atomic block is carried out within a savepoint.
+        with atomic(using=using):
+            yield
+    else:
+        sid = transaction.savepoint(using=using)
+        try:
+            yield
+        except:
+            transaction.savepoint_rollback(sid, using=using)
+            raise
+        else:
+            transaction.savepoint_commit(sid, using=using)
@@ -38,7 +38,7 @@ setup(
     include_package_data=True,
     install_requires=[
         "django>=1.5.5",
-        "django-dingos>=0.1.0",
+        "django-dingos>=0.2.0",
         "django-mantis-core>=0.1.0"
     ],
     license="GPLv2+",
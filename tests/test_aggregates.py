@@ -0,0 +1,84 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import datetime
+
+from custom_test_runner import CustomSettingsTestCase
+
+from mantis_iodef_importer.aggregates import rebuild_aggregates
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import IncidentAggregate
+
+
+class Aggregate_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def aggregates(self):
+        return list(IncidentAggregate.objects.order_by('day', 'csirt', 'impact_type', 'severity').values_list(
+            'day', 'csirt', 'impact_type', 'severity', 'count'))
+
+    def test_aggregates(self):
+        expected = [(datetime.date(2006, 6, 8), 'csirt.example.com', 'dos', 'high', 1)]
+
+        # A repeated import of the same revision is not counted again.
+
+        for i in range(2):
+            self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                     aggregate=True,
+                                     isolate_failures=False)
+        self.assertEqual(expected, self.aggregates())
+
+        self.assertEqual(1, rebuild_aggregates())
+        self.assertEqual(expected, self.aggregates())
+
+    def test_off_by_default(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        self.assertEqual([], self.aggregates())
+
+        # The counts can be backfilled.
+
+        self.assertEqual(1, rebuild_aggregates())
+        self.assertEqual([(datetime.date(2006, 6, 8), 'csirt.example.com', 'dos', 'high', 1)], self.aggregates())
+
+    def test_rebuild_in_one_transaction(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 aggregate=True,
+                                 isolate_failures=False)
+        expected = self.aggregates()
+
+        def interrupt(counted):
+            raise ValueError("Rebuild interrupted")
+
+        # An interrupted rebuild leaves the aggregates as they were.
+
+        with self.assertRaises(ValueError):
+            rebuild_aggregates(progress=interrupt)
+        self.assertEqual(expected, self.aggregates())
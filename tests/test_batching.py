@@ -0,0 +1,98 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from mantis_iodef_importer.batching import BatchController
+
+from utils import ImportTestCase, scaled_document
+
+
+class Batch_Controller_Tests(ImportTestCase):
+
+    def test_growth(self):
+        controller = BatchController(initial=2, maximum=64)
+
+        # Light Incidents: the size doubles from batch to batch up to the maximum.
+
+        sizes = []
+        for i in range(7):
+            controller.record(controller.size, 0.001 * controller.size, 10 * controller.size)
+            sizes.append(controller.size)
+        self.assertEqual([4, 8, 16, 32, 64, 64, 64], sizes)
+
+    def test_targets(self):
+        # The size is limited by the expected time ...
+
+        controller = BatchController(initial=8, target_seconds=1.0)
+        controller.record(8, 0.8, 80)
+        self.assertEqual(10, controller.size)
+
+        # ... and by the expected number of facts per transaction.
+
+        controller = BatchController(initial=10, max_facts=100)
+        controller.record(10, 0.01, 50)
+        self.assertEqual(20, controller.size)
+        controller.record(20, 0.02, 100)
+        self.assertEqual(20, controller.size)
+
+    def test_exceeded_targets(self):
+        # A batch that takes too long or writes too many facts halves the size,
+        # down to the minimum.
+
+        controller = BatchController(initial=64, minimum=10, max_facts=1000)
+        controller.record(64, 2.0, 640)
+        self.assertEqual(32, controller.size)
+        controller.record(32, 0.1, 2000)
+        self.assertEqual(16, controller.size)
+        controller.record(16, 5.0, 160)
+        self.assertEqual(10, controller.size)
+
+    def test_short_batch(self):
+        # The remainder of a document does not let the size grow beyond
+        # twice its own size.
+
+        controller = BatchController(initial=100)
+        controller.record(3, 0.003, 30)
+        self.assertEqual(100, controller.size)
+
+        controller = BatchController(initial=4)
+        controller.record(3, 0.003, 30)
+        self.assertEqual(6, controller.size)
+
+    def test_adaptive_import(self):
+        controller = BatchController(initial=1, maximum=4, target_seconds=60.0)
+        batches = []
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/botnet_iodef.xml', 8),
+                                 adaptive_batching=controller,
+                                 on_commit=lambda infos: batches.append(len(infos)),
+                                 isolate_failures=False)
+
+        self.assertEqual(8, sum(batches))
+        self.assertEqual(4, max(batches))
+        self.assertEqual(4, controller.size)
+
+    def test_fixed_batch_size(self):
+        # A given batch size switches the adaptation off.
+
+        batches = []
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/botnet_iodef.xml', 8),
+                                 batch_size=3,
+                                 on_commit=lambda infos: batches.append(len(infos)),
+                                 isolate_failures=False)
+
+        self.assertEqual(8, sum(batches))
+        self.assertEqual(3, max(batches))
@@ -0,0 +1,89 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from utils import combined_document, deltaCalc
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import ImportCheckpoint
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Checkpoint_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+        self.document = combined_document('tests/mocks/botnet_iodef.xml',
+                                          'tests/mocks/worm_iodef.xml',
+                                          'tests/mocks/scan_iodef.xml')
+
+    def imported_ids(self):
+        return sorted(InfoObject.objects.values_list('identifier__namespace__uri', flat=True))
+
+    def test_resumed_import(self):
+        def interrupt(committed):
+            if committed:
+                raise Interrupted()
+
+        # The import is interrupted after the first Incident has been committed.
+
+        with self.assertRaises(Interrupted):
+            self.importer.xml_import(xml_content=self.document,
+                                     checkpoint=True,
+                                     batch_size=1,
+                                     on_commit=interrupt,
+                                     isolate_failures=False)
+
+        self.assertEqual(['908711'], self.imported_ids())
+        self.assertEqual([(1, 'csirt.example.com:908711')],
+                         list(ImportCheckpoint.objects.values_list('ordinal', 'incident_id')))
+
+        # The resumed import skips the committed Incident and imports the rest.
+
+        committed = []
+        self.importer.xml_import(xml_content=self.document,
+                                 resume=True,
+                                 batch_size=1,
+                                 on_commit=lambda infos: committed.extend([info['id'] for info in infos]),
+                                 isolate_failures=False)
+
+        self.assertEqual(['csirt.example.com:189493', 'csirt.example.com:59334'], committed)
+        self.assertEqual(['189493', '59334', '908711'], self.imported_ids())
+        self.assertEqual([1, 2, 3], sorted(ImportCheckpoint.objects.values_list('ordinal', flat=True)))
+
+        # Now that all Incidents have been committed, a resumed
+        # import creates no objects at all.
+
+        (delta, result) = deltaCalc(self.importer.xml_import)(xml_content=self.document,
+                                                              resume=True,
+                                                              isolate_failures=False)
+        self.assertEqual([], delta)
@@ -0,0 +1,112 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import shutil
+
+import tempfile
+
+import unittest
+
+from custom_test_runner import CustomSettingsTestCase
+
+from mantis_iodef_importer import columnar
+
+from mantis_iodef_importer.importer import iodef_Import
+
+
+class Columnar_Export_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_typed_values(self):
+        self.assertEqual(0xc00002c8, columnar.ipv4_value('Node/Address', '192.0.2.200'))
+        self.assertEqual(-1, columnar.ipv4_value('Node/Address', '192.0.2.300'))
+        self.assertEqual(-1, columnar.ipv4_value('Node/Name', '192.0.2.200'))
+
+        self.assertEqual((137, 139), columnar.port_values('Service/Portlist', '137-139'))
+        self.assertEqual((445, 445), columnar.port_values('Service/Port', '445'))
+        self.assertEqual((-1, -1), columnar.port_values('Service/Port', '70000'))
+        self.assertEqual((-1, -1), columnar.port_values('Service/Protocol', '445'))
+
+    @unittest.skipIf(columnar.numpy is None, "requires numpy")
+    def test_columnar_export(self):
+        numpy = columnar.numpy
+
+        self.importer.xml_import(filepath='tests/mocks/scan_iodef.xml',
+                                 isolate_failures=False)
+        (path,) = columnar.export_facts(self.directory)
+
+        chunk = numpy.load(path, allow_pickle=True)
+        ports = set(zip(chunk['port_low'].tolist(), chunk['port_high'].tolist()))
+        self.assertTrue(set([(60524, 60524), (137, 139), (445, 445)]).issubset(ports))
+        self.assertTrue(columnar.ipv4_value('Address', '192.0.2.200') in chunk['ipv4'].tolist())
+        terms = chunk['term_dictionary'][chunk['term']]
+        self.assertTrue(all([term.split('/')[-1] in ('Port', 'Portlist') for term in terms[chunk['port_low'] >= 0]]))
+
+        # The next export only contains the facts written since.
+
+        self.assertEqual([], columnar.export_facts(self.directory))
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 isolate_failures=False)
+        (path,) = columnar.export_facts(self.directory)
+        chunk = numpy.load(path, allow_pickle=True)
+        self.assertTrue('189493' in chunk['value_dictionary'].tolist())
+
+    @unittest.skipIf(columnar.numpy is None, "requires numpy")
+    def test_full_export(self):
+        numpy = columnar.numpy
+
+        def fact_ids(paths):
+            return sorted([fact_id for path in paths
+                           for fact_id in numpy.load(path, allow_pickle=True)['fact_id'].tolist()])
+
+        self.importer.xml_import(filepath='tests/mocks/scan_iodef.xml',
+                                 isolate_failures=False)
+        columnar.export_facts(self.directory)
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 isolate_failures=False)
+        columnar.export_facts(self.directory)
+        increments = columnar.current_files(self.directory)
+        self.assertEqual(2, len(increments))
+
+        # A full export goes into a new generation, in which each fact
+        # occurs once.
+
+        written = columnar.export_facts(self.directory, full=True)
+        self.assertEqual(written, columnar.current_files(self.directory))
+        self.assertNotEqual(os.path.dirname(increments[0]), os.path.dirname(written[0]))
+        self.assertEqual(fact_ids(increments), fact_ids(written))
+
+        # The dictionaries hold Python strings rather than fixed-width strings.
+
+        chunk = numpy.load(written[0], allow_pickle=True)
+        self.assertEqual(object, chunk['value_dictionary'].dtype)
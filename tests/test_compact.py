@@ -0,0 +1,72 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import pickle
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.core.datastructures import DingoObjDict
+
+from mantis_iodef_importer.compact import CompactIncident, expand
+
+
+def example_incident(incident_id):
+    incident = DingoObjDict()
+    incident['@purpose'] = 'reporting'
+    incident['IncidentID'] = DingoObjDict([('@name', 'csirt.example.com'), ('_value', incident_id)])
+    incident['Description'] = 'Host involved in DOS attack'
+    incident['Assessment'] = DingoObjDict([('Impact', DingoObjDict([('@type', 'dos')]))])
+    incident['EventData'] = [DingoObjDict([('Flow', DingoObjDict())]),
+                             DingoObjDict([('Flow', [DingoObjDict([('System', DingoObjDict([('@category', 'source')]))]),
+                                                     DingoObjDict([('System', DingoObjDict([('@category', 'target')]))])])])]
+    return incident
+
+
+class Compact_Incident_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def test_compact_round_trip(self):
+        incident = example_incident('189493')
+
+        restored = CompactIncident.from_dict(incident).to_dict()
+
+        self.assertEqual(incident.to_tuple(), restored.to_tuple())
+        self.assertEqual(incident.to_tuple(), expand(CompactIncident.from_dict(incident)).to_tuple())
+        self.assertTrue(expand(incident) is incident)
+
+    def test_shared_paths(self):
+        first = CompactIncident.from_dict(example_incident('189493'))
+        second = CompactIncident.from_dict(example_incident('189494'))
+
+        # Incidents of the same structure share their paths.
+
+        self.assertEqual(len(first), len(second))
+        self.assertTrue(all([a is b for (a, b) in zip(first.paths, second.paths)]))
+
+    def test_pickle(self):
+        incident = example_incident('189493')
+
+        restored = pickle.loads(pickle.dumps(CompactIncident.from_dict(incident)))
+
+        self.assertEqual(incident.to_tuple(), restored.to_dict().to_tuple())
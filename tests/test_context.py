@@ -0,0 +1,101 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from dingos.core.datastructures import DingoObjDict
+
+from dingos.models import InfoObject, Marking2X
+
+from mantis_core.import_handling import MantisImporter
+
+from mantis_iodef_importer.importer import ImportContext
+
+from mantis_iodef_importer.management.commands.mantis_iodef_import import Command
+
+from utils import ImportTestCase, combined_document
+
+
+class Import_Context_Tests(ImportTestCase):
+    """
+    Imports carried out by the same importer (such as the one shared
+    by all runs of the import command) keep their state apart.
+    """
+
+    def setUp(self):
+        super(Import_Context_Tests, self).setUp()
+        self.importer = Command.Importer
+        self.tlp = MantisImporter.create_marking_iobject(metadata_dict=DingoObjDict([('TLP', 'AMBER')]))
+        self.provenance = MantisImporter.create_marking_iobject(metadata_dict=DingoObjDict([('Source', 'Partner')]))
+
+    def incidents(self):
+        return InfoObject.objects.exclude(pk__in=[self.tlp.pk, self.provenance.pk])
+
+    def markings_of(self, incident_number):
+        iobject = self.incidents().get(identifier__namespace__uri=incident_number)
+        return sorted(Marking2X.objects.filter(object_id=iobject.pk).values_list('marking', flat=True))
+
+    def test_bind(self):
+        first = self.importer.bind(ImportContext(markings=[self.tlp]))
+        second = self.importer.bind(ImportContext(markings=[self.provenance]))
+
+        self.assertEqual(None, self.importer.ctx)
+        self.assertFalse(first.ctx is second.ctx)
+
+        first.ctx.incident_ordinal += 1
+        self.assertEqual(0, second.ctx.incident_ordinal)
+        self.assertEqual([self.tlp], first.ctx.markings)
+        self.assertEqual([self.provenance], second.ctx.markings)
+
+    def test_nested_import(self):
+        nested = []
+
+        def import_nested(committed):
+            # While the first import is still running, a second one
+            # is carried out by the same importer.
+            if not nested:
+                nested.append(committed)
+                self.importer.xml_import(filepath='tests/mocks/scan_iodef.xml',
+                                         markings=[self.provenance],
+                                         batch_size=1,
+                                         isolate_failures=False)
+
+        self.importer.xml_import(xml_content=combined_document('tests/mocks/botnet_iodef.xml',
+                                                               'tests/mocks/worm_iodef.xml'),
+                                 markings=[self.tlp],
+                                 batch_size=1,
+                                 on_commit=import_nested,
+                                 isolate_failures=False)
+
+        self.assertEqual(1, len(nested))
+        self.assertEqual(3, self.incidents().count())
+
+        # The markings of each import are linked to its own Incidents only.
+
+        self.assertEqual([self.tlp.pk], self.markings_of('908711'))
+        self.assertEqual([self.tlp.pk], self.markings_of('189493'))
+        self.assertEqual([self.provenance.pk], self.markings_of('59334'))
+
+        # The Incidents of the first import share its creation timestamp,
+        # also those written after the second import.
+
+        create_timestamps = dict(self.incidents().values_list('identifier__namespace__uri', 'create_timestamp'))
+        self.assertEqual(create_timestamps['908711'], create_timestamps['189493'])
+        self.assertNotEqual(create_timestamps['908711'], create_timestamps['59334'])
+
+        # All Incidents are of the IODEF type of the namespace of their document.
+
+        self.assertEqual(['iodef'], list(self.incidents().values_list('iobject_family__name', flat=True).distinct()))
@@ -0,0 +1,87 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.correlation import CorrelationIndex
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import IncidentObservable
+
+from utils import scaled_document
+
+
+class Correlation_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def test_correlation(self):
+        # The scan and the worm example share the address 192.0.2.200.
+
+        for xml_file in ['tests/mocks/scan_iodef.xml', 'tests/mocks/worm_iodef.xml']:
+            self.importer.xml_import(filepath=xml_file,
+                                     correlate=True,
+                                     isolate_failures=False)
+
+        self.assertEqual(2, IncidentObservable.objects.incidents_with('ipv4-addr', '192.0.2.200').count())
+        self.assertEqual(1, IncidentObservable.objects.incidents_with('port', '138').count())
+
+    def test_off_by_default(self):
+        self.importer.xml_import(filepath='tests/mocks/scan_iodef.xml',
+                                 isolate_failures=False)
+
+        self.assertFalse(IncidentObservable.objects.exists())
+
+    def test_limits(self):
+        # Three copies of the scan example share the address 192.0.2.200
+        # with the worm example.
+
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/scan_iodef.xml', 3),
+                                 correlate=True,
+                                 isolate_failures=False)
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 isolate_failures=False)
+        worm = InfoObject.objects.get(identifier__namespace__uri='189493')
+        elt_dict = {'EventData': {'Flow': {'System': {'Node': {'Address': '192.0.2.200'}}}}}
+
+        # An observable of more than 'max_frequency' Incidents is indexed,
+        # but not correlated.
+
+        index = CorrelationIndex(max_frequency=2)
+        self.assertEqual({}, index.update(worm, elt_dict))
+        self.assertEqual(1, index.stats['frequent'])
+        self.assertEqual(4, IncidentObservable.objects.incidents_with('ipv4-addr', '192.0.2.200').count())
+
+        # At most 'max_correlations' correlations are returned.
+
+        index = CorrelationIndex(max_frequency=10, max_correlations=2)
+        correlations = index.update(worm, elt_dict)
+        self.assertEqual(2, len(correlations))
+        self.assertEqual(3, index.stats['correlations'])
+        self.assertEqual([[('ipv4-addr', '192.0.2.200')]] * 2, list(correlations.values()))
@@ -0,0 +1,112 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import shutil
+
+import tempfile
+
+from xml.etree import ElementTree
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.deadletters import DeadLetterSpool, IncidentSource
+
+from mantis_iodef_importer.importer import iodef_Import
+
+
+class Dead_Letter_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+        self.dead_letter_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dead_letter_dir)
+
+    def test_unparseable_report_time(self):
+        self.importer.xml_import(filepath='tests/mocks/bad_reporttime_iodef.xml',
+                                 dead_letter_dir=self.dead_letter_dir)
+
+        # The second Incident is imported in spite of the failure of the first.
+
+        self.assertEqual(['100002'],
+                         list(InfoObject.objects.values_list('identifier__namespace__uri', flat=True)))
+
+        # A dead letter has been written for the first Incident.
+
+        spool = DeadLetterSpool(self.dead_letter_dir)
+        self.assertEqual(1, len(spool))
+        path = spool.paths()[0]
+        self.assertTrue(os.path.isfile(path))
+        self.assertTrue(os.path.isfile(spool.error_path(path)))
+
+        error = spool.read_error(path)
+        self.assertEqual('csirt.example.com:100001', error['incident_id'])
+        self.assertEqual(1, error['ordinal'])
+        self.assertIn('ReportTime', error['error'])
+
+        with open(path) as xml_file:
+            self.assertIn('Broken report time', xml_file.read())
+
+    def test_prefixed_namespaces(self):
+        self.importer.xml_import(filepath='tests/mocks/prefixed_iodef.xml',
+                                 dead_letter_dir=self.dead_letter_dir)
+
+        self.assertEqual(['100003'],
+                         list(InfoObject.objects.values_list('identifier__namespace__uri', flat=True)))
+
+        # The dead letter declares the namespaces of the original document,
+        # so that the prefixes of the Incident can be resolved.
+
+        [path] = DeadLetterSpool(self.dead_letter_dir).paths()
+        root = ElementTree.parse(path).getroot()
+        self.assertEqual('{urn:ietf:params:xml:ns:iodef-1.0}IODEF-Document', root.tag)
+        self.assertEqual('en', root.get('lang'))
+
+        [incident] = root.findall('{urn:ietf:params:xml:ns:iodef-1.0}Incident')
+        self.assertEqual('100004', incident.find('{urn:ietf:params:xml:ns:iodef-1.0}IncidentID').text)
+        self.assertEqual('partner', incident.get('{urn:example:iodef-extension}feed'))
+        self.assertEqual('sensor-7', incident.find('.//{urn:example:iodef-extension}Sensor').text)
+
+    def test_incident_source(self):
+        source = IncidentSource(filepath='tests/mocks/bad_reporttime_iodef.xml')
+        try:
+            (incident_xml, root_name, root_attributes) = source.incident(2)
+            self.assertIn(b'100002', incident_xml)
+            self.assertEqual('IODEF-Document', root_name)
+            self.assertEqual('urn:ietf:params:xml:ns:iodef-1.0', root_attributes['xmlns'])
+            self.assertEqual('http://www.w3.org/2001/XMLSchema-instance', root_attributes['xmlns:xsi'])
+            self.assertEqual(None, source.incident(3))
+        finally:
+            source.close()
+
+    def test_without_isolation(self):
+        with self.assertRaises(ValueError):
+            self.importer.xml_import(filepath='tests/mocks/bad_reporttime_iodef.xml',
+                                     isolate_failures=False)
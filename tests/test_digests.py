@@ -0,0 +1,90 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import hashlib
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos import DINGOS_BLOB_TABLE, DINGOS_VALUES_TABLE
+
+from dingos.models import BlobStorage, InfoObject2Fact
+
+from mantis_iodef_importer.importer import iodef_Import
+
+
+class Value_Digest_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def fact_values(self, term):
+        """
+        Returns the (incident id, value, storage location, FactValue pk) of the
+        facts with the given term, ordered by incident id.
+        """
+        return sorted(InfoObject2Fact.objects.filter(fact__fact_term__term=term,
+                                                     fact__fact_term__attribute='')
+                      .values_list('iobject__identifier__namespace__uri',
+                                   'fact__fact_values__value',
+                                   'fact__fact_values__storage_location',
+                                   'fact__fact_values'))
+
+    def test_long_values_via_digest(self):
+        self.importer.xml_import(filepath='tests/mocks/long_value_iodef.xml',
+                                 value_digest_threshold=256,
+                                 isolate_failures=False)
+
+        # The long Description is stored once in the blob table, and the
+        # facts of both Incidents refer to it via its digest.
+
+        blob = BlobStorage.objects.get()
+        self.assertTrue(len(blob.content) >= 256)
+        self.assertEqual(hashlib.sha256(blob.content.encode('utf-8')).hexdigest(), blob.sha256)
+
+        descriptions = self.fact_values('Description')
+        self.assertEqual(['200001', '200002'], [incident_id for (incident_id, value, location, pk) in descriptions])
+        self.assertEqual(set([(blob.sha256, DINGOS_BLOB_TABLE)]),
+                         set([(value, location) for (incident_id, value, location, pk) in descriptions]))
+        self.assertEqual(1, len(set([pk for (incident_id, value, location, pk) in descriptions])))
+
+        # Short values are stored as usual.
+
+        self.assertEqual([('200001', '2006-06-08T05:44:53-05:00', DINGOS_VALUES_TABLE),
+                          ('200002', '2006-06-09T05:44:53-05:00', DINGOS_VALUES_TABLE)],
+                         [(incident_id, value, location) for (incident_id, value, location, pk)
+                          in self.fact_values('ReportTime')])
+
+    def test_off_by_default(self):
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 isolate_failures=False)
+
+        # The RecordItem of the worm example has more than 256 characters.
+
+        record_items = self.fact_values('EventData/Record/RecordData/RecordItem')
+        self.assertEqual(2, len(record_items))
+        self.assertTrue(max([len(value) for (incident_id, value, location, pk) in record_items]) >= 256)
+        self.assertEqual(set([DINGOS_VALUES_TABLE]),
+                         set([location for (incident_id, value, location, pk) in record_items]))
+        self.assertFalse(BlobStorage.objects.exists())
@@ -0,0 +1,85 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from utils import combined_document
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.filtering import IncidentFilter
+
+from mantis_iodef_importer.importer import iodef_Import
+
+
+class Filtering_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+        # The botnet example has purpose 'mitigation', the worm
+        # example has purpose 'reporting' and no ReportTime.
+
+        self.document = combined_document('tests/mocks/botnet_iodef.xml',
+                                          'tests/mocks/worm_iodef.xml',
+                                          'tests/mocks/scan_iodef.xml')
+
+    def imported_ids(self):
+        return sorted(InfoObject.objects.values_list('identifier__namespace__uri', flat=True))
+
+    def test_filter_by_purpose(self):
+        incident_filter = IncidentFilter.from_specs(['purpose=reporting'])
+
+        # A rejected Incident does not keep the Incidents after it
+        # from being imported.
+
+        self.importer.xml_import(xml_content=self.document,
+                                 incident_filter=incident_filter,
+                                 isolate_failures=False)
+
+        self.assertEqual(['189493', '59334'], self.imported_ids())
+        self.assertEqual({'accepted': 2, 'rejected': {'purpose': 1}}, incident_filter.stats)
+
+    def test_filter_by_report_time(self):
+        incident_filter = IncidentFilter.from_specs(['csirt=csirt.example.com',
+                                                     'report_time_before=2007-01-01'])
+
+        self.importer.xml_import(xml_content=self.document,
+                                 incident_filter=incident_filter,
+                                 isolate_failures=False)
+
+        self.assertEqual(['908711'], self.imported_ids())
+        self.assertEqual({'accepted': 1, 'rejected': {'report_time': 2}}, incident_filter.stats)
+        self.assertEqual("1 Incidents accepted, 2 rejected (report_time: 2)", incident_filter.stats_summary())
+
+    def test_all_rejected(self):
+        incident_filter = IncidentFilter(csirt=['csirt.example.net'])
+
+        self.importer.xml_import(xml_content=self.document,
+                                 incident_filter=incident_filter,
+                                 isolate_failures=False)
+
+        self.assertEqual([], self.imported_ids())
+        self.assertEqual({'accepted': 0, 'rejected': {'csirt': 3}}, incident_filter.stats)
@@ -0,0 +1,121 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import datetime
+
+import json
+
+import os
+
+import tempfile
+
+from custom_test_runner import CustomSettingsTestCase
+
+from django.core.management import call_command
+
+from django.utils import timezone
+
+from django.utils.six import StringIO
+
+from dingos.core.datastructures import DingoObjDict
+
+from dingos.models import InfoObject, Marking2X
+
+from mantis_core.import_handling import MantisImporter
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.markings import MarkingCache, marking_identifier, resolve_markings
+
+
+class Marking_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+        self.marking = MantisImporter.create_marking_iobject(metadata_dict=DingoObjDict([('TLP', 'AMBER')]))
+
+    def test_bulk_markings(self):
+        # Markings can be given as objects or by identifier.
+
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 markings=[marking_identifier(self.marking)],
+                                 isolate_failures=False)
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 markings=[self.marking],
+                                 batch_size=1,
+                                 isolate_failures=False)
+
+        links = Marking2X.objects.filter(marking=self.marking)
+        self.assertEqual(2, links.count())
+        self.assertEqual(sorted(InfoObject.objects.exclude(pk=self.marking.pk).values_list('pk', flat=True)),
+                         sorted(links.values_list('object_id', flat=True)))
+
+    def test_unknown_marking(self):
+        self.assertEqual([self.marking], resolve_markings([marking_identifier(self.marking)]))
+
+        with self.assertRaises(ValueError):
+            resolve_markings(['example.com:no-such-marking'])
+
+    def test_cache_per_run(self):
+        cache = MarkingCache()
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 markings=[marking_identifier(self.marking)],
+                                 marking_cache=cache,
+                                 isolate_failures=False)
+
+        revision = MantisImporter.create_marking_iobject(uid=self.marking.identifier.uid,
+                                                         id_namespace_uri=self.marking.identifier.namespace.uri,
+                                                         timestamp=timezone.now() + datetime.timedelta(seconds=1),
+                                                         metadata_dict=DingoObjDict([('TLP', 'RED')]))
+        self.assertNotEqual(self.marking.pk, revision.pk)
+
+        # Within a run, the marking is looked up once ...
+
+        self.assertEqual([self.marking], resolve_markings([marking_identifier(self.marking)], cache))
+
+        # ... while the next run finds the latest revision.
+
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 markings=[marking_identifier(self.marking)],
+                                 isolate_failures=False)
+        self.assertEqual(1, Marking2X.objects.filter(marking=revision).count())
+
+    def test_command_marking(self):
+        (handle, marking_json) = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as f:
+            json.dump({'Source': 'Partner'}, f)
+        try:
+            call_command('mantis_iodef_import', 'tests/mocks/botnet_iodef.xml', 'tests/mocks/worm_iodef.xml',
+                         marking_json=marking_json,
+                         stdout=StringIO())
+        finally:
+            os.remove(marking_json)
+
+        # One marking is created for all files of the run.
+
+        links = Marking2X.objects.exclude(marking=self.marking)
+        self.assertEqual(2, links.count())
+        self.assertEqual(1, links.values('marking').distinct().count())
+        self.assertEqual(4, InfoObject.objects.count())
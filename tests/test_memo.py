@@ -0,0 +1,110 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from dingos.models import FactTerm, FactTermNamespaceMap, InfoObject2Fact, NodeID
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.memo import StructureMemo
+
+from utils import ImportTestCase, combined_document, object_count_delta, object_counter, scaled_document
+
+
+class Rejecting_Import(iodef_Import):
+    """
+    Rejects the worm Incident (189493) after all its facts have been written.
+    """
+
+    def iobject_import(self, ctx, id_and_rev_info, elt_name, elt_dict, **kwargs):
+        created = iodef_Import.iobject_import(self, ctx, id_and_rev_info, elt_name, elt_dict, **kwargs)
+        if id_and_rev_info['id'] and id_and_rev_info['id'].endswith(':189493'):
+            raise ValueError("Incident rejected after its facts have been written")
+        return created
+
+
+class Structure_Memo_Tests(ImportTestCase):
+
+    def facts(self, incident_number):
+        """
+        Returns the facts of the given Incident with node id, term, attribute,
+        values, attributed fact and namespaces; the value of the IncidentID
+        (which differs between the copies of scaled_document) is left out.
+        """
+        facts = InfoObject2Fact.objects.filter(iobject__identifier__namespace__uri=incident_number).values_list(
+            'node_id__name',
+            'fact__fact_term__term',
+            'fact__fact_term__attribute',
+            'fact__fact_values__value',
+            'attributed_fact__node_id__name',
+            'namespace_map__namespaces_thru__position',
+            'namespace_map__namespaces_thru__namespace__uri')
+        return sorted([fact[:3] + (None if fact[1] == 'IncidentID' and not fact[2] else fact[3],) + fact[4:]
+                       for fact in facts])
+
+    def test_same_facts_as_dingo(self):
+        # The memo creates the fact terms, node ids and namespace maps ...
+
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/botnet_iodef.xml', 2),
+                                 memoize=True,
+                                 isolate_failures=False)
+
+        # ... such that DINGO finds them all when importing another copy.
+
+        count = object_counter()
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/botnet_iodef.xml', 1, offset=2),
+                                 memoize=False,
+                                 isolate_failures=False)
+        delta = dict(object_count_delta(count, object_counter()))
+        for class_name in ['FactTerm', 'FactTerm2Type', 'FactTermNamespaceMap', 'NodeID', 'PositionalNamespace']:
+            self.assertFalse(class_name in delta, class_name)
+
+        self.assertTrue(self.facts('908711-2'))
+        self.assertEqual(self.facts('908711-2'), self.facts('908711-0'))
+        self.assertEqual(self.facts('908711-2'), self.facts('908711-1'))
+
+    def test_rolled_back_incident(self):
+        memo = StructureMemo()
+
+        Rejecting_Import().xml_import(xml_content=combined_document('tests/mocks/botnet_iodef.xml',
+                                                                    'tests/mocks/worm_iodef.xml'),
+                                      memoize=memo,
+                                      batch_size=2)
+
+        # The entries for the rows created for the rejected Incident
+        # have been rolled back with them.
+
+        self.assertTrue(memo.entries)
+        for (key, value) in memo.entries.items():
+            if key[0] == 'fact_term':
+                self.assertTrue(FactTerm.objects.filter(pk=value.pk).exists(), key)
+            elif key[0] == 'node_id':
+                self.assertTrue(NodeID.objects.filter(pk=value).exists(), key)
+            elif value:
+                self.assertTrue(FactTermNamespaceMap.objects.filter(pk=value).exists(), key)
+
+        # Further imports with the memo create the rows again.
+
+        self.importer.xml_import(filepath='tests/mocks/worm_iodef.xml',
+                                 memoize=memo,
+                                 isolate_failures=False)
+        worm_facts = self.facts('189493')
+
+        self.importer.xml_import(xml_content=scaled_document('tests/mocks/worm_iodef.xml', 1),
+                                 memoize=False,
+                                 isolate_failures=False)
+        self.assertEqual(worm_facts, self.facts('189493-0'))
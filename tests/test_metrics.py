@@ -0,0 +1,92 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import shutil
+
+import tempfile
+
+try:
+    from urllib2 import urlopen
+except ImportError:
+    # Python 3
+    from urllib.request import urlopen
+
+from dingos.models import InfoObject2Fact
+
+from mantis_iodef_importer import metrics
+
+from utils import ImportTestCase
+
+
+class Metrics_Tests(ImportTestCase):
+
+    def setUp(self):
+        super(Metrics_Tests, self).setUp()
+        # The metrics are kept per process: earlier imports are not counted.
+        metrics.REGISTRY.drain()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_import_metrics(self):
+        textfile = os.path.join(self.directory, 'iodef.prom')
+        self.importer.xml_import(filepath='tests/mocks/bad_reporttime_iodef.xml',
+                                 metrics_textfile=textfile)
+
+        self.assertEqual({('ok',): 1}, metrics.FILES.values)
+        self.assertEqual({('imported',): 1, ('failed',): 1}, metrics.INCIDENTS.values)
+        self.assertEqual(InfoObject2Fact.objects.count(), metrics.FACTS.values[()])
+        self.assertTrue(metrics.VALUES.values[()] >= metrics.FACTS.values[()])
+        self.assertEqual([('commit',), ('incident',), ('parse',)], sorted(metrics.STAGE_SECONDS.values.keys()))
+
+        # The text file is written after the import.
+
+        with open(textfile) as f:
+            content = f.read()
+        self.assertEqual(metrics.REGISTRY.render(), content)
+        self.assertTrue('mantis_iodef_incidents_total{outcome="failed"} 1\n' in content)
+        self.assertTrue('# TYPE mantis_iodef_stage_seconds histogram\n' in content)
+        self.assertTrue('mantis_iodef_batch_size_count 1\n' in content)
+
+    def test_worker_metrics(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        # Worker processes hand on their metrics to the parent process,
+        # which adds them to its own.
+
+        drained = metrics.REGISTRY.drain()
+        self.assertEqual({}, metrics.INCIDENTS.values)
+        metrics.REGISTRY.merge(drained)
+        metrics.REGISTRY.merge(drained)
+        self.assertEqual({('imported',): 2}, metrics.INCIDENTS.values)
+        self.assertEqual(2 * InfoObject2Fact.objects.count(), metrics.FACTS.values[()])
+
+    def test_http_server(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        server = metrics.start_http_server(0)
+        try:
+            response = urlopen('http://127.0.0.1:%s/metrics' % server.server_address[1])
+            self.assertEqual(metrics.REGISTRY.render(), response.read().decode('utf-8'))
+        finally:
+            server.shutdown()
@@ -33,6 +33,7 @@ class XML_Import_Tests(CustomSettingsTestCase):
     new_settings = dict(
         INSTALLED_APPS=(
            'dingos',
+           'mantis_iodef_importer',
         )
     )
 
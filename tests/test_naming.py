@@ -0,0 +1,84 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from utils import combined_document
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.management.commands.mantis_iodef_set_naming import Command as SetNamingCommand
+
+from mantis_iodef_importer.naming import incident_name
+
+
+class Naming_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def names(self):
+        return sorted(InfoObject.objects.values_list('name', flat=True))
+
+    def test_incident_name(self):
+        self.assertEqual('Large bot-net (mitigation)',
+                         incident_name({'@purpose': 'mitigation', 'Description': ['Large bot-net', 'Other']}))
+        self.assertEqual('Large bot-net', incident_name({'Description': {'_value': 'Large bot-net'}}))
+        self.assertEqual(None, incident_name({'@purpose': 'mitigation'}))
+
+    def test_precomputed_name(self):
+        SetNamingCommand().handle()
+
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        self.assertEqual(['Large bot-net (mitigation)'], self.names())
+
+    def test_name_not_extracted(self):
+        SetNamingCommand().handle()
+
+        # DINGO's extraction of names from facts is only used for
+        # objects other than Incidents.
+
+        extracted = []
+        extract_name = InfoObject.__dict__['extract_name']
+
+        def recording_extract_name(iobject):
+            extracted.append(iobject.iobject_type.name)
+            return extract_name(iobject)
+
+        InfoObject.extract_name = recording_extract_name
+        try:
+            self.importer.xml_import(xml_content=combined_document('tests/mocks/botnet_iodef.xml',
+                                                                   'tests/mocks/worm_iodef.xml'),
+                                     isolate_failures=False)
+        finally:
+            InfoObject.extract_name = extract_name
+
+        self.assertEqual([], extracted)
+        self.assertEqual(['Host sending out Code Red probes (reporting)',
+                          'Large bot-net (mitigation)'], self.names())
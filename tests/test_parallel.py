@@ -0,0 +1,144 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import shutil
+
+import tempfile
+
+from django.core.management import call_command
+
+from django.db import connections, router
+
+from django.test import TransactionTestCase
+
+from django.test.utils import override_settings
+
+from dingos.models import Identifier, InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.routers import ROUTER_PATH, ShardRouter
+
+from custom_test_runner import CustomSettingsTestCase
+
+from utils import object_counter, scaled_document
+
+# Worker threads and processes open database connections of their own,
+# which cannot reach the in-memory test database. The imports below are
+# therefore directed (as single shard, see routers.py) to SQLite databases
+# in files, one per kind of import.
+
+DATABASES = ['sequential', 'threads', 'processes']
+
+
+class Parallel_Import_Tests(TransactionTestCase):
+    """
+    The import of a document with several worker threads or processes
+    has the same result as the sequential import.
+    """
+
+    multi_db = True
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        ),
+        DATABASE_ROUTERS=[ROUTER_PATH],
+    )
+
+    _override = None
+
+    _routers = None
+
+    _directory = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls._directory = tempfile.mkdtemp()
+        for alias in DATABASES:
+            connections.databases[alias] = {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": os.path.join(cls._directory, '%s.sqlite3' % alias),
+                # Concurrent writers wait for each other's transactions.
+                "OPTIONS": {"timeout": 60},
+            }
+        cls._routers = router.routers
+        router.routers = [ShardRouter()]
+        cls._override = override_settings(**cls.new_settings)
+        cls._override.enable()
+        CustomSettingsTestCase.syncdb()
+        for alias in DATABASES:
+            call_command('syncdb', database=alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._override.disable()
+        CustomSettingsTestCase.syncdb()
+        router.routers = cls._routers
+        for alias in DATABASES:
+            connections[alias].close()
+            if hasattr(connections._connections, alias):
+                delattr(connections._connections, alias)
+            del connections.databases[alias]
+        shutil.rmtree(cls._directory)
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+        # Eight Incidents with two revisions each: revisions of the same
+        # Incident must be imported in document order.
+
+        self.document = scaled_document('tests/mocks/botnet_iodef.xml', 8, revisions=2)
+
+    def import_into(self, alias, **options):
+        """
+        Import the document into the database 'alias'; returns the object
+        counts and the revisions of the Incidents in that database.
+        """
+        with self.settings(MANTIS_IODEF_SHARDS=[alias]):
+            self.importer.xml_import(xml_content=self.document,
+                                     batch_size=2,
+                                     isolate_failures=False,
+                                     **options)
+
+        revisions = sorted(InfoObject.objects.using(alias).values_list('identifier__uid',
+                                                                         'identifier__namespace__uri',
+                                                                         'timestamp',
+                                                                         'name'))
+        latest = sorted(Identifier.objects.using(alias).values_list('namespace__uri', 'latest__timestamp'))
+        return (object_counter(using=alias), revisions, latest)
+
+    def test_parallel_import(self):
+        (counts, revisions, latest) = self.import_into('sequential')
+
+        self.assertEqual(16, len(revisions))
+        self.assertEqual(8, len(latest))
+
+        for (alias, options) in [('threads', {'threads': 3}),
+                                 ('processes', {'processes': 3})]:
+            (parallel_counts, parallel_revisions, parallel_latest) = self.import_into(alias, **options)
+
+            self.assertEqual(counts, parallel_counts, alias)
+            self.assertEqual(revisions, parallel_revisions, alias)
+
+            # The later revision of each Incident is its latest one.
+
+            self.assertEqual(latest, parallel_latest, alias)
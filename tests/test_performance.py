@@ -0,0 +1,179 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import resource
+
+import sys
+
+import time
+
+from django.db import connection
+
+from django.test.utils import CaptureQueriesContext
+
+from utils import ImportTestCase, scaled_document
+
+
+def peak_rss_kib():
+    """
+    Returns the peak resident set size of this process in KiB
+    (getrusage reports bytes on OS X and KiB elsewhere).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+class Import_Performance_Tests(ImportTestCase):
+    """
+    Budgets for the import of Incidents: number of SQL queries, time and
+    peak memory per Incident.
+
+    The query budgets are fixed per mock for Django 1.6 and DINGO 0.2.0 on
+    SQLite. They apply to documents with SCALE copies of the Incident of a mock
+    once the rows shared by all copies (family, type, fact terms, ...)
+    exist. Per Incident, that is about 5 queries per fact (fact values, fact
+    and InfoObject2Fact row; fact terms, node ids and namespace maps come
+    from the memo, see memo.StructureMemo), about 30 for the Incident itself
+    and about 30 for filling the memo with the first copy, plus a third
+    as headroom. Without the memo, DINGO issues about 18 queries per fact.
+
+    The time and memory budgets are deliberately generous: they are meant
+    to catch a per-Incident cost that grows with the size of the document,
+    not to benchmark the machine that runs the tests.
+    """
+
+    MOCKS = ['tests/mocks/botnet_iodef.xml',
+             'tests/mocks/scan_iodef.xml',
+             'tests/mocks/worm_iodef.xml']
+
+    # Queries per Incident (with 40, 36 resp. 32 facts per Incident)
+
+    QUERY_BUDGETS = {'tests/mocks/botnet_iodef.xml': 350,
+                     'tests/mocks/scan_iodef.xml': 330,
+                     'tests/mocks/worm_iodef.xml': 300}
+
+    # Queries per Incident by which a larger document may exceed a smaller one
+
+    QUERY_MARGIN = 2
+
+    # Allowed growth of the median time per Incident when the document grows
+    # by a factor of four, and an absolute bound on the time per Incident
+
+    MAX_TIME_GROWTH = 2.0
+
+    MAX_SECONDS_PER_INCIDENT = 1.0
+
+    # Allowed growth of the peak resident set size of the process while
+    # importing a document of 4 * SCALE Incidents
+
+    MAX_PEAK_GROWTH_KIB = 64 * 1024
+
+    # Number of imports of which the median time is taken
+
+    REPEATS = 3
+
+    SCALE = 10
+
+    # Share of the queries per Incident without the memo of fact terms,
+    # node ids and namespace maps (see memo.StructureMemo) that an import
+    # with the memo may issue
+
+    MEMO_QUERY_SHARE = 0.5
+
+    def measure(self, xml_content, incidents, **options):
+        """
+        Import the given content; returns queries and seconds per Incident.
+        """
+        start = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            self.importer.xml_import(xml_content=xml_content,
+                                     isolate_failures=False,
+                                     **options)
+        seconds = time.time() - start
+        return (len(queries) / float(incidents),
+                seconds / incidents)
+
+    def warm_up(self, xml_file):
+        """
+        Create the rows shared by all Incidents of the given file.
+        """
+        self.importer.xml_import(xml_content=scaled_document(xml_file, 1, offset=-1),
+                                 isolate_failures=False)
+
+    def measure_median(self, xml_file, count, offset):
+        """
+        Import REPEATS documents with 'count' further copies of the Incident
+        of the given file; returns the largest number of queries and the
+        median of the seconds per Incident.
+        """
+        results = [self.measure(scaled_document(xml_file, count, offset=offset + repeat * count), count)
+                   for repeat in range(self.REPEATS)]
+        return (max([queries for (queries, seconds) in results]),
+                median([seconds for (queries, seconds) in results]))
+
+    def test_mock_budgets(self):
+        for xml_file in self.MOCKS:
+            self.warm_up(xml_file)
+
+            (queries, seconds) = self.measure(scaled_document(xml_file, self.SCALE), self.SCALE)
+            self.assertLessEqual(queries, self.QUERY_BUDGETS[xml_file],
+                                 "%s: %.1f queries per Incident (budget: %s)" % (xml_file, queries,
+                                                                               self.QUERY_BUDGETS[xml_file]))
+            self.assertLessEqual(seconds, self.MAX_SECONDS_PER_INCIDENT,
+                                 "%s: %.3fs per Incident" % (xml_file, seconds))
+
+    def test_scaled_budgets(self):
+        xml_file = self.MOCKS[0]
+        self.warm_up(xml_file)
+
+        (queries, seconds) = self.measure_median(xml_file, self.SCALE, 0)
+
+        # The cost per Incident must not grow with the size of the document.
+
+        peak = peak_rss_kib()
+        (queries_4x, seconds_4x) = self.measure_median(xml_file, 4 * self.SCALE, self.REPEATS * self.SCALE)
+        peak_growth = peak_rss_kib() - peak
+
+        self.assertLessEqual(queries_4x, queries + self.QUERY_MARGIN,
+                             "Queries per Incident grow with document size: %.1f -> %.1f" % (queries,
+                                                                                            queries_4x))
+        self.assertLessEqual(seconds_4x, max(seconds * self.MAX_TIME_GROWTH, 0.01),
+                             "Time per Incident grows with document size: %.4fs -> %.4fs" % (seconds,
+                                                                                            seconds_4x))
+        self.assertLessEqual(seconds_4x, self.MAX_SECONDS_PER_INCIDENT,
+                             "%s x %s: %.3fs per Incident" % (xml_file, 4 * self.SCALE, seconds_4x))
+        self.assertLessEqual(peak_growth, self.MAX_PEAK_GROWTH_KIB,
+                             "%s x %s: peak memory grew by %s KiB" % (xml_file, 4 * self.SCALE, peak_growth))
+
+    def test_memo_gain(self):
+        xml_file = self.MOCKS[0]
+        self.warm_up(xml_file)
+
+        (plain, seconds) = self.measure(scaled_document(xml_file, self.SCALE), self.SCALE,
+                                        memoize=False)
+        (memoized, seconds) = self.measure(scaled_document(xml_file, self.SCALE, offset=self.SCALE), self.SCALE,
+                                           memoize=True)
+        self.assertLessEqual(memoized, plain * self.MEMO_QUERY_SHARE,
+                             "%s: %.1f queries per Incident with memo, %.1f without" % (xml_file, memoized, plain))
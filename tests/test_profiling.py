@@ -0,0 +1,78 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import pstats
+
+import shutil
+
+import tempfile
+
+from mantis_iodef_importer.profiling import ImportProfiler
+
+from utils import ImportTestCase
+
+
+class Profiling_Tests(ImportTestCase):
+
+    def setUp(self):
+        super(Profiling_Tests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def files(self, suffix):
+        return sorted([os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                       if name.endswith(suffix)])
+
+    def test_profile(self):
+        profiler = ImportProfiler(self.directory, cpu=True, trace_memory=True)
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 profiler=profiler,
+                                 isolate_failures=False)
+
+        # The statistics cover the import of the document.
+
+        [path] = self.files('.pstats')
+        self.assertTrue(os.path.basename(path).startswith('botnet_iodef.xml-'))
+        functions = [name for (filename, line, name) in pstats.Stats(path).stats]
+        self.assertTrue('import_document' in functions)
+
+        [path] = self.files('.memory.txt')
+        with open(path) as report:
+            content = report.read()
+        self.assertTrue('Import of tests/mocks/botnet_iodef.xml' in content)
+        self.assertTrue('Peak resident set size' in content)
+        self.assertTrue('CPU time' in content)
+
+    def test_every(self):
+        profiler = ImportProfiler(self.directory, cpu=True, every=2)
+        for xml_file in ['tests/mocks/botnet_iodef.xml',
+                         'tests/mocks/scan_iodef.xml',
+                         'tests/mocks/worm_iodef.xml']:
+            self.importer.xml_import(filepath=xml_file,
+                                     profiler=profiler,
+                                     isolate_failures=False)
+
+        # The first and the third import are profiled, without memory report.
+
+        self.assertEqual(['botnet_iodef.xml', 'worm_iodef.xml'],
+                         [os.path.basename(path).rsplit('-', 1)[0] for path in self.files('.pstats')])
+        self.assertEqual([], self.files('.memory.txt'))
@@ -0,0 +1,101 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import json
+
+import os
+
+import shutil
+
+import tempfile
+
+from dingos.models import BlobStorage, InfoObject2Fact
+
+from mantis_iodef_importer.projection import BLOB_REFERENCE_PREFIX, BlobStore, Projection
+
+from utils import ImportTestCase
+
+
+class Projection_Tests(ImportTestCase):
+
+    def setUp(self):
+        super(Projection_Tests, self).setUp()
+        self.blob_directory = tempfile.mkdtemp()
+        self.projection = Projection([{'path': 'Method/Reference', 'action': 'drop'},
+                                      {'path': 'Contact/ContactName', 'action': 'truncate', 'length': 3},
+                                      {'path': 'EventData/Description', 'action': 'externalize'},
+                                      {'path': 'Expectation', 'action': 'externalize'}],
+                                     blob_store=self.blob_directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.blob_directory)
+
+    def values(self, term, attribute=''):
+        return list(InfoObject2Fact.objects.filter(fact__fact_term__term=term,
+                                                   fact__fact_term__attribute=attribute).values_list(
+            'fact__fact_values__value', flat=True))
+
+    def blob_files(self):
+        return [name for (path, directories, names) in os.walk(self.blob_directory) for name in names]
+
+    def test_projection(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 projection=self.projection,
+                                 isolate_failures=False)
+
+        # Dropped branches leave no facts behind.
+
+        self.assertFalse(InfoObject2Fact.objects.filter(fact__fact_term__term__startswith='Method/Reference').exists())
+
+        self.assertEqual(['Joe'], self.values('Contact/ContactName'))
+
+        # Externalized content is replaced by a reference into the blob store;
+        # the attributes of an externalized element are kept.
+
+        blob_store = BlobStore(self.blob_directory)
+
+        [description] = self.values('EventData/Description')
+        self.assertTrue(description.startswith(BLOB_REFERENCE_PREFIX))
+        self.assertTrue(b'communicating with irc.example.com.' in blob_store.get(description))
+
+        [expectation] = self.values('EventData/Expectation')
+        self.assertTrue(expectation.startswith(BLOB_REFERENCE_PREFIX))
+        self.assertEqual(['Description'], list(json.loads(blob_store.get(expectation).decode('utf-8')).keys()))
+        self.assertEqual(['investigate'], self.values('EventData/Expectation', 'action'))
+
+        # Neighbouring elements are not affected.
+
+        self.assertEqual(['Large bot-net'], self.values('Description'))
+
+        self.assertEqual(2, len(self.blob_files()))
+        self.assertEqual({'drop': 1, 'truncate': 1, 'externalize': 2}, self.projection.stats)
+
+        # The externalized content is neither in the fact values nor in
+        # the blob table of DINGO.
+
+        self.assertFalse(BlobStorage.objects.exists())
+
+    def test_identical_content_stored_once(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 projection=self.projection,
+                                 isolate_failures=False)
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 projection=self.projection,
+                                 isolate_failures=False)
+
+        self.assertEqual(2, len(self.blob_files()))
@@ -0,0 +1,124 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import datetime
+
+import hashlib
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import BlobStorage, FactValue, InfoObject
+
+from mantis_iodef_importer.filtering import parse_filter_time
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import IncidentObservable, IncidentSnapshot, IncidentTimeline
+
+from mantis_iodef_importer.purge import collect_garbage, purge_revisions, revisions_to_purge
+
+
+class Purge_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def test_revisions_to_purge(self):
+        day = lambda n: datetime.datetime(2006, 6, n)
+        revisions = [('a', 1, day(8), 3),
+                     ('a', 2, day(9), 3),
+                     ('a', 3, day(10), 3),
+                     ('b', 4, day(8), 4)]
+
+        self.assertEqual([1], revisions_to_purge(revisions, keep=2))
+        self.assertEqual([2, 1], revisions_to_purge(revisions, older_than=day(10)))
+        self.assertEqual([1], revisions_to_purge(revisions, keep=2, older_than=day(10)))
+
+        # The latest revision is kept in any case.
+
+        self.assertEqual([2, 1], revisions_to_purge(revisions, keep=0, older_than=day(11)))
+
+    def test_purge(self):
+        with open('tests/mocks/botnet_iodef.xml', 'rb') as xml_file:
+            botnet = xml_file.read()
+
+        # Three revisions of the same Incident, with timeline,
+        # observables and snapshot
+
+        importer = iodef_Import()
+        for day in [b'08', b'09', b'10']:
+            importer.xml_import(xml_content=botnet.replace(b'2006-06-08T05:44:53',
+                                                           b'2006-06-' + day + b'T05:44:53'),
+                                timeline=True,
+                                correlate=True,
+                                snapshots=True,
+                                isolate_failures=False)
+        self.assertEqual(3, InfoObject.objects.count())
+
+        self.assertEqual(1, purge_revisions(keep=2, chunk_size=1))
+        self.assertEqual(1, purge_revisions(older_than=parse_filter_time('2007-01-01')))
+
+        # The latest revision is kept in any case.
+
+        latest = InfoObject.objects.get()
+        self.assertEqual('2006-06-10', str(latest.timestamp.date()))
+
+        # The rows that belong to the purged revisions are gone.
+
+        for model in [IncidentTimeline, IncidentObservable, IncidentSnapshot]:
+            self.assertEqual([latest.pk], list(set(model.objects.values_list('iobject', flat=True))))
+
+        self.assertTrue(FactValue.objects.filter(value='2006-06-08T05:44:53-05:00').exists())
+        collected = collect_garbage(chunk_size=10)
+        self.assertEqual(2, collected['FactValue'])
+        self.assertFalse(FactValue.objects.filter(value='2006-06-08T05:44:53-05:00').exists())
+        self.assertEqual({'Fact': 0, 'FactValue': 0, 'BlobStorage': 0, 'NodeID': 0}, collect_garbage())
+
+    def test_collect_blobs(self):
+        with open('tests/mocks/botnet_iodef.xml', 'rb') as xml_file:
+            botnet = xml_file.read()
+
+        # The timestamps are stored in the blob table (see digests.py).
+
+        importer = iodef_Import()
+        for day in [b'08', b'09']:
+            importer.xml_import(xml_content=botnet.replace(b'2006-06-08T05:44:53',
+                                                           b'2006-06-' + day + b'T05:44:53'),
+                                value_digest_threshold=20,
+                                isolate_failures=False)
+
+        purged = hashlib.sha256(b'2006-06-08T05:44:53-05:00').hexdigest()
+        kept = hashlib.sha256(b'2006-06-09T05:44:53-05:00').hexdigest()
+        self.assertTrue(FactValue.objects.filter(value=purged).exists())
+        self.assertTrue(BlobStorage.objects.filter(sha256=purged).exists())
+
+        self.assertEqual(1, purge_revisions(keep=1))
+        collected = collect_garbage(chunk_size=10)
+
+        # The blobs of values that are no longer referred to are gone with
+        # the values.
+
+        self.assertTrue(collected['BlobStorage'] >= 1)
+        self.assertFalse(FactValue.objects.filter(value=purged).exists())
+        self.assertFalse(BlobStorage.objects.filter(sha256=purged).exists())
+        self.assertTrue(BlobStorage.objects.filter(sha256=kept).exists())
+        self.assertEqual({'Fact': 0, 'FactValue': 0, 'BlobStorage': 0, 'NodeID': 0}, collect_garbage())
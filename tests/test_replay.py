@@ -0,0 +1,116 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import os
+
+import shutil
+
+import tarfile
+
+import tempfile
+
+import zipfile
+
+from django.core.management.base import CommandError
+
+from django.utils.six import StringIO
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.management.commands.mantis_iodef_replay import Command, corpus_documents, percentile
+
+from utils import ImportTestCase
+
+MOCKS = ['botnet_iodef.xml', 'scan_iodef.xml', 'worm_iodef.xml']
+
+
+class Replay_Tests(ImportTestCase):
+
+    def setUp(self):
+        super(Replay_Tests, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.corpus = os.path.join(self.directory, 'corpus')
+        os.makedirs(os.path.join(self.corpus, 'partner'))
+        for name in MOCKS:
+            shutil.copy(os.path.join('tests/mocks', name),
+                        os.path.join(self.corpus, 'partner' if name == 'scan_iodef.xml' else '', name))
+        with open(os.path.join(self.corpus, 'README'), 'w') as readme:
+            readme.write('Not an IODEF document')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def replay(self, *args, **options):
+        out = StringIO()
+        Command().execute(*args, stdout=out, skip_validation=True, **options)
+        return out.getvalue()
+
+    def test_corpus_documents(self):
+        zip_path = os.path.join(self.directory, 'corpus.zip')
+        archive = zipfile.ZipFile(zip_path, 'w')
+        tar_path = os.path.join(self.directory, 'corpus.tar.gz')
+        tar_archive = tarfile.open(tar_path, 'w:gz')
+        for name in reversed(MOCKS + ['README']):
+            path = os.path.join('tests/mocks', name) if name != 'README' else os.path.join(self.corpus, name)
+            archive.write(path, name)
+            tar_archive.add(path, name)
+        archive.close()
+        tar_archive.close()
+
+        # Only XML files are replayed, in the order of their names.
+
+        for path in [zip_path, tar_path]:
+            self.assertEqual(MOCKS, [name for (name, content) in corpus_documents(path)])
+
+        documents = list(corpus_documents(self.corpus))
+        self.assertEqual(['botnet_iodef.xml', 'partner/scan_iodef.xml', 'worm_iodef.xml'],
+                         [os.path.relpath(name, self.corpus) for (name, content) in documents])
+        with open('tests/mocks/botnet_iodef.xml', 'rb') as xml_file:
+            self.assertEqual(xml_file.read(), documents[0][1])
+
+        with self.assertRaises(CommandError):
+            list(corpus_documents(os.path.join(self.corpus, 'README')))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 0.5))
+        self.assertEqual(99, percentile(values, 0.99))
+        self.assertEqual(100, percentile(values, 1.0))
+        self.assertEqual(None, percentile([], 0.5))
+
+    def test_replay(self):
+        output = self.replay(self.corpus, rate=50.0, batch_size=1)
+
+        self.assertEqual(3, InfoObject.objects.count())
+        self.assertTrue(output.startswith('Replayed 3 documents with 3 Incidents in '), output)
+        self.assertTrue('Latency from arrival to commit: p50 ' in output, output)
+        self.assertTrue('InfoObject +3' in output, output)
+        self.assertFalse('failed' in output, output)
+
+    def test_limit_and_failures(self):
+        with open(os.path.join(self.corpus, 'broken.xml'), 'w') as broken:
+            broken.write('<IODEF-Document')
+
+        output = self.replay(self.corpus, limit=2)
+
+        # Of the first two documents, 'botnet_iodef.xml' is imported and
+        # 'broken.xml' is reported.
+
+        self.assertTrue(output.startswith('Replayed 2 documents with 1 Incidents in '), output)
+        self.assertTrue('Import of %s failed: ' % os.path.join(self.corpus, 'broken.xml') in output, output)
+        self.assertEqual(1, InfoObject.objects.count())
@@ -0,0 +1,80 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.scheduler import FairScheduler
+
+
+class Scheduler_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def test_weights(self):
+        scheduler = FairScheduler(weights={'a': 2})
+        for i in range(4):
+            scheduler.put('a', 'a%s' % i)
+            scheduler.put('b', 'b%s' % i)
+
+        # Source 'a' receives twice the share of source 'b'.
+
+        self.assertEqual([('a', ['a0', 'a1']),
+                          ('b', ['b0']),
+                          ('a', ['a2', 'a3']),
+                          ('b', ['b1'])],
+                         [scheduler.get(max_items=10) for i in range(4)])
+        self.assertEqual(2, len(scheduler))
+
+    def test_priority_and_cap(self):
+        scheduler = FairScheduler(max_in_flight=1)
+        scheduler.put('a', 'a0')
+        scheduler.put('a', 'a1')
+        scheduler.put('b', 'b0', priority=True)
+
+        self.assertEqual(('b', ['b0']), scheduler.get())
+        self.assertEqual(('a', ['a0']), scheduler.get())
+
+        # Source 'a' has reached its cap until its unit is done.
+
+        self.assertEqual(None, scheduler.get())
+        scheduler.done('a')
+        self.assertEqual(('a', ['a1']), scheduler.get())
+
+    def test_fair_import(self):
+        committed = []
+        iodef_Import().scheduled_import(['tests/mocks/worm_iodef.xml',
+                                         'tests/mocks/scan_iodef.xml',
+                                         'tests/mocks/botnet_iodef.xml'],
+                                        batch_size=1,
+                                        on_commit=lambda infos: committed.extend([info['id'] for info in infos]),
+                                        isolate_failures=False)
+
+        # The botnet Incident has purpose 'mitigation' and is written first.
+
+        self.assertEqual(3, len(committed))
+        self.assertEqual('csirt.example.com:908711', committed[0])
+        self.assertEqual(3, InfoObject.objects.count())
@@ -0,0 +1,114 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from custom_test_runner import CustomSettingsTestCase
+
+from django.core.management import call_command
+
+from django.db import connections, router
+
+from dingos.models import FactTerm, InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.routers import ROUTER_PATH, ShardRouter, fan_out, fan_out_count, shard_for
+
+# The shard databases and the router are only configured for the
+# tests below; all other tests run with the default database alone.
+
+SHARDS = ['shard0', 'shard1']
+
+SHARD_DATABASE = {
+    "ENGINE": "django.db.backends.sqlite3",
+    "NAME": ":memory:",
+}
+
+
+class Sharding_Tests(CustomSettingsTestCase):
+
+    multi_db = True
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        ),
+        MANTIS_IODEF_SHARDS=SHARDS,
+        DATABASE_ROUTERS=[ROUTER_PATH],
+    )
+
+    _routers = None
+
+    @classmethod
+    def setUpClass(cls):
+        # Django reads DATABASES and DATABASE_ROUTERS only once, so
+        # overriding the settings is not enough: the shards are added to
+        # the connection handler and the router is installed directly.
+
+        for alias in SHARDS:
+            connections.databases[alias] = dict(SHARD_DATABASE)
+        cls._routers = router.routers
+        router.routers = [ShardRouter()]
+        super(Sharding_Tests, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(Sharding_Tests, cls).tearDownClass()
+        router.routers = cls._routers
+        for alias in SHARDS:
+            connections[alias].close()
+            if hasattr(connections._connections, alias):
+                delattr(connections._connections, alias)
+            del connections.databases[alias]
+
+    @classmethod
+    def syncdb(cls):
+        super(Sharding_Tests, cls).syncdb()
+        for alias in SHARDS:
+            call_command('syncdb', database=alias, verbosity=0)
+
+    def test_shard_assignment(self):
+        # The assignment is stable and spreads the CSIRTs.
+
+        self.assertEqual('shard0', shard_for('csirt.example.com', SHARDS))
+        self.assertEqual('shard1', shard_for('csirt.example.net', SHARDS))
+        self.assertEqual(shard_for(u'csirt.example.com', SHARDS), shard_for(b'csirt.example.com', SHARDS))
+        self.assertEqual(None, shard_for('csirt.example.com', []))
+
+    def test_sharded_import(self):
+        with open('tests/mocks/botnet_iodef.xml', 'rb') as xml_file:
+            botnet = xml_file.read()
+        with open('tests/mocks/worm_iodef.xml', 'rb') as xml_file:
+            worm = xml_file.read().replace(b'name="csirt.example.com"', b'name="csirt.example.net"')
+
+        importer = iodef_Import()
+        importer.xml_import(xml_content=botnet)
+        importer.xml_import(xml_content=worm)
+
+        self.assertEqual(1, InfoObject.objects.using('shard0').count())
+        self.assertEqual(1, InfoObject.objects.using('shard1').count())
+        self.assertEqual(0, InfoObject.objects.using('default').count())
+
+        # Each shard has the fact terms of its own Incidents.
+
+        self.assertTrue(FactTerm.objects.using('shard0').exists())
+        self.assertTrue(FactTerm.objects.using('shard1').exists())
+
+        self.assertEqual(2, fan_out_count(InfoObject.objects.all()))
+        self.assertEqual(['csirt.example.com', 'csirt.example.net'],
+                         sorted(fan_out(InfoObject.objects.values_list('identifier__uid', flat=True))))
@@ -0,0 +1,60 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import IncidentSnapshot
+
+
+class Snapshot_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def test_snapshot(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 snapshots=True,
+                                 isolate_failures=False)
+        incident = InfoObject.objects.get()
+
+        snapshot = IncidentSnapshot.objects.get_snapshot(incident)
+        self.assertEqual('908711', snapshot['IncidentID']['_value'])
+        self.assertEqual('Large bot-net', snapshot['Description'])
+        self.assertEqual(['GT Bot', 'CA-2003-22'],
+                         [reference['ReferenceName'] for reference in snapshot['Method']['Reference']])
+
+        self.assertEqual(snapshot.to_tuple(), IncidentSnapshot.objects.get_snapshots([incident.pk])[incident.pk].to_tuple())
+        self.assertEqual(None, IncidentSnapshot.objects.get_snapshot(incident.pk + 1))
+
+    def test_off_by_default(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        self.assertFalse(IncidentSnapshot.objects.exists())
+        self.assertEqual(None, IncidentSnapshot.objects.get_snapshot(InfoObject.objects.get()))
@@ -0,0 +1,88 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+import base64
+
+import io
+
+import json
+
+from custom_test_runner import CustomSettingsTestCase
+
+from dingos.models import InfoObject
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.streaming import iter_documents
+
+
+class Streaming_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    XML_FILES = ['tests/mocks/botnet_iodef.xml', 'tests/mocks/worm_iodef.xml']
+
+    def setUp(self):
+        self.importer = iodef_Import()
+        self.documents = []
+        for xml_file in self.XML_FILES:
+            with open(xml_file, 'rb') as f:
+                self.documents.append(f.read())
+
+    def imported_ids(self):
+        return sorted(InfoObject.objects.values_list('identifier__namespace__uri', flat=True))
+
+    def test_stream_import(self):
+        self.importer.xml_import(stream=io.BytesIO(b'\n'.join(self.documents) + b'\n'),
+                                 isolate_failures=False)
+
+        self.assertEqual(['189493', '908711'], self.imported_ids())
+
+    def test_line_framing(self):
+        lines = [json.dumps({'name': 'botnet', 'xml': self.documents[0].decode('utf-8')}).encode('utf-8'),
+                 b'',
+                 base64.b64encode(self.documents[1])]
+
+        documents = list(iter_documents(io.BytesIO(b'\n'.join(lines) + b'\n'), name='feed'))
+
+        self.assertEqual(['botnet', 'feed#2'], [name for (name, content) in documents])
+        self.assertEqual(self.documents, [content for (name, content) in documents])
+
+    def test_malformed_lines(self):
+        lines = [base64.b64encode(self.documents[0]),
+                 b'{"xml": "<IODEF-Document',
+                 b'not base64!',
+                 b'{"name": "empty"}',
+                 json.dumps({'name': 'worm', 'base64': base64.b64encode(self.documents[1]).decode('ascii')}).encode('utf-8')]
+
+        # The malformed lines are skipped; the documents after them are read.
+
+        documents = list(iter_documents(io.BytesIO(b'\n'.join(lines) + b'\n'), name='feed'))
+
+        self.assertEqual(['feed#1', 'worm'], [name for (name, content) in documents])
+        self.assertEqual(self.documents, [content for (name, content) in documents])
+
+        self.importer.xml_import(stream=io.BytesIO(b'\n'.join(lines) + b'\n'),
+                                 isolate_failures=False)
+
+        self.assertEqual(['189493', '908711'], self.imported_ids())
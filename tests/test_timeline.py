@@ -0,0 +1,59 @@
+# Copyright (c) Siemens AG, 2013
+#
+# This file is part of MANTIS.  MANTIS is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation; either version 2
+# of the License, or(at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+from custom_test_runner import CustomSettingsTestCase
+
+from mantis_iodef_importer.filtering import parse_filter_time
+
+from mantis_iodef_importer.importer import iodef_Import
+
+from mantis_iodef_importer.models import IncidentTimeline
+
+
+class Timeline_Tests(CustomSettingsTestCase):
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+    def test_timeline(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 timeline=True,
+                                 isolate_failures=False)
+
+        self.assertEqual([IncidentTimeline.REPORT],
+                         [entry.kind for entry in IncidentTimeline.objects.all()])
+
+        incidents = IncidentTimeline.objects.incidents_between(parse_filter_time('2006-06-08'),
+                                                               parse_filter_time('2006-06-09'))
+        self.assertEqual(1, incidents.count())
+
+        incidents = IncidentTimeline.objects.incidents_between(start=parse_filter_time('2006-06-09'))
+        self.assertEqual(0, incidents.count())
+
+    def test_off_by_default(self):
+        self.importer.xml_import(filepath='tests/mocks/botnet_iodef.xml',
+                                 isolate_failures=False)
+
+        self.assertFalse(IncidentTimeline.objects.exists())
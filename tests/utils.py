@@ -18,21 +18,54 @@
 
 import pprint
 
+import re
+
+from datetime import timedelta
+
 pp = pprint.PrettyPrinter(indent=2)
 
+from django.utils.dateparse import parse_datetime
+
 from dingos.models import dingos_class_map
 
+from custom_test_runner import CustomSettingsTestCase
+
+from mantis_iodef_importer.importer import iodef_Import
 
-def object_counter():
+
+class ImportTestCase(CustomSettingsTestCase):
+    """
+    Base class for tests of the import: the tables of DINGO and of the
+    importer are set up, and each test gets a fresh importer ('self.importer').
+    """
+
+    new_settings = dict(
+        INSTALLED_APPS=(
+           'dingos',
+           'mantis_iodef_importer',
+        )
+    )
+
+    def setUp(self):
+        self.importer = iodef_Import()
+
+
+def object_counter(using=None):
     """
     Returns a tuple that contains counts of how many objects of each model
-    defined in dingos.models are in the database.
+    defined in dingos.models are in the database (or in the database
+    with alias 'using').
+
+    The counts are determined with one COUNT query per model, i.e., without
+    loading any rows.
     """
-    class_names = dingos_class_map.keys()
-    class_names.sort()
+    class_names = sorted(dingos_class_map.keys())
     result = []
     for class_name in class_names:
-        result.append((class_name, len(dingos_class_map[class_name].objects.all())))
+        queryset = dingos_class_map[class_name].objects.all()
+        if using:
+            queryset = queryset.using(using)
+        result.append((class_name, queryset.count()))
     return result
 
 
@@ -71,4 +104,55 @@ def deltaCalc(func):
     return inner
 
 
+RE_INCIDENTS = re.compile(r'<Incident\b.*</Incident>', re.DOTALL)
+
+
+def combined_document(*xml_files):
+    """
+    Returns an IODEF document (as bytes) that contains the Incidents of
+    all given files, in the given order, within the IODEF-Document element
+    of the first file.
+    """
+    contents = []
+    for xml_file in xml_files:
+        with open(xml_file, 'rb') as f:
+            contents.append(f.read().decode('utf-8'))
+    incidents = [RE_INCIDENTS.search(content).group(0) for content in contents]
+    (start, end) = RE_INCIDENTS.search(contents[0]).span()
+    return (contents[0][:start] + '\n'.join(incidents) + contents[0][end:]).encode('utf-8')
+
+
+RE_INCIDENT = re.compile(r'<Incident\b.*?</Incident>', re.DOTALL)
+
+RE_INCIDENT_ID = re.compile(r'(<IncidentID[^>]*>)([^<]*)(</IncidentID>)')
+
+RE_REPORT_TIME = re.compile(r'(<ReportTime>)([^<]*)(</ReportTime>)')
+
+
+def scaled_document(xml_file, count, offset=0, revisions=1):
+    """
+    Returns an IODEF document that contains 'count' copies of the Incident(s)
+    in the given file, each with an IncidentID of its own. Each copy occurs
+    in 'revisions' revisions, whose ReportTimes are one day apart.
+    """
+    with open(xml_file) as f:
+        content = f.read()
+    incidents = RE_INCIDENT.findall(content)
+    start = content.index(incidents[0])
+    end = content.rindex(incidents[-1]) + len(incidents[-1])
+
+    def later(days):
+        return lambda m: '%s%s%s' % (m.group(1),
+                                     (parse_datetime(m.group(2)) + timedelta(days=days)).isoformat(),
+                                     m.group(3))
 
+    copies = []
+    for i in range(offset, offset + count):
+        for revision in range(revisions):
+            for incident in incidents:
+                copy = RE_INCIDENT_ID.sub(lambda m: '%s%s-%s%s' % (m.group(1), m.group(2), i, m.group(3)),
+                                          incident)
+                if revision:
+                    copy = RE_REPORT_TIME.sub(later(revision), copy)
+                copies.append(copy)
+    return content[:start] + '\n'.join(copies) + content[end:]